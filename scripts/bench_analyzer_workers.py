@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+多进程代码分析基准测试 - 同一语料分别以1到N个进程运行CodeAnalyzer.analyze_repository，
+报告耗时、相对单进程的加速比，并检查各文件的分析结果与单进程一致
+
+CPU核数少于进程数时实测的加速比没有意义，此时另外给出按单进程测得的可并行部分
+（逐文件解析）、父进程串行部分和结果跨进程传输开销估算的加速上限。
+
+用法: python scripts/bench_analyzer_workers.py --workers 1 2 4 8
+     python scripts/bench_analyzer_workers.py --repo-path /path/to/repo --workers 1 16 32
+"""
+import argparse
+import contextlib
+import io
+import os
+import pickle
+import sys
+import sysconfig
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'src'))
+
+from code_analyzer import CodeAnalyzer
+
+
+def symbols(file_analysis: Dict[str, Any]) -> Dict[str, Tuple]:
+    """用于比较的各文件结果；基类名中非名称表达式的文本含对象地址，不参与比较"""
+    return {path: (tuple(f['qualname'] for f in analysis.get('functions', [])),
+                   tuple(c.get('qualname', c['name']) for c in analysis.get('classes', [])),
+                   tuple(analysis.get('imports', [])), tuple(analysis.get('comments', [])))
+            for path, analysis in file_analysis.items()}
+
+
+def run(repo_path: str, workers: int) -> Tuple[float, Dict[str, Any]]:
+    analyzer = CodeAnalyzer(repo_path, workers=workers)
+    with contextlib.redirect_stdout(io.StringIO()):
+        started = time.perf_counter()
+        result = analyzer.analyze_repository()
+        elapsed = time.perf_counter() - started
+    return elapsed, result['file_analysis']
+
+
+def profile_serial(repo_path: str) -> Dict[str, float]:
+    """单进程运行一次，分别计时逐文件解析（可并行部分）和结果的序列化往返（多进程时的额外开销）"""
+    analyzer = CodeAnalyzer(repo_path)
+    parse_seconds = [0.0]
+    analyze = analyzer._analyze_single_file
+
+    def timed(file_path):
+        started = time.perf_counter()
+        try:
+            return analyze(file_path)
+        finally:
+            parse_seconds[0] += time.perf_counter() - started
+
+    analyzer._analyze_single_file = timed
+    with contextlib.redirect_stdout(io.StringIO()):
+        started = time.perf_counter()
+        file_analysis = analyzer.analyze_repository()['file_analysis']
+        total = time.perf_counter() - started
+
+    started = time.perf_counter()
+    payload = pickle.dumps(list(file_analysis.values()), protocol=pickle.HIGHEST_PROTOCOL)
+    pickle.loads(payload)
+    transfer = time.perf_counter() - started
+    return {'total': total, 'parallel': parse_seconds[0], 'serial': total - parse_seconds[0],
+            'transfer': transfer, 'payload_mb': len(payload) / 1024 / 1024}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='对比不同进程数下代码分析的耗时')
+    parser.add_argument('--repo-path', default=sysconfig.get_paths()['stdlib'],
+                        help='要分析的目录 (默认: 当前Python的标准库)')
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8], help='进程数列表 (默认: 1 2 4 8)')
+    parser.add_argument('--repeat', type=int, default=3, help='重复次数，取最快的一次 (默认: 3)')
+    args = parser.parse_args()
+
+    cores = len(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else os.cpu_count()
+    print(f"语料: {args.repo_path}, 可用CPU核数: {cores}")
+
+    baseline = None
+    timings: List[Tuple[int, float]] = []
+    for workers in sorted(set([1] + args.workers)):
+        best, file_analysis = min((run(args.repo_path, workers) for _ in range(args.repeat)), key=lambda r: r[0])
+        if baseline is None:
+            baseline = symbols(file_analysis)
+            print(f"文件数: {len(file_analysis)}")
+        same = symbols(file_analysis) == baseline
+        timings.append((workers, best))
+        note = '' if workers <= cores else ' (进程数超过CPU核数)'
+        print(f"{workers:>3} 个进程: {best:6.2f}秒, 加速 {timings[0][1] / best:4.2f}x, "
+              f"结果{'与单进程一致' if same else '与单进程不一致'}{note}")
+
+    profile = profile_serial(args.repo_path)
+    print(f"单进程分解: 逐文件解析 {profile['parallel']:.2f}秒 (可并行), 父进程其余部分 {profile['serial']:.2f}秒, "
+          f"结果序列化往返 {profile['transfer']:.2f}秒 ({profile['payload_mb']:.1f} MB)")
+    for workers in sorted(set(args.workers) - {1}):
+        estimate = profile['serial'] + profile['transfer'] + profile['parallel'] / workers
+        print(f"  {workers:>3} 核估算: {estimate:6.2f}秒, 加速上限 {profile['total'] / estimate:4.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""
+JS扫描基准测试 - 对比原先的六个正则加按行切分注释与js_scanner.scan_javascript
+
+默认生成确定的合成输入：未压缩版本由若干模块组成，每个模块含导入、require、带继承的类
+（构造函数、异步方法、getter、静态方法）、函数声明、箭头函数、对象字面量中的函数表达式、
+行注释和块注释，以及内容像声明或注释的字符串、模板字符串和正则字面量；压缩版本是同样的
+代码去掉注释和多余空白后拼成的一行；第三个输入在压缩版本末尾内嵌一段十六进制数据字符串
+（打包进来的wasm、字体等），原先的 (\w+)\s*:\s*function 在很长的单词上回溯，耗时随其长度平方增长。
+合成输入按构造已知各类符号的真实数量，一并输出以供对照。
+也可以用 --input 指定真实的.js/.ts文件或目录（例如压缩过的第三方库）。
+
+用法: python scripts/bench_js_scanner.py --size-mb 2
+     python scripts/bench_js_scanner.py --input node_modules/puppeteer-core dist/app.min.js
+"""
+import argparse
+import hashlib
+import re
+import sys
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Tuple
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'src'))
+
+from js_scanner import scan_javascript
+
+# 每个合成模块的真实数量：函数声明、箭头函数、对象字面量中的函数表达式各1个，类方法4个
+MODULE_COUNTS = {'functions': 3, 'methods': 4, 'classes': 1, 'imports': 2, 'comments': 3}
+
+UNMINIFIED_MODULE = """\
+// Module {i}: request handling for resource {i}
+import {{ Base{i} }} from './base{i}';
+const lib{i} = require('lib-{i}');
+
+/* Block comment for Service{i}.
+   function notAFunction{i}() {{}} */
+export class Service{i} extends Base{i} {{
+  constructor(client, options) {{
+    super(client);
+    this.options = options || {{}};
+    this.pattern = /\\/\\/ not a comment {i}/g;
+  }}
+
+  async load(id, retries) {{
+    const url = `/api/resource{i}/${{id}}?retries=${{retries > 0 ? retries : 1}}`;
+    return this.client.get(url, {{ label: "class Fake{i} {{}}" }});
+  }}
+
+  get name() {{
+    return 'service-{i}: function fake{i}() {{}}';
+  }}
+
+  static create(client) {{
+    return new Service{i}(client, {{ timeout: {i} * 10 }});
+  }}
+}}
+
+function helper{i}(a, b) {{
+  // sum the two values
+  return a + b / 2;
+}}
+
+const transform{i} = (value, index) => value * index + {i};
+
+export const handlers{i} = {{
+  onEvent{i}: function (event) {{
+    return lib{i}.dispatch("import x from 'nowhere'", event);
+  }},
+}};
+
+"""
+
+MINIFIED_MODULE = (
+    "import{{Base{i}}}from'./base{i}';const lib{i}=require('lib-{i}');"
+    "export class Service{i} extends Base{i}{{constructor(client,options){{super(client);"
+    "this.options=options||{{}};this.pattern=/\\/\\/ not a comment {i}/g}}"
+    "async load(id,retries){{const url=`/api/resource{i}/${{id}}?retries=${{retries>0?retries:1}}`;"
+    "return this.client.get(url,{{label:\"class Fake{i} {{}}\"}})}}"
+    "get name(){{return'service-{i}: function fake{i}() {{}}'}}"
+    "static create(client){{return new Service{i}(client,{{timeout:{i}*10}})}}}}"
+    "function helper{i}(a,b){{return a+b/2}}const transform{i}=(value,index)=>value*index+{i};"
+    "export const handlers{i}={{onEvent{i}:function(event){{"
+    "return lib{i}.dispatch(\"import x from 'nowhere'\",event)}}}};"
+)
+
+
+def synthetic_inputs(size_mb: float, blob_kb: int) -> List[Tuple[str, str, Dict[str, int]]]:
+    """生成约size_mb大小的未压缩输入、其压缩版本和内嵌blob_kb KB数据的压缩版本，并给出按构造已知的真实数量"""
+    chunk = len(UNMINIFIED_MODULE.format(i=0))
+    modules = max(int(size_mb * 1024 * 1024 / chunk), 1)
+    unminified = ''.join(UNMINIFIED_MODULE.format(i=i) for i in range(modules))
+    minified = ''.join(MINIFIED_MODULE.format(i=i) for i in range(modules))
+    blob = ''.join(hashlib.sha256(str(i).encode()).hexdigest() for i in range(blob_kb * 1024 // 64))
+    expected = {key: count * modules for key, count in MODULE_COUNTS.items()}
+    return [('合成未压缩', unminified, expected),
+            ('合成压缩', minified, dict(expected, comments=0)),
+            (f'合成压缩+内嵌{blob_kb}KB数据', f'{minified}const blob="{blob}";', dict(expected, comments=0))]
+
+
+def file_inputs(paths: List[str]) -> List[Tuple[str, List[str], Dict[str, int]]]:
+    inputs = []
+    for path in map(Path, paths):
+        files = sorted(p for p in path.rglob('*') if p.suffix in ('.js', '.ts')) if path.is_dir() else [path]
+        contents = [f.read_text(encoding='utf-8', errors='ignore').replace('\r\n', '\n').replace('\r', '\n')
+                    for f in files]
+        inputs.append((f"{path} ({len(files)} 个文件)", contents, {}))
+    return inputs
+
+
+def scan_before(content: str) -> Dict[str, Any]:
+    """原实现的_analyze_javascript_file加上_extract_comments中的JS部分"""
+    result = {'functions': [], 'classes': [], 'imports': [], 'comments': []}
+    for pattern in (r'function\s+(\w+)\s*\([^)]*\)', r'const\s+(\w+)\s*=\s*\([^)]*\)\s*=>',
+                    r'(\w+)\s*:\s*function\s*\([^)]*\)'):
+        result['functions'].extend({'name': name, 'args': [], 'type': 'javascript'}
+                                   for name in re.findall(pattern, content))
+    result['classes'].extend({'name': name, 'methods': [], 'type': 'javascript'}
+                             for name in re.findall(r'class\s+(\w+)', content))
+    for pattern in (r'import\s+.*\s+from\s+[\'"]([^\'"]+)[\'"]', r'require\s*\(\s*[\'"]([^\'"]+)[\'"]\s*\)'):
+        result['imports'].extend(re.findall(pattern, content))
+    for line in content.split('\n'):
+        stripped = line.strip()
+        if stripped.startswith('//'):
+            result['comments'].append(stripped[2:].strip())
+    return result
+
+
+def counts(results: List[Dict[str, Any]]) -> Dict[str, int]:
+    totals = {'functions': 0, 'methods': 0, 'classes': 0, 'imports': 0, 'comments': 0}
+    for result in results:
+        methods = sum(1 for f in result['functions'] if '.' in f.get('qualname', ''))
+        totals['functions'] += len(result['functions']) - methods
+        totals['methods'] += methods
+        for key in ('classes', 'imports', 'comments'):
+            totals[key] += len(result[key])
+    return totals
+
+
+def best_of(func: Callable[[], Any], repeat: int) -> Tuple[float, Any]:
+    best, result = float('inf'), None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - started)
+    return best, result
+
+
+def describe(totals: Dict[str, int]) -> str:
+    return (f"函数 {totals['functions']:,}, 类方法 {totals['methods']:,}, 类 {totals['classes']:,}, "
+            f"导入 {totals['imports']:,}, 注释 {totals['comments']:,}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='对比原先的正则匹配与单次扫描的JS分析')
+    parser.add_argument('--input', nargs='+', help='.js/.ts文件或目录；不提供时使用合成输入')
+    parser.add_argument('--size-mb', type=float, default=2.0, help='合成未压缩输入的大小 (默认: 2 MB)')
+    parser.add_argument('--blob-kb', type=int, default=16, help='内嵌数据字符串的大小 (默认: 16 KB，原实现耗时随其平方增长)')
+    parser.add_argument('--repeat', type=int, default=3, help='重复次数，取最快的一次 (默认: 3)')
+    args = parser.parse_args()
+
+    if args.input:
+        inputs = file_inputs(args.input)
+    else:
+        inputs = [(name, [content], expected)
+                  for name, content, expected in synthetic_inputs(args.size_mb, args.blob_kb)]
+
+    for name, contents, expected in inputs:
+        megabytes = sum(len(content.encode('utf-8')) for content in contents) / 1024 / 1024
+        longest = max((len(line) for content in contents for line in content.split('\n')), default=0)
+        print(f"{name}: {megabytes:.2f} MB, 最长行 {longest:,} 个字符")
+        before_time, before = best_of(lambda: [scan_before(content) for content in contents], args.repeat)
+        after_time, after = best_of(lambda: [scan_javascript(content) for content in contents], args.repeat)
+        print(f"  原正则:   {before_time:7.3f}秒, {describe(counts(before))}")
+        print(f"  单次扫描: {after_time:7.3f}秒, {describe(counts(after))}")
+        if expected:
+            print(f"  真实数量:           {describe(expected)}")
+
+
+if __name__ == "__main__":
+    main()
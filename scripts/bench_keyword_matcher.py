@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+关键词匹配基准测试 - 对比原先逐个关键词的子串查找与KeywordMatcher
+
+三组对比：
+1. 业务关键词（55个）在源码文件上的查找：原循环、Aho-Corasick自动机、未安装pyahocorasick时的退回实现，
+   分别在全部文件和大于100KB的文件上计时
+2. 大文件上带位置的全部匹配（finditer）：自动机与退回实现
+3. 推理质量评估（每条推理约1KB，每个框架17-45个指标词）：自动机与退回实现的每条耗时
+
+每组都检查各实现的结果一致。
+
+用法: python scripts/bench_keyword_matcher.py --corpus /usr/lib/python3.11
+"""
+import argparse
+import json
+import sys
+import sysconfig
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Tuple
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'src'))
+
+from code_analyzer import BUSINESS_KEYWORDS
+from keyword_matcher import KeywordMatcher
+from reasoning_quality_assessor import ReasoningQualityAssessor
+
+OUTPUT_DIR = Path(__file__).resolve().parent.parent / 'output'
+
+# 大文件的字节数下限
+LARGE_FILE_BYTES = 100 * 1024
+
+
+def best_of(func: Callable[[], Any], repeat: int) -> Tuple[float, Any]:
+    best, result = float('inf'), None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - started)
+    return best, result
+
+
+def fallback(matcher: KeywordMatcher) -> KeywordMatcher:
+    """同一关键词表的退回实现（不使用自动机）"""
+    plain = KeywordMatcher(matcher.keywords)
+    plain._automaton = None
+    return plain
+
+
+def load_texts(corpus: str) -> List[str]:
+    texts = []
+    for path in sorted(Path(corpus).rglob('*.py')):
+        try:
+            texts.append(path.read_text(encoding='utf-8', errors='ignore').lower())
+        except OSError:
+            continue
+    return texts
+
+
+def load_items() -> List[Tuple[Dict[str, Any], str]]:
+    """output/中的问答对和设计方案及其内容类型"""
+    items = []
+    for qa in json.loads((OUTPUT_DIR / 'qa_pairs.json').read_text(encoding='utf-8')):
+        items.append((qa, f"qa_{qa.get('metadata', {}).get('element_type', 'function')}"))
+    for proposal in json.loads((OUTPUT_DIR / 'design_proposals.json').read_text(encoding='utf-8')):
+        items.append((proposal, f"design_{proposal.get('type', 'enhancement')}"))
+    return items
+
+
+def bench_business_keywords(texts: List[str], repeat: int):
+    automaton = KeywordMatcher(BUSINESS_KEYWORDS)
+    plain = fallback(automaton)
+    large = [text for text in texts if len(text.encode('utf-8')) > LARGE_FILE_BYTES]
+    for name, subset in (('全部文件', texts), ('大文件', large)):
+        megabytes = sum(len(text) for text in subset) / 1024 / 1024
+        loop_time, expected = best_of(lambda: [{k for k in BUSINESS_KEYWORDS if k in text} for text in subset], repeat)
+        line = f"  {name} ({len(subset)} 个, {megabytes:.1f} MB): 原循环 {loop_time:.3f}秒"
+        for label, matcher in (('自动机', automaton), ('退回实现', plain)):
+            if label == '自动机' and matcher._automaton is None:
+                line += ', 自动机 未安装pyahocorasick'
+                continue
+            elapsed, found = best_of(lambda: [matcher.found(text) for text in subset], repeat)
+            line += f", {label} {elapsed:.3f}秒{'' if found == expected else ' (结果不一致)'}"
+        print(line)
+    return large
+
+
+def bench_positions(large: List[str], repeat: int):
+    automaton = KeywordMatcher(BUSINESS_KEYWORDS)
+    if automaton._automaton is None:
+        print("  未安装pyahocorasick，跳过")
+        return
+    plain = fallback(automaton)
+    auto_time, auto_matches = best_of(lambda: [sorted(automaton.finditer(text)) for text in large], repeat)
+    plain_time, plain_matches = best_of(lambda: [sorted(plain.finditer(text)) for text in large], repeat)
+    total = sum(len(matches) for matches in auto_matches)
+    print(f"  大文件 {len(large)} 个, 匹配 {total:,} 处: 自动机 {auto_time:.3f}秒, 退回实现 {plain_time:.3f}秒"
+          f"{'' if auto_matches == plain_matches else ' (结果不一致)'}")
+
+
+def bench_assessor(items: List[Tuple[Dict[str, Any], str]], num_items: int, repeat: int):
+    items = [items[i % len(items)] for i in range(num_items)]
+    automaton = ReasoningQualityAssessor()
+    plain = ReasoningQualityAssessor()
+    plain.matchers = {name: fallback(matcher) for name, matcher in plain.matchers.items()}
+    timings = {}
+    results = {}
+    for label, assessor in (('自动机', automaton), ('退回实现', plain)):
+        elapsed, results[label] = best_of(
+            lambda: [assessor.assess_reasoning_quality(item, content_type) for item, content_type in items], repeat)
+        timings[label] = elapsed / len(items) * 1e6
+    same = results['自动机'] == results['退回实现']
+    print(f"  {len(items)} 条: 自动机 {timings['自动机']:.1f} us/条, 退回实现 {timings['退回实现']:.1f} us/条"
+          f"{'' if same else ' (结果不一致)'}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='对比逐个关键词查找与KeywordMatcher的耗时')
+    parser.add_argument('--corpus', default=sysconfig.get_paths()['stdlib'], help='源码目录 (默认: 当前Python的标准库)')
+    parser.add_argument('--num-traces', type=int, default=20000, help='推理质量评估的条目数 (默认: 20000)')
+    parser.add_argument('--repeat', type=int, default=3, help='重复次数，取最快的一次 (默认: 3)')
+    args = parser.parse_args()
+
+    texts = load_texts(args.corpus)
+    print(f"1. 业务关键词查找 ({len(BUSINESS_KEYWORDS)} 个关键词, {args.corpus}):")
+    large = bench_business_keywords(texts, args.repeat)
+    print("2. 带位置的全部匹配:")
+    bench_positions(large, args.repeat)
+    print("3. 推理质量评估 (output/中的问答对和设计方案):")
+    bench_assessor(load_items(), args.num_traces, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+Python文件分析基准测试 - 对比原先的多遍扫描与现在的单次语法树遍历（_PythonFileVisitor）
+
+原实现：ast.walk匹配函数、类和导入，每个函数再做一次ast.walk收集调用，另外逐行扫描以#开头的注释。
+现实现：CodeAnalyzer._analyze_python_file一次遍历收集函数（含异步函数）、类、导入和调用，
+再按行提取注释（含行尾注释，跳过三引号字符串内部的行）。
+
+除耗时外还报告两者找到的函数数（原实现漏掉async def）和注释数，
+并以对整个文件做词法分析（tokenize）得到的注释作为参考，统计注释与参考完全一致的文件数。
+
+用法: python scripts/bench_python_visitor.py --corpus /usr/lib/python3.11
+"""
+import argparse
+import ast
+import contextlib
+import io
+import sys
+import sysconfig
+import time
+import tokenize
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'src'))
+
+from code_analyzer import CodeAnalyzer, _line_offsets
+
+
+def load_files(corpus: str) -> List[Tuple[str, bytes]]:
+    """读取语料中的.py文件，换行统一为\\n（与_analyze_single_file一致）"""
+    files = []
+    for path in sorted(Path(corpus).rglob('*.py')):
+        try:
+            raw = path.read_bytes()
+        except OSError:
+            continue
+        content = raw.decode('utf-8', errors='ignore').replace('\r\n', '\n').replace('\r', '\n')
+        files.append((content, raw))
+    return files
+
+
+def extract_comments_before(content: str) -> List[str]:
+    """原实现的注释提取：只取以#开头的行"""
+    comments = []
+    for line in content.split('\n'):
+        stripped = line.strip()
+        if stripped.startswith('#'):
+            comments.append(stripped[1:].strip())
+    return comments
+
+
+def called_names_before(node: ast.AST) -> List[str]:
+    """原实现：每个函数单独ast.walk一次收集调用"""
+    names = set()
+    for child in ast.walk(node):
+        if isinstance(child, ast.Call):
+            if isinstance(child.func, ast.Name):
+                names.add(child.func.id)
+            elif isinstance(child.func, ast.Attribute):
+                names.add(child.func.attr)
+    return sorted(names)
+
+
+def analyze_before(analyzer: CodeAnalyzer, content: str, raw: bytes) -> Dict[str, Any]:
+    """原实现的_analyze_python_file加上_extract_comments"""
+    result = {'functions': [], 'classes': [], 'imports': [], 'comments': extract_comments_before(content)}
+    try:
+        tree = ast.parse(content)
+    except SyntaxError:
+        return result
+    lines = content.splitlines()
+    line_offsets = _line_offsets(raw)
+    for node in ast.walk(tree):
+        if isinstance(node, ast.FunctionDef):
+            result['functions'].append({
+                'name': node.name,
+                'args': [arg.arg for arg in node.args.args],
+                'docstring': ast.get_docstring(node),
+                'line_number': node.lineno,
+                'end_line_number': getattr(node, 'end_lineno', node.lineno),
+                'is_async': isinstance(node, ast.AsyncFunctionDef),
+                'source_hash': analyzer._source_hash(lines, node),
+                'calls': called_names_before(node),
+                **analyzer._byte_span(line_offsets, node)
+            })
+        elif isinstance(node, ast.ClassDef):
+            result['classes'].append({
+                'name': node.name,
+                'methods': [n.name for n in node.body if isinstance(n, ast.FunctionDef)],
+                'docstring': ast.get_docstring(node),
+                'line_number': node.lineno,
+                'end_line_number': getattr(node, 'end_lineno', node.lineno),
+                'bases': [analyzer._get_node_name(base) for base in node.bases],
+                'source_hash': analyzer._source_hash(lines, node),
+                **analyzer._byte_span(line_offsets, node)
+            })
+        elif isinstance(node, ast.Import):
+            result['imports'].extend(alias.name for alias in node.names)
+        elif isinstance(node, ast.ImportFrom):
+            result['imports'].extend(f"{node.module or ''}.{alias.name}" for alias in node.names)
+    return result
+
+
+def reference_comments(content: str) -> Optional[List[str]]:
+    """对整个文件做词法分析得到的注释；无法完成词法分析时返回None"""
+    try:
+        return [token.string[1:].strip() for token in tokenize.generate_tokens(io.StringIO(content).readline)
+                if token.type == tokenize.COMMENT]
+    except (tokenize.TokenError, SyntaxError):
+        return None
+
+
+def timed(func: Callable[[], List[Dict[str, Any]]], repeat: int) -> Tuple[float, List[Dict[str, Any]]]:
+    best, result = float('inf'), []
+    for _ in range(repeat):
+        with contextlib.redirect_stdout(io.StringIO()):
+            started = time.perf_counter()
+            result = func()
+            best = min(best, time.perf_counter() - started)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='对比多遍扫描与单次语法树遍历的Python文件分析')
+    parser.add_argument('--corpus', default=sysconfig.get_paths()['stdlib'], help='源码目录 (默认: 当前Python的标准库)')
+    parser.add_argument('--repeat', type=int, default=1, help='重复次数，取最快的一次 (默认: 1)')
+    args = parser.parse_args()
+
+    files = load_files(args.corpus)
+    megabytes = sum(len(raw) for _, raw in files) / 1024 / 1024
+    print(f"语料: {args.corpus}, {len(files)} 个文件, {megabytes:.1f} MB")
+
+    analyzer = CodeAnalyzer(args.corpus)
+    before_time, before = timed(lambda: [analyze_before(analyzer, content, raw) for content, raw in files], args.repeat)
+    after_time, after = timed(lambda: [analyzer._analyze_python_file(content, raw) for content, raw in files],
+                              args.repeat)
+
+    references = [reference_comments(content) for content, _ in files]
+    checked = sum(1 for reference in references if reference is not None)
+    for name, elapsed, results in (('多遍扫描', before_time, before), ('单次遍历', after_time, after)):
+        functions = sum(len(result['functions']) for result in results)
+        async_functions = sum(1 for result in results for f in result['functions'] if f.get('is_async'))
+        classes = sum(len(result['classes']) for result in results)
+        comments = sum(len(result['comments']) for result in results)
+        matching = sum(1 for result, reference in zip(results, references)
+                       if reference is not None and result['comments'] == reference)
+        print(f"{name}: {elapsed:.2f}秒, 函数 {functions:,} 个 (异步 {async_functions:,}), 类 {classes:,} 个, "
+              f"注释 {comments:,} 条, 注释与词法分析一致的文件 {matching:,}/{checked:,}")
+    total_reference = sum(len(reference) for reference in references if reference is not None)
+    print(f"词法分析参考: 注释 {total_reference:,} 条; 加速 {before_time / after_time:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+批量推理质量评估基准测试 - 对比逐条assess_reasoning_quality与向量化的assess_batch的吞吐量，
+并检查两者的评估结果逐项一致
+
+条目取自output/中的问答对和设计方案，循环复用到指定数量，每条按序号保留原推理的50%-100%，
+使长度和指标命中各不相同。
+
+用法: python scripts/bench_quality_batch.py --num-items 200000
+"""
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Tuple
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'src'))
+
+import reasoning_quality_assessor
+from reasoning_quality_assessor import ReasoningQualityAssessor
+
+OUTPUT_DIR = Path(__file__).resolve().parent.parent / 'output'
+
+
+def best_of(func: Callable[[], Any], repeat: int) -> Tuple[float, Any]:
+    best, result = float('inf'), None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - started)
+    return best, result
+
+
+def load_items(num_items: int) -> Tuple[List[Dict[str, Any]], List[str]]:
+    sources = []
+    for qa in json.loads((OUTPUT_DIR / 'qa_pairs.json').read_text(encoding='utf-8')):
+        sources.append((qa['reasoning_trace'], f"qa_{qa.get('metadata', {}).get('element_type', 'function')}"))
+    for proposal in json.loads((OUTPUT_DIR / 'design_proposals.json').read_text(encoding='utf-8')):
+        sources.append((proposal['reasoning_trace'], f"design_{proposal.get('type', 'enhancement')}"))
+
+    items, content_types = [], []
+    for i in range(num_items):
+        trace, content_type = sources[i % len(sources)]
+        # 保留原推理的50%-100%
+        keep = len(trace) * (50 + (i // len(sources)) % 51) // 100
+        items.append({'reasoning_trace': trace[:keep]})
+        content_types.append(content_type)
+    return items, content_types
+
+
+def main():
+    parser = argparse.ArgumentParser(description='对比逐条与批量推理质量评估的吞吐量')
+    parser.add_argument('--num-items', type=int, default=200000, help='评估条目数 (默认: 200000)')
+    parser.add_argument('--repeat', type=int, default=3, help='重复次数，取最快的一次 (默认: 3)')
+    args = parser.parse_args()
+
+    if reasoning_quality_assessor.np is None:
+        print("未安装numpy，assess_batch退回逐条评估，无可对比的批量路径")
+        return
+
+    items, content_types = load_items(args.num_items)
+    average = sum(len(item['reasoning_trace']) for item in items) / len(items)
+    print(f"条目数: {len(items)}, 平均推理长度: {average:.0f} 字符, 内容类型 {len(set(content_types))} 种")
+
+    assessor = ReasoningQualityAssessor()
+    scalar_time, scalar = best_of(lambda: [assessor.assess_reasoning_quality(item, content_type)
+                                           for item, content_type in zip(items, content_types)], args.repeat)
+    batch_time, batch = best_of(lambda: assessor.assess_batch(items, content_types), args.repeat)
+
+    print(f"逐条评估: {scalar_time:.2f}秒 ({len(items) / scalar_time:,.0f} 条/秒)")
+    print(f"批量评估: {batch_time:.2f}秒 ({len(items) / batch_time:,.0f} 条/秒), 加速 {scalar_time / batch_time:.2f}x")
+    mismatches = sum(1 for a, b in zip(scalar, batch) if a != b)
+    print(f"结果{'逐项一致' if mismatches == 0 else f'有 {mismatches} 条不一致'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+仓库遍历基准测试 - 对比原先的多次os.walk与单次scandir清单（scan_repository）
+
+原实现：结构统计、文件分析、架构模式识别各做一次os.walk（模式识别内部再次统计结构），
+依赖和文档分析逐个exists()探测根目录文件。新实现：scan_repository遍历一次，
+各步骤共享同一份清单。两者都不读取文件内容，只比较遍历本身。
+
+用法: python scripts/bench_repo_walk.py --files 100000 --dirs 1000
+     python scripts/bench_repo_walk.py --repo-path /path/to/repo
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, Tuple
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'src'))
+
+from code_analyzer import CodeAnalyzer
+from repo_walker import scan_repository
+
+
+def make_tree(root: Path, num_files: int, num_dirs: int, ext: str):
+    """在root下生成num_dirs个目录（两层），文件均匀分布，内容为空"""
+    width = max(int(num_dirs ** 0.5), 1)
+    dirs = [root / f'pkg{i // width:03d}' / f'mod{i % width:03d}' for i in range(num_dirs)]
+    for directory in dirs:
+        directory.mkdir(parents=True, exist_ok=True)
+    for i in range(num_files):
+        (dirs[i % num_dirs] / f'file{i:06d}{ext}').touch()
+
+
+def walk_before(repo_path: Path) -> Dict[str, Any]:
+    """原实现的遍历部分：三次os.walk加根目录文件的exists()探测"""
+    supported = CodeAnalyzer.SUPPORTED_EXTENSIONS
+
+    def structure() -> Dict[str, Any]:
+        result = {'directories': [], 'file_types': {}, 'total_files': 0, 'depth': 0}
+        for root, dirs, files in os.walk(repo_path):
+            result['depth'] = max(result['depth'], root.replace(str(repo_path), '').count(os.sep))
+            rel_path = os.path.relpath(root, repo_path)
+            if rel_path != '.':
+                result['directories'].append(rel_path)
+            for file in files:
+                result['total_files'] += 1
+                ext = Path(file).suffix.lower()
+                result['file_types'][ext] = result['file_types'].get(ext, 0) + 1
+        return result
+
+    result = structure()
+    analyzable = [Path(root) / file for root, _, files in os.walk(repo_path)
+                  for file in files if Path(file).suffix.lower() in supported]
+    # 架构模式识别再次统计结构
+    structure()
+    for name in ('requirements.txt', 'package.json', 'Pipfile', 'pyproject.toml', 'setup.py',
+                 'README.md', 'readme.md', 'README.txt', 'readme.txt', 'CONTRIBUTING.md',
+                 'LICENSE', 'LICENSE.txt', 'LICENSE.md', 'license'):
+        (repo_path / name).exists()
+    return {'total_files': result['total_files'], 'analyzable_files': len(analyzable)}
+
+
+def walk_after(repo_path: Path) -> Dict[str, Any]:
+    """现实现：单次scan_repository，结构、模式、依赖和文档分析共享清单"""
+    analyzer = CodeAnalyzer(str(repo_path))
+    inventory = scan_repository(str(repo_path), stat_extensions=CodeAnalyzer.SUPPORTED_EXTENSIONS)
+    structure = analyzer._analyze_structure(inventory)
+    analyzer._identify_architecture_patterns(structure)
+    analyzer._analyze_dependencies(inventory)
+    analyzer._analyze_documentation(inventory)
+    analyzable = inventory.files_with_extensions(CodeAnalyzer.SUPPORTED_EXTENSIONS)
+    return {'total_files': structure['total_files'], 'analyzable_files': len(analyzable),
+            # 清单中读取了大小的文件各有一次DirEntry.stat调用，该调用无法在Python层拦截
+            'dirent_stats': sum(1 for entry in inventory.files if entry.size >= 0)}
+
+
+def measure(func: Callable[[Path], Dict[str, Any]], repo_path: Path, repeat: int) -> Tuple[float, Dict[str, Any]]:
+    """取repeat次中最快的一次；统计os.scandir（os.walk内部也调用它）和os.stat的调用次数"""
+    counts = {'scandir': 0, 'stat': 0}
+    original_scandir, original_stat = os.scandir, os.stat
+
+    def counting_scandir(*args, **kwargs):
+        counts['scandir'] += 1
+        return original_scandir(*args, **kwargs)
+
+    def counting_stat(*args, **kwargs):
+        counts['stat'] += 1
+        return original_stat(*args, **kwargs)
+
+    best, result = float('inf'), {}
+    for _ in range(repeat):
+        counts.update(scandir=0, stat=0)
+        os.scandir, os.stat = counting_scandir, counting_stat
+        try:
+            started = time.perf_counter()
+            result = func(repo_path)
+            best = min(best, time.perf_counter() - started)
+        finally:
+            os.scandir, os.stat = original_scandir, original_stat
+    return best, dict(result, **counts)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='对比多次os.walk与单次scandir清单的遍历耗时和系统调用数')
+    parser.add_argument('--repo-path', help='使用已有的目录树；不提供时生成合成目录树')
+    parser.add_argument('--files', type=int, default=100000, help='合成目录树的文件数 (默认: 100000)')
+    parser.add_argument('--dirs', type=int, default=1000, help='合成目录树的目录数 (默认: 1000)')
+    parser.add_argument('--ext', default='.c', help='合成文件的扩展名 (默认: .c，不在分析范围内)')
+    parser.add_argument('--repeat', type=int, default=3, help='重复次数，取最快的一次 (默认: 3)')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        if args.repo_path:
+            repo_path = Path(args.repo_path)
+        else:
+            repo_path = Path(work_dir)
+            started = time.perf_counter()
+            make_tree(repo_path, args.files, args.dirs, args.ext)
+            print(f"生成合成目录树: {args.files} 个{args.ext}文件, {args.dirs} 个目录, "
+                  f"用时 {time.perf_counter() - started:.1f}秒")
+
+        before_time, before = measure(walk_before, repo_path, args.repeat)
+        after_time, after = measure(walk_after, repo_path, args.repeat)
+
+    for name, elapsed, counts in (('多次os.walk', before_time, before), ('单次scandir清单', after_time, after)):
+        print(f"{name}: {elapsed:.2f}秒, 目录扫描 {counts['scandir']:,} 次, os.stat {counts['stat']:,} 次, "
+              f"文件 {counts['total_files']:,} 个")
+    print(f"单次清单另有 {after['dirent_stats']:,} 次DirEntry.stat（只对可分析扩展名的文件读取大小）; "
+          f"加速 {before_time / after_time:.1f}x")
+    if (before['total_files'], before['analyzable_files']) != (after['total_files'], after['analyzable_files']):
+        print(f"警告: 两种遍历的文件数不一致 {before} / {after}")
+
+
+if __name__ == "__main__":
+    main()
@@ -4,9 +4,15 @@
 为现有系统提供基于项目规模的智能默认QA数量建议
 """
 import json
+import sys
 from pathlib import Path
 from typing import Dict, Tuple
 
+sys.path.insert(0, str(Path(__file__).resolve().parent / 'src'))
+
+from ignore_rules import IgnoreRules
+from repo_walker import scan_repository
+
 def calculate_smart_defaults(repo_path: str) -> Tuple[int, str]:
     """
     基于代码仓库快速分析计算智能默认QA数量
@@ -21,15 +27,21 @@ def calculate_smart_defaults(repo_path: str) -> Tuple[int, str]:
     python_files = 0
     estimated_functions = 0
     
-    for file_path in repo_path.rglob("*"):
-        if file_path.is_file() and not any(skip in str(file_path) for skip in ['.git', '__pycache__', '.pyc', 'node_modules']):
+    # 与代码分析器共用忽略规则：.gitignore、内置第三方目录和文件大小上限
+    ignore_rules = IgnoreRules()
+    inventory = scan_repository(str(repo_path), stat_extensions={'.py'}, ignore_rules=ignore_rules)
+    
+    for entry in inventory.files:
+        if entry.ext != '.pyc':
             total_files += 1
             
-            if file_path.suffix == '.py':
+            if entry.path.endswith('.py'):
                 python_files += 1
+                if ignore_rules.exceeds_size_limit(entry.size):
+                    continue
                 # 粗略估算函数数量（每个Python文件平均5-10个函数）
                 try:
-                    with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
+                    with open(entry.path, 'r', encoding='utf-8', errors='ignore') as f:
                         content = f.read()
                         # 统计def和class关键字
                         estimated_functions += content.count('\ndef ') + content.count('\nclass ') + content.count('def ') + content.count('class ')
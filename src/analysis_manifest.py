@@ -0,0 +1,88 @@
+"""
+分析清单 - 持久化记录每个文件的指纹和分析结果，支持增量分析
+"""
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional
+
+
+class AnalysisManifest:
+    """文件分析清单：路径 → (大小, 修改时间, 内容哈希) → 单文件分析结果"""
+
+    VERSION = 6
+
+    def __init__(self, manifest_path: str):
+        self.manifest_path = Path(manifest_path)
+        self.files: Dict[str, Dict[str, Any]] = {}
+        self.existed = False
+        self._load()
+
+    def lookup(self, rel_path: str, file_path: Path, size: int, mtime: float) -> Optional[Dict[str, Any]]:
+        """查找未变化文件的分析结果，文件已变化时返回None"""
+        entry = self.files.get(rel_path)
+        if entry is None or entry['size'] != size:
+            return None
+
+        if entry['mtime'] == mtime:
+            return entry['analysis']
+
+        # 修改时间变化但内容可能未变（例如重新checkout），比较内容哈希
+        if entry['hash'] == self.hash_file(file_path):
+            entry['mtime'] = mtime
+            return entry['analysis']
+
+        return None
+
+    def previous_analysis(self, rel_path: str) -> Optional[Dict[str, Any]]:
+        """获取文件上一次的分析结果"""
+        entry = self.files.get(rel_path)
+        return entry['analysis'] if entry else None
+
+    def update(self, rel_path: str, file_path: Path, size: int, mtime: float, analysis: Dict[str, Any]):
+        """记录文件的最新指纹和分析结果"""
+        self.files[rel_path] = {
+            'size': size,
+            'mtime': mtime,
+            'hash': self.hash_file(file_path),
+            'analysis': analysis
+        }
+
+    def prune(self, existing_paths: Iterable[str]) -> List[str]:
+        """移除已不存在的文件，返回被移除的路径"""
+        existing = set(existing_paths)
+        removed = sorted(path for path in self.files if path not in existing)
+        for path in removed:
+            del self.files[path]
+        return removed
+
+    def save(self):
+        """写入清单文件（先写临时文件再替换，避免中断时损坏）"""
+        self.manifest_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.manifest_path.with_suffix('.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'version': self.VERSION, 'files': self.files}, f, ensure_ascii=False)
+        os.replace(tmp_path, self.manifest_path)
+
+    @staticmethod
+    def hash_file(file_path: Path) -> str:
+        """计算文件内容哈希"""
+        digest = hashlib.sha256()
+        with open(file_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def _load(self):
+        """加载已有清单，版本不匹配或损坏时视为空清单"""
+        if not self.manifest_path.exists():
+            return
+        try:
+            with open(self.manifest_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get('version') == self.VERSION:
+                self.files = data.get('files', {})
+                self.existed = True
+        except (OSError, ValueError) as e:
+            print(f" 无法读取分析清单 {self.manifest_path}: {e}")
@@ -0,0 +1,125 @@
+"""
+流式分析报告 - JSONL格式，首行为摘要头，之后每行一个文件的分析结果
+"""
+import json
+import os
+import threading
+from collections.abc import Mapping
+from pathlib import Path
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+
+class AnalysisReportWriter:
+    """边分析边写出报告，内存中只保留 路径 → 文件偏移 的索引"""
+
+    def __init__(self, report_path: str, summary: Dict[str, Any]):
+        self.report_path = Path(report_path)
+        self.report_path.parent.mkdir(parents=True, exist_ok=True)
+        # 先写临时文件，完成后再替换，避免中断时留下半份报告
+        self._tmp_path = self.report_path.with_suffix(self.report_path.suffix + '.tmp')
+        self._file = open(self._tmp_path, 'wb')
+        self._offset = 0
+        self.offsets: Dict[str, int] = {}
+        self._write_record(dict(summary, record_type='summary'))
+
+    def write_file(self, rel_path: str, analysis: Dict[str, Any]):
+        """写出单个文件的分析结果"""
+        self.offsets[rel_path] = self._offset
+        self._write_record({'record_type': 'file', 'path': rel_path, 'analysis': analysis})
+
+    def close(self, footer: Optional[Dict[str, Any]] = None) -> 'FileAnalysisIndex':
+        """写出结尾记录并落盘，返回可惰性读取的file_analysis映射"""
+        if footer:
+            self._write_record(dict(footer, record_type='footer'))
+        self._file.close()
+        os.replace(self._tmp_path, self.report_path)
+        return FileAnalysisIndex(str(self.report_path), self.offsets)
+
+    def _write_record(self, record: Dict[str, Any]):
+        """写出一行JSON记录"""
+        data = (json.dumps(record, ensure_ascii=False) + '\n').encode('utf-8')
+        self._file.write(data)
+        self._offset += len(data)
+
+
+class FileAnalysisIndex(Mapping):
+    """与file_analysis字典接口一致的惰性映射，按需从JSONL报告中读取单个文件的结果"""
+
+    def __init__(self, report_path: str, offsets: Dict[str, int]):
+        self.report_path = report_path
+        self._offsets = offsets
+        self._file = None
+        self._lock = threading.Lock()
+
+    def __getitem__(self, rel_path: str) -> Dict[str, Any]:
+        offset = self._offsets[rel_path]
+        with self._lock:
+            if self._file is None:
+                self._file = open(self.report_path, 'rb')
+            self._file.seek(offset)
+            line = self._file.readline()
+        return json.loads(line)['analysis']
+
+    def __contains__(self, rel_path: object) -> bool:
+        return rel_path in self._offsets
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._offsets)
+
+    def __len__(self) -> int:
+        return len(self._offsets)
+
+    def items(self) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        """顺序读取全部文件记录，每次迭代使用独立的文件句柄，可在多线程中同时使用"""
+        for record in _iter_records(self.report_path):
+            if record.get('record_type') == 'file':
+                yield record['path'], record['analysis']
+
+    def values(self) -> Iterator[Dict[str, Any]]:
+        for _, analysis in self.items():
+            yield analysis
+
+
+class AnalysisReportReader:
+    """读取流式分析报告"""
+
+    def __init__(self, report_path: str):
+        self.report_path = report_path
+
+    def summary(self) -> Dict[str, Any]:
+        """读取摘要头（不含文件记录）"""
+        with open(self.report_path, 'rb') as f:
+            record = json.loads(f.readline())
+        record.pop('record_type', None)
+        return record
+
+    def iter_files(self) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        """逐个产出 (相对路径, 分析结果)"""
+        for record in _iter_records(self.report_path):
+            if record.get('record_type') == 'file':
+                yield record['path'], record['analysis']
+
+    def load(self) -> Dict[str, Any]:
+        """重建分析结果，file_analysis为惰性映射，只扫描一遍建立偏移索引"""
+        result: Dict[str, Any] = {}
+        offsets: Dict[str, int] = {}
+        offset = 0
+        with open(self.report_path, 'rb') as f:
+            for line in f:
+                record = json.loads(line)
+                record_type = record.pop('record_type', None)
+                if record_type == 'file':
+                    offsets[record['path']] = offset
+                elif record_type in ('summary', 'footer'):
+                    result.update(record)
+                offset += len(line)
+        result['file_analysis'] = FileAnalysisIndex(self.report_path, offsets)
+        return result
+
+
+def _iter_records(report_path: str) -> Iterator[Dict[str, Any]]:
+    """逐行解析报告记录"""
+    with open(report_path, 'rb') as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
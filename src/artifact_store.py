@@ -0,0 +1,92 @@
+"""
+运行期产物存储 - 各阶段的结果和派生指标在一次运行中只加载或计算一次，写盘推迟到需要时进行
+"""
+import json
+import threading
+from typing import Any, Callable, Dict, Optional
+
+
+# 产物写盘函数: (产物, 输出路径)
+ArtifactWriter = Callable[[Any, str], None]
+
+_MISSING = object()
+
+
+class ArtifactStore:
+    """
+    一次运行内的产物存储，按名称保存各阶段的结果（问答对、设计方案、质量报告等）
+
+    put: 登记阶段结果及其输出路径、写盘函数，暂不写盘
+    load_json: 本次运行已登记的产物直接返回，否则从磁盘读取一次后缓存
+    memoize: 派生指标只计算一次，之后直接返回缓存结果
+    persist: 把尚未写盘的产物写出；读取产物路径的下游（如外部工具）之前调用
+    """
+
+    def __init__(self):
+        self._values: Dict[str, Any] = {}
+        self._pending: Dict[str, tuple] = {}
+        self._lock = threading.RLock()
+        self._counters = {'computed': 0, 'reused': 0, 'loaded_from_disk': 0, 'persisted': 0}
+
+    def put(self, name: str, value: Any, path: Optional[str] = None,
+            writer: Optional[ArtifactWriter] = None):
+        """登记产物；提供path和writer时标记为待写盘"""
+        with self._lock:
+            self._values[name] = value
+            if path is not None and writer is not None:
+                self._pending[name] = (path, writer)
+
+    def get(self, name: str, default: Any = None) -> Any:
+        """取出已登记的产物"""
+        with self._lock:
+            return self._values.get(name, default)
+
+    def load_json(self, name: str, path: str, default: Any = None) -> Any:
+        """取出产物，本次运行尚未登记时从JSON文件读取一次并缓存；文件不存在或无法解析时返回default"""
+        with self._lock:
+            value = self._values.get(name, _MISSING)
+            if value is not _MISSING:
+                self._counters['reused'] += 1
+                return value
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    value = json.load(f)
+                self._counters['loaded_from_disk'] += 1
+            except (OSError, ValueError):
+                return default
+            self._values[name] = value
+            return value
+
+    def memoize(self, name: str, compute: Callable[[], Any]) -> Any:
+        """返回派生结果，首次调用时计算并缓存"""
+        with self._lock:
+            value = self._values.get(name, _MISSING)
+            if value is not _MISSING:
+                self._counters['reused'] += 1
+                return value
+            value = compute()
+            self._counters['computed'] += 1
+            self._values[name] = value
+            return value
+
+    def invalidate(self, name: str):
+        """丢弃缓存的产物或派生结果（上游产物变化时调用）"""
+        with self._lock:
+            self._values.pop(name, None)
+
+    def persist(self, name: Optional[str] = None):
+        """把待写盘的产物写出，name为None时写出全部"""
+        with self._lock:
+            names = [name] if name is not None else list(self._pending)
+            for pending_name in names:
+                entry = self._pending.pop(pending_name, None)
+                if entry is None:
+                    continue
+                path, writer = entry
+                writer(self._values[pending_name], path)
+                self._counters['persisted'] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        """存储统计"""
+        with self._lock:
+            return {'artifacts': len(self._values), 'pending_writes': len(self._pending), **self._counters}
@@ -0,0 +1,86 @@
+"""
+提示词前缀的离线检查 - 用假Anthropic客户端运行问答和设计方案生成，检查每类提示词实际发送的
+系统提示词前缀逐字节不变（每类只有一个哈希），使服务端的提示词缓存能够命中
+
+用法: python check_prompt_prefix.py --repo-path .. --num-qa-pairs 30 --num-proposals 8
+"""
+import argparse
+import hashlib
+import json
+import tempfile
+from collections import Counter
+from pathlib import Path
+from typing import Any, Dict, List, Set
+
+from claude_client import DEFAULT_MODEL, ClaudeClient
+from code_analyzer import CodeAnalyzer
+from design_generator import DESIGN_FORMATS, DesignGenerator
+from fake_anthropic import FakeAnthropic, check
+from qa_generator import QA_BATCH_FORMAT, QA_INSTRUCTIONS, QAGenerator
+
+# 系统提示词最后一块 → 提示词种类
+_PROMPT_KINDS = dict({QA_INSTRUCTIONS: 'qa', QA_BATCH_FORMAT: 'qa_batch'},
+                     **{fmt: f'design:{kind}' for kind, fmt in DESIGN_FORMATS.items()})
+
+
+def prompt_kind(params: Dict[str, Any]) -> str:
+    """请求所属的提示词种类，由系统提示词的最后一块确定"""
+    system = params.get('system') or []
+    return _PROMPT_KINDS.get(system[-1]['text'], 'unknown') if system else 'no_system'
+
+
+def prefix_hash(params: Dict[str, Any]) -> str:
+    """实际发送的前缀（工具声明和系统提示词块，含缓存标记）的哈希"""
+    prefix = {'tools': params.get('tools'), 'system': params.get('system')}
+    return hashlib.sha256(json.dumps(prefix, ensure_ascii=False, sort_keys=True).encode('utf-8')).hexdigest()[:16]
+
+
+def main():
+    """问答（逐个和批量）与设计方案（两个生成器实例）共用一个假客户端，按提示词种类汇总前缀哈希"""
+    parser = argparse.ArgumentParser(description='用本地假Anthropic客户端检查每类提示词的前缀是否不变')
+    parser.add_argument('--repo-path', default=str(Path(__file__).resolve().parent.parent), help='要分析的代码仓库路径')
+    parser.add_argument('--num-qa-pairs', type=int, default=30, help='每轮生成问答对数量 (默认: 30)')
+    parser.add_argument('--num-proposals', type=int, default=8, help='每个生成器生成设计方案数量 (默认: 8)')
+    args = parser.parse_args()
+
+    client = FakeAnthropic()
+    claude = ClaudeClient(client, DEFAULT_MODEL)
+    with tempfile.TemporaryDirectory() as work_dir:
+        analysis = CodeAnalyzer(args.repo_path).analyze_repository(
+            report_path=str(Path(work_dir) / 'analysis_report.jsonl'))
+        # 分析结果按需从报告文件读取，生成须在临时目录删除前完成
+        element_types: Counter = Counter()
+        for batch_size in (1, 4):
+            generator = QAGenerator('test', claude=claude)
+            generator.qa_batch_size = batch_size
+            generator.rng.seed(0)
+            qa_pairs = generator.generate_qa_pairs(analysis, args.num_qa_pairs)
+            element_types.update(qa['metadata'].get('element_type') for qa in qa_pairs)
+        for requirements in (['支持多租户'], ['增加审计日志', '提供批量导出接口']):
+            DesignGenerator('test', claude=claude).generate_design_proposals(analysis, requirements,
+                                                                             args.num_proposals)
+
+    hashes: Dict[str, Set[str]] = {}
+    prompts: Dict[str, Set[str]] = {}
+    for params in client.requests:
+        kind = prompt_kind(params)
+        hashes.setdefault(kind, set()).add(prefix_hash(params))
+        prompts.setdefault(kind, set()).add(json.dumps(params['messages'], ensure_ascii=False))
+    print(f"请求 {len(client.requests)} 个, 问答元素类型 {dict(element_types)}")
+    for kind in sorted(hashes):
+        print(f"  {kind}: 请求 {sum(1 for p in client.requests if prompt_kind(p) == kind)} 个, "
+              f"不同用户消息 {len(prompts[kind])} 个, 前缀哈希 {sorted(hashes[kind])}")
+
+    expected: List[str] = ['qa', 'qa_batch'] + [f'design:{kind}' for kind in DESIGN_FORMATS]
+    check(set(hashes) == set(expected), f'提示词种类应为 {expected}，实际为 {sorted(hashes)}')
+    check(len(element_types) >= 2, '问答应覆盖多种元素类型')
+    check(all(len(prompts[kind]) >= 2 for kind in expected), '每类提示词应包含多个不同的用户消息')
+    for kind in expected:
+        check(len(hashes[kind]) == 1, f'{kind} 的前缀哈希应只有一个，实际为 {len(hashes[kind])} 个')
+    distinct = claude.stats()['requests']['prompt_cache']['distinct_prefixes']
+    check(distinct == len(expected), f'客户端统计的不同前缀数应为 {len(expected)}，实际为 {distinct}')
+    print(f"检查通过: {len(expected)} 类提示词各只有一个前缀哈希")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""
+重试与限流的离线检查 - 通过真实的anthropic SDK向注入故障的本地替身服务发送请求，
+检查可重试错误按原因重试、429的退避不早于retry-after，以及令牌桶限流的等待时间
+
+用法: python check_retries.py --num-prompts 200 --max-concurrency 8
+"""
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+from claude_client import DEFAULT_MODEL, ClaudeClient, create_anthropic_client
+from fake_anthropic import check
+from local_batch_server import LocalBatchServer
+from rate_limiter import RateLimiter, RetryPolicy, TokenBucket
+
+
+class RecordingRetryPolicy(RetryPolicy):
+    """记录每次重试前服务端给出的retry-after和实际的等待时间"""
+
+    def __init__(self, *args: Any, **kwargs: Any):
+        super().__init__(*args, **kwargs)
+        self.waits: List[Tuple[Optional[float], float]] = []
+
+    def delay(self, attempt: int, retry_after: Optional[float] = None) -> float:
+        delay = super().delay(attempt, retry_after)
+        self.waits.append((retry_after, delay))
+        return delay
+
+
+def run_prompts(server: LocalBatchServer, num_prompts: int, max_concurrency: int,
+                max_retries: int) -> Tuple[int, Dict[str, Any], RecordingRetryPolicy]:
+    """并发发送num_prompts个不同的提示词，返回成功数、请求统计和重试记录"""
+    policy = RecordingRetryPolicy(max_retries, base_delay=0.05, max_delay=0.5)
+    claude = ClaudeClient(create_anthropic_client('test', server.base_url), DEFAULT_MODEL,
+                          retry_policy=policy, max_concurrency=max_concurrency)
+
+    def send(index: int) -> bool:
+        try:
+            claude.complete(f'第{index}个检查用的提示词', 64, label='check')
+            return True
+        except Exception:
+            return False
+
+    with ThreadPoolExecutor(max_workers=max_concurrency) as executor:
+        succeeded = sum(executor.map(send, range(num_prompts)))
+    return succeeded, claude.stats()['requests'], policy
+
+
+def check_retries(num_prompts: int, max_concurrency: int, retry_after: float):
+    """同一组提示词分别在不重试和重试5次下发送，故障按请求内容确定，两次遇到的首轮故障相同"""
+    for max_retries in (0, 5):
+        server = LocalBatchServer(port=0, rate_limit_rate=0.3, overload_rate=0.1, disconnect_rate=0.05,
+                                  retry_after_seconds=retry_after)
+        server.start()
+        started = time.monotonic()
+        try:
+            succeeded, requests, policy = run_prompts(server, num_prompts, max_concurrency, max_retries)
+        finally:
+            server.shutdown()
+        faults = server.stats()
+        injected = faults['rate_limited'] + faults['overloaded'] + faults['disconnected']
+        print(f"max_retries={max_retries}: 成功 {succeeded}/{num_prompts}, 用时 {time.monotonic() - started:.1f}秒, "
+              f"重试 {requests['retries']} 次 {requests['retry_reasons']}, "
+              f"退避等待 {requests['backoff_wait_seconds']}秒")
+
+        check(succeeded == requests['succeeded'] == faults['messages'], '成功数与服务端处理的请求数不一致')
+        check(requests['retries'] + requests['failed'] == injected, '每次注入的故障应当对应一次重试或一次最终失败')
+        if max_retries == 0:
+            check(requests['retries'] == 0 and requests['failed'] == injected, 'max_retries=0时不应重试')
+            continue
+        reasons = requests['retry_reasons']
+        check(reasons.get('429', 0) > 0 and reasons.get('529', 0) > 0 and reasons.get('APIConnectionError', 0) > 0,
+              '429、529和断开的连接都应当被重试')
+        check(reasons.get('429', 0) <= faults['rate_limited'] and reasons.get('529', 0) <= faults['overloaded'],
+              '重试原因与注入的故障不一致')
+        check(succeeded >= num_prompts * 0.95, '重试5次后成功率应不低于95%')
+        honoured = [delay for hint, delay in policy.waits if hint is not None]
+        check(len(honoured) == reasons['429'] and all(delay >= retry_after for delay in honoured),
+              '429的退避等待应不早于retry-after')
+
+
+def check_token_bucket():
+    """容量为一分钟额度：先取走全部容量，再取20个按每秒10个补充，约需2秒"""
+    bucket = TokenBucket(600)
+    started = time.monotonic()
+    for _ in range(620):
+        bucket.acquire()
+    elapsed = time.monotonic() - started
+    print(f"TokenBucket(600/分钟): 620次取令牌用时 {elapsed:.2f}秒 (预期2.0秒)")
+    check(1.8 <= elapsed <= 2.5, 'RPM令牌桶的等待时间与速率不符')
+
+
+def check_token_limit():
+    """每分钟60000个token：60个1000 token的请求取走全部容量，第61个等待1000/1000=1秒"""
+    limiter = RateLimiter(tokens_per_minute=60000)
+    started = time.monotonic()
+    waited = sum(limiter.acquire(1000) for _ in range(61))
+    elapsed = time.monotonic() - started
+    print(f"RateLimiter(TPM 60000): 61个1000 token的请求用时 {elapsed:.2f}秒 (预期1.0秒)")
+    check(0.9 <= elapsed <= 1.5 and abs(waited - elapsed) < 0.2, 'TPM限流的等待时间与速率不符')
+    # 失败的请求归还预扣额度后，下一个请求无需等待
+    limiter.record_usage(1000, 0)
+    check(limiter.acquire(1000) < 0.05, '归还的token额度应立即可用')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='用注入故障的本地替身服务检查重试、退避与限流')
+    parser.add_argument('--num-prompts', type=int, default=200, help='发送的提示词数量 (默认: 200)')
+    parser.add_argument('--max-concurrency', type=int, default=8, help='并发请求数 (默认: 8)')
+    parser.add_argument('--retry-after-seconds', type=float, default=0.2,
+                        help='替身服务429响应中的retry-after，单位秒 (默认: 0.2)')
+    args = parser.parse_args()
+
+    check_retries(args.num_prompts, args.max_concurrency, args.retry_after_seconds)
+    check_token_bucket()
+    check_token_limit()
+    print("检查通过: 可重试错误按原因重试，429的退避遵守retry-after，令牌桶等待时间符合速率")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+"""
+流式流水线的离线检查 - 用假Anthropic客户端按 --streaming-pipeline 的方式生成问答对，
+检查函数和类的请求在代码分析结束前就已发出，且没有出错的生成任务
+
+用法: python check_streaming_pipeline.py --repo-path .. --num-qa-pairs 20 --max-concurrency 3
+"""
+import argparse
+import tempfile
+from pathlib import Path
+
+from claude_client import DEFAULT_MODEL, ClaudeClient
+from code_analyzer import CodeAnalyzer
+from fake_anthropic import FakeAnthropic, check
+from qa_generator import QAGenerator
+from streaming_pipeline import AnalysisStream
+
+# 用户消息的开头 → 请求的元素类型
+_PROMPT_PREFIXES = {'请基于以下代码信息生成一个函数问答对': 'function', '请为以下类信息生成一个类问答对': 'class'}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='用本地假Anthropic客户端检查流式流水线')
+    parser.add_argument('--repo-path', default=str(Path(__file__).resolve().parent.parent), help='要分析的代码仓库路径')
+    parser.add_argument('--num-qa-pairs', type=int, default=20, help='生成问答对数量 (默认: 20)')
+    parser.add_argument('--max-concurrency', type=int, default=3, help='并发上限 (默认: 3)')
+    parser.add_argument('--qa-batch-size', type=int, default=1, help='批量函数问答的大小 (默认: 1)')
+    args = parser.parse_args()
+
+    client = FakeAnthropic(delay=0.02)
+    generator = QAGenerator('test', max_concurrency=args.max_concurrency,
+                            claude=ClaudeClient(client, DEFAULT_MODEL, max_concurrency=args.max_concurrency))
+    generator.qa_batch_size = args.qa_batch_size
+    generator.rng.seed(0)
+    with tempfile.TemporaryDirectory() as work_dir:
+        stream = AnalysisStream(CodeAnalyzer(args.repo_path), report_path=str(Path(work_dir) / 'analysis_report.jsonl'))
+        _, qa_pairs = generator.generate_qa_pairs_streaming(stream, args.num_qa_pairs)
+    analysis_end = stream.started_at + stream.stats()['analysis_seconds']
+
+    early = {'function': 0, 'class': 0}
+    for params, arrival in zip(client.requests, client.arrivals):
+        prompt = params['messages'][0]['content']
+        kind = next((kind for prefix, kind in _PROMPT_PREFIXES.items() if prompt.startswith(prefix)), None)
+        if kind is not None and arrival < analysis_end:
+            early[kind] += 1
+    print(f"请求 {len(client.requests)} 个, 分析结束前发出 {early}, 问答对 {len(qa_pairs)} 个, "
+          f"出错任务 {generator.engine.errors} 个, 流式统计 {dict(stream.stats(), **generator.streaming_stats)}")
+
+    check(generator.engine.errors == 0, f'有 {generator.engine.errors} 个生成任务出错')
+    check(early['function'] > 0 and early['class'] > 0, '函数和类的请求应在代码分析结束前发出')
+    check(generator.streaming_stats['requests_submitted'] > 0, '分析过程中没有提交任何请求')
+    check(len(qa_pairs) >= args.num_qa_pairs, '生成的问答对数量不足')
+    print("检查通过: 函数和类的请求与代码分析重叠执行，没有出错的生成任务")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,469 @@
+"""
+Claude API调用封装 - 统一处理请求发送、响应缓存、限流与失败重试
+"""
+import hashlib
+import json
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+try:
+    import anthropic
+    from anthropic import Anthropic
+    ANTHROPIC_AVAILABLE = True
+    _CONNECTION_ERRORS = (anthropic.APIConnectionError, ConnectionError, TimeoutError)
+except ImportError:
+    ANTHROPIC_AVAILABLE = False
+    _CONNECTION_ERRORS = (ConnectionError, TimeoutError)
+
+from json_stream import JSONStreamParser, MalformedResponse
+from message_batches import BatchQueue
+from prompt_budget import estimate_tokens
+from rate_limiter import RateLimiter, RetryPolicy
+from response_cache import ResponseCache
+from structured_output import OutputTool, tool_input
+
+
+DEFAULT_MODEL = "claude-3-5-sonnet-20241022"
+
+# 可重试的HTTP状态码：超时、冲突、限流、服务端错误和过载
+RETRYABLE_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504, 529}
+
+# 单个请求中提示词缓存断点的数量上限
+MAX_CACHE_BREAKPOINTS = 4
+
+
+def create_anthropic_client(api_key: str, base_url: Optional[str] = None) -> Any:
+    """创建Anthropic客户端，关闭SDK自带重试，由ClaudeClient统一负责重试和统计"""
+    if not ANTHROPIC_AVAILABLE:
+        raise ImportError("需要安装anthropic包: pip install anthropic")
+    return Anthropic(api_key=api_key, base_url=base_url, max_retries=0)
+
+
+class ClaudeClient:
+    """对Anthropic客户端的轻量封装，所有生成器共享同一调用入口"""
+
+    def __init__(self, client: Any, model: str, cache: Optional[ResponseCache] = None,
+                 retry_policy: Optional[RetryPolicy] = None,
+                 rate_limiter: Optional[RateLimiter] = None,
+                 max_concurrency: Optional[int] = None):
+        self.client = client
+        self.model = model
+        self.cache = cache
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.rate_limiter = rate_limiter or RateLimiter()
+        # 全局并发上限：多个生成阶段同时运行时，同时在途的请求总数不超过该值
+        self._slots = threading.BoundedSemaphore(max_concurrency) if max_concurrency else None
+        self._lock = threading.Lock()
+        self._latencies: List[float] = []
+        self._counters = {
+            'api_calls': 0, 'succeeded': 0, 'failed': 0, 'retries': 0,
+            'rate_limit_wait_seconds': 0.0, 'backoff_wait_seconds': 0.0,
+            'concurrency_wait_seconds': 0.0, 'input_tokens': 0, 'output_tokens': 0,
+            'cache_creation_input_tokens': 0, 'cache_read_input_tokens': 0
+        }
+        self._retry_reasons: Dict[str, int] = {}
+        # 系统提示词前缀的哈希 → 请求次数，前缀逐字节不变时每类提示词只有一个哈希
+        self._prefixes: Dict[str, int] = {}
+        # 按调用方标签分别统计的调用次数和token用量
+        self._labels: Dict[str, Dict[str, int]] = {}
+        # 设置后进入离线批量模式：请求不直接发送，而是登记到批量队列中，见flush_batch
+        self.batch_queue: Optional[BatchQueue] = None
+        # 带解析器的请求以流式读取响应，JSON闭合即停止读取，格式错误时中止请求
+        self.stream_responses = True
+        self._stream_counters = {'streamed': 0, 'early_stops': 0, 'aborts': 0, 'aborted_output_tokens': 0}
+        # 结构化输出模式：给定输出工具的请求强制调用该工具，直接读取工具参数
+        self.structured_output = False
+        # 带解析器的响应的解析结果：解析失败的响应全部输出token都被浪费
+        self._parse_counters = {'responses': 0, 'parse_failures': 0, 'wasted_output_tokens': 0,
+                                'tool_definition_tokens': 0}
+
+    def complete(self, prompt: str, max_tokens: int, system: Optional[Sequence[str]] = None,
+                 label: Optional[str] = None, parser: Optional[JSONStreamParser] = None,
+                 tool: Optional[OutputTool] = None, tools: Sequence[OutputTool] = ()) -> str:
+        """
+        发送单轮提示词并返回文本响应，缓存命中时不访问网络
+
+        system: 不随请求变化的系统提示词块（指令、仓库摘要等），依次作为提示词前缀发送，
+        每块末尾设置缓存断点，后续请求的相同前缀从服务端的提示词缓存中读取
+        label: 调用方标签（如qa、design），该标签下的调用次数和token用量单独统计
+        parser: 响应的增量JSON解析器。给定时以流式读取响应，顶层JSON闭合即停止读取，
+        响应明显不是预期的JSON时中止请求并抛出MalformedResponse；返回值为其中的JSON文本，
+        已闭合的记录可从parser.values取得
+        tool: 输出格式对应的工具，结构化输出模式下强制调用该工具，以工具参数作为响应；
+        tools为同类请求共用的全部工具，每次按相同顺序声明，使提示词缓存的前缀不变（默认只声明tool）。
+        两种模式得到的都是同一格式的JSON文本，共用响应缓存
+        """
+        key = self._cache_key(prompt, max_tokens, system)
+        if self.cache is not None:
+            cached = self.cache.get(key)
+            if cached is not None:
+                try:
+                    return self._parse(cached, parser)
+                except MalformedResponse:
+                    # 旧版本缓存的完整响应不符合要求时丢弃，重新请求
+                    self.cache.discard(key)
+
+        request = {'model': self.model, 'max_tokens': max_tokens,
+                   'messages': [{"role": "user", "content": prompt}]}
+        if system:
+            request['system'] = system_blocks(system)
+        structured = self.structured_output and tool is not None
+        if structured:
+            request['tools'] = [each.definition() for each in (tools or (tool,))]
+            request['tool_choice'] = {'type': 'tool', 'name': tool.name}
+
+        if self.batch_queue is not None:
+            # 批量模式：已取回结果时直接使用，否则登记请求并抛出DeferredRequest
+            response = self.batch_queue.result(key)
+            if response is None:
+                self._count_prefix(system, request)
+                self.batch_queue.defer(key, request, label)
+            content = self._parse_response(response, parser, tool if structured else None)
+        elif parser is not None and not structured and self.stream_responses and hasattr(self.client.messages, 'stream'):
+            self._count_prefix(system, request)
+            response = self._create_with_retry(
+                label, send=lambda **params: self._stream_message(parser, label, **params), **request)
+            try:
+                parser.finish()
+            except MalformedResponse:
+                self._count_parse(failed=True, output_tokens=_usage_tokens(response.usage)[1])
+                raise
+            self._count_parse(failed=False)
+            content = parser.text
+        else:
+            self._count_prefix(system, request)
+            response = self._create_with_retry(label, **request)
+            content = self._parse_response(response, parser, tool if structured else None)
+
+        if self.cache is not None:
+            self.cache.put(key, content)
+        return content
+
+    def deferred_requests(self) -> int:
+        """批量模式下本轮已登记、尚未提交的请求数；非批量模式为0"""
+        return self.batch_queue.pending_count() if self.batch_queue is not None else 0
+
+    def flush_batch(self) -> int:
+        """提交批量队列中登记的请求并等待完成，统计成功请求的用量，返回提交的请求数"""
+        submitted = self.batch_queue.pending_count()
+        for label, message in self.batch_queue.flush():
+            with self._lock:
+                self._count_response(label, getattr(message, 'usage', None))
+        return submitted
+
+    def discard(self, prompt: str, max_tokens: int, system: Optional[Sequence[str]] = None):
+        """丢弃某个提示词的缓存响应，使下次调用重新请求"""
+        if self.cache is not None:
+            self.cache.discard(self._cache_key(prompt, max_tokens, system))
+
+    def stats(self) -> Dict[str, Any]:
+        """返回调用统计"""
+        with self._lock:
+            latencies = sorted(self._latencies)
+            requests = dict(self._counters)
+            requests['retry_reasons'] = dict(self._retry_reasons)
+            prefixes = dict(self._prefixes)
+            labels = {label: dict(counters) for label, counters in self._labels.items()}
+            streaming = dict(self._stream_counters)
+            parsing = dict(self._parse_counters)
+        requests['rate_limit_wait_seconds'] = round(requests['rate_limit_wait_seconds'], 3)
+        requests['backoff_wait_seconds'] = round(requests['backoff_wait_seconds'], 3)
+        requests['concurrency_wait_seconds'] = round(requests['concurrency_wait_seconds'], 3)
+        requests['latency_seconds'] = _latency_summary(latencies)
+        requests['prompt_cache'] = _prompt_cache_summary(requests, prefixes)
+        requests['by_label'] = labels
+        requests['streaming'] = streaming
+        requests['output_parsing'] = _parsing_summary(parsing, self.structured_output)
+        if self.batch_queue is not None:
+            requests['message_batches'] = self.batch_queue.stats()
+        return {
+            'response_cache': self.cache.stats() if self.cache is not None else {'enabled': False},
+            'requests': requests
+        }
+
+    def _create_with_retry(self, label: Optional[str], send: Optional[Callable[..., Any]] = None,
+                           **request: Any) -> Any:
+        """
+        发送请求，遇到限流、超时和服务端错误时按退避策略重试，重试耗尽后抛出最后一次的异常；
+        send为实际发送请求的函数，默认为messages.create
+        """
+        send = send or self.client.messages.create
+        estimated = sum(estimate_tokens(message['content']) for message in request['messages'])
+        estimated += sum(estimate_tokens(block['text']) for block in request.get('system', []))
+        if request.get('tools'):
+            estimated += estimate_tokens(json.dumps(request['tools'], ensure_ascii=False))
+        estimated += request['max_tokens']
+
+        attempt = 0
+        while True:
+            # 先等待限流额度再占用并发名额，等待额度的线程不占名额，不阻塞其他可以立即发送的请求
+            waited = self.rate_limiter.acquire(estimated)
+            slot_wait = self._acquire_slot()
+            started = time.monotonic()
+            try:
+                response = send(**request)
+            except Exception as e:
+                self._release_slot()
+                reason = _retry_reason(e)
+                with self._lock:
+                    self._counters['api_calls'] += 1
+                    self._counters['rate_limit_wait_seconds'] += waited
+                    self._counters['concurrency_wait_seconds'] += slot_wait
+                    self._count_label(label, api_calls=1)
+                    if reason is None or attempt >= self.retry_policy.max_retries:
+                        self._counters['failed'] += 1
+                # 失败的请求未产生实际用量，归还预扣的token额度
+                self.rate_limiter.record_usage(estimated, 0)
+                if reason is None or attempt >= self.retry_policy.max_retries:
+                    raise
+
+                delay = self.retry_policy.delay(attempt, _retry_after(e))
+                with self._lock:
+                    self._counters['retries'] += 1
+                    self._counters['backoff_wait_seconds'] += delay
+                    self._retry_reasons[reason] = self._retry_reasons.get(reason, 0) + 1
+                print(f" 请求失败({reason})，{delay:.1f}秒后第{attempt + 1}次重试")
+                time.sleep(delay)
+                attempt += 1
+                continue
+
+            self._release_slot()
+            latency = time.monotonic() - started
+            usage = getattr(response, 'usage', None)
+            if usage is not None:
+                self.rate_limiter.record_usage(estimated, sum(_usage_tokens(usage)))
+            with self._lock:
+                self._counters['rate_limit_wait_seconds'] += waited
+                self._counters['concurrency_wait_seconds'] += slot_wait
+                self._count_response(label, usage)
+                self._latencies.append(latency)
+            return response
+
+    def _stream_message(self, parser: JSONStreamParser, label: Optional[str], **request: Any) -> Any:
+        """
+        以流式读取响应并逐块交给解析器：顶层JSON闭合后即停止读取，按已收到的文本估算输出token；
+        解析器判定格式错误时关闭连接中止生成，已产生的用量计入统计后抛出MalformedResponse
+        """
+        parser.reset()
+        received = []
+        with self.client.messages.stream(**request) as stream:
+            try:
+                for text in stream.text_stream:
+                    received.append(text)
+                    if parser.feed(text):
+                        break
+            except MalformedResponse:
+                input_tokens, _, cache_creation, cache_read = _usage_tokens(stream.current_message_snapshot.usage)
+                output_tokens = estimate_tokens(''.join(received))
+                with self._lock:
+                    self._stream_counters['aborts'] += 1
+                    self._stream_counters['aborted_output_tokens'] += output_tokens
+                    self._counters['input_tokens'] += input_tokens
+                    self._counters['output_tokens'] += output_tokens
+                    self._counters['cache_creation_input_tokens'] += cache_creation
+                    self._counters['cache_read_input_tokens'] += cache_read
+                    self._count_label(label, input_tokens=input_tokens, output_tokens=output_tokens,
+                                      cache_creation_input_tokens=cache_creation,
+                                      cache_read_input_tokens=cache_read)
+                self._count_parse(failed=True, output_tokens=output_tokens)
+                raise
+            message = stream.current_message_snapshot
+            early_stop = message.stop_reason is None
+        if early_stop:
+            # 提前断开时服务端的最终用量不会送达，输出token按已收到的文本估算
+            message.usage.output_tokens = max(message.usage.output_tokens or 0,
+                                              estimate_tokens(''.join(received)))
+        with self._lock:
+            self._stream_counters['streamed'] += 1
+            self._stream_counters['early_stops'] += int(early_stop)
+        return message
+
+    def _parse_response(self, response: Any, parser: Optional[JSONStreamParser],
+                        tool: Optional[OutputTool]) -> str:
+        """
+        取出完整响应中的文本（结构化输出时为工具参数），有解析器时解析并统计；
+        解析失败时该响应的输出token计为浪费
+        """
+        try:
+            if tool is not None:
+                arguments = tool_input(response, tool.name)
+                if arguments is None:
+                    raise MalformedResponse(f'响应中没有调用工具{tool.name}')
+                content = tool.output_text(arguments)
+            else:
+                content = response.content[0].text
+            if parser is None:
+                return content
+            content = self._parse(content, parser)
+        except MalformedResponse:
+            self._count_parse(failed=True, output_tokens=_usage_tokens(getattr(response, 'usage', None))[1])
+            raise
+        self._count_parse(failed=False)
+        return content
+
+    def _count_parse(self, failed: bool, output_tokens: int = 0):
+        with self._lock:
+            self._parse_counters['responses'] += 1
+            if failed:
+                self._parse_counters['parse_failures'] += 1
+                self._parse_counters['wasted_output_tokens'] += output_tokens
+
+    def _parse(self, content: str, parser: Optional[JSONStreamParser]) -> str:
+        """用解析器读取完整的响应文本，返回其中的JSON文本；未给定解析器时原样返回"""
+        if parser is None:
+            return content
+        parser.reset()
+        parser.feed(content)
+        parser.finish()
+        return parser.text
+
+    def _count_response(self, label: Optional[str], usage: Any):
+        """累加一次成功请求的调用次数和token用量，调用方持有self._lock"""
+        input_tokens, output_tokens, cache_creation, cache_read = _usage_tokens(usage)
+        self._counters['api_calls'] += 1
+        self._counters['succeeded'] += 1
+        self._counters['input_tokens'] += input_tokens
+        self._counters['output_tokens'] += output_tokens
+        self._counters['cache_creation_input_tokens'] += cache_creation
+        self._counters['cache_read_input_tokens'] += cache_read
+        self._count_label(label, api_calls=1, input_tokens=input_tokens, output_tokens=output_tokens,
+                          cache_creation_input_tokens=cache_creation, cache_read_input_tokens=cache_read)
+
+    def _count_prefix(self, system: Optional[Sequence[str]], request: Dict[str, Any]):
+        """记录实际发送的系统提示词前缀，以及结构化输出的工具声明占用的输入token"""
+        if request.get('tools'):
+            tool_tokens = estimate_tokens(json.dumps(request['tools'], ensure_ascii=False))
+            with self._lock:
+                self._parse_counters['tool_definition_tokens'] += tool_tokens
+        if not system:
+            return
+        prefix_hash = hashlib.sha256('\x00'.join(system).encode('utf-8')).hexdigest()[:16]
+        with self._lock:
+            self._prefixes[prefix_hash] = self._prefixes.get(prefix_hash, 0) + 1
+
+    def _count_label(self, label: Optional[str], **amounts: int):
+        """累加标签下的统计，调用方持有self._lock"""
+        if label is None:
+            return
+        counters = self._labels.setdefault(label, {
+            'api_calls': 0, 'input_tokens': 0, 'output_tokens': 0,
+            'cache_creation_input_tokens': 0, 'cache_read_input_tokens': 0
+        })
+        for key, amount in amounts.items():
+            counters[key] += amount
+
+    def _acquire_slot(self) -> float:
+        """占用一个全局并发名额，返回等待的秒数；未设置并发上限时立即返回"""
+        if self._slots is None:
+            return 0.0
+        started = time.monotonic()
+        self._slots.acquire()
+        return time.monotonic() - started
+
+    def _release_slot(self):
+        if self._slots is not None:
+            self._slots.release()
+
+    def _cache_key(self, prompt: str, max_tokens: int, system: Optional[Sequence[str]] = None) -> str:
+        """计算缓存键，系统提示词也参与计算"""
+        if system:
+            return ResponseCache.make_key(self.model, max_tokens, prompt, system=list(system))
+        return ResponseCache.make_key(self.model, max_tokens, prompt)
+
+
+def system_blocks(system: Sequence[str]) -> List[Dict[str, Any]]:
+    """系统提示词块，最后MAX_CACHE_BREAKPOINTS块带缓存标记（缓存标记处及之前的内容作为前缀缓存）"""
+    first_marked = max(len(system) - MAX_CACHE_BREAKPOINTS, 0)
+    blocks = []
+    for index, text in enumerate(system):
+        block = {'type': 'text', 'text': text}
+        if index >= first_marked:
+            block['cache_control'] = {'type': 'ephemeral'}
+        blocks.append(block)
+    return blocks
+
+
+def _usage_tokens(usage: Any) -> Tuple[int, int, int, int]:
+    """响应用量中的 (输入, 输出, 缓存写入, 缓存读取) token数；input_tokens不含缓存写入和读取的部分"""
+    return (getattr(usage, 'input_tokens', 0) or 0,
+            getattr(usage, 'output_tokens', 0) or 0,
+            getattr(usage, 'cache_creation_input_tokens', 0) or 0,
+            getattr(usage, 'cache_read_input_tokens', 0) or 0)
+
+
+def _retry_reason(error: Exception) -> Optional[str]:
+    """判断异常是否可重试，可重试时返回原因（状态码或异常类型），否则返回None"""
+    status_code = getattr(error, 'status_code', None)
+    if status_code is not None:
+        return str(status_code) if status_code in RETRYABLE_STATUS_CODES else None
+    if isinstance(error, _CONNECTION_ERRORS):
+        return type(error).__name__
+    return None
+
+
+def _retry_after(error: Exception) -> Optional[float]:
+    """从响应头读取服务端建议的重试等待时间（秒）"""
+    headers = getattr(getattr(error, 'response', None), 'headers', None)
+    if not headers:
+        return None
+    try:
+        if headers.get('retry-after-ms'):
+            return float(headers['retry-after-ms']) / 1000
+        if headers.get('retry-after'):
+            return float(headers['retry-after'])
+    except (TypeError, ValueError):
+        # retry-after也可能是HTTP日期格式，此时退回指数退避
+        return None
+    return None
+
+
+def _prompt_cache_summary(requests: Dict[str, Any], prefixes: Dict[str, int]) -> Dict[str, Any]:
+    """
+    提示词缓存统计：写入、读取的token数，缓存读取占全部输入的比例，以及发送过的不同前缀数；
+    前缀数远多于提示词种类时说明前缀中混入了随请求变化的内容
+    """
+    cache_write = requests['cache_creation_input_tokens']
+    cache_read = requests['cache_read_input_tokens']
+    total_input = requests['input_tokens'] + cache_write + cache_read
+    return {
+        'cache_write_tokens': cache_write,
+        'cache_read_tokens': cache_read,
+        'uncached_input_tokens': requests['input_tokens'],
+        'read_ratio': round(cache_read / total_input, 4) if total_input else 0.0,
+        'distinct_prefixes': len(prefixes),
+        'prefixed_requests': sum(prefixes.values())
+    }
+
+
+def _parsing_summary(parsing: Dict[str, int], structured: bool) -> Dict[str, Any]:
+    """
+    响应解析统计：解析失败率和失败响应浪费的输出token数；结构化输出模式下另计工具声明
+    占用的输入token（估算），与省下的浪费对比即为该模式的净收益
+    """
+    responses = parsing['responses']
+    return {
+        'mode': 'tool_use' if structured else 'text',
+        'responses': responses,
+        'parse_failures': parsing['parse_failures'],
+        'parse_failure_rate': round(parsing['parse_failures'] / responses, 4) if responses else 0.0,
+        'wasted_output_tokens': parsing['wasted_output_tokens'],
+        'tool_definition_tokens': parsing['tool_definition_tokens']
+    }
+
+
+def _latency_summary(latencies: List[float]) -> Dict[str, float]:
+    """成功请求的延迟分布"""
+    if not latencies:
+        return {'count': 0}
+
+    def percentile(p: float) -> float:
+        return round(latencies[min(len(latencies) - 1, int(p * len(latencies)))], 3)
+
+    return {
+        'count': len(latencies),
+        'mean': round(sum(latencies) / len(latencies), 3),
+        'p50': percentile(0.5),
+        'p95': percentile(0.95),
+        'max': round(latencies[-1], 3)
+    }
@@ -1,102 +1,286 @@
 """
 代码仓库分析器 - 提取代码结构、业务逻辑和架构模式
 """
-import os
 import ast
+import io
 import json
 import re
-from typing import Dict, List, Any, Optional
+import hashlib
+import tokenize
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Any, Optional, Iterator, Set, Tuple, Callable
 from pathlib import Path
 
+from analysis_manifest import AnalysisManifest
+from analysis_report import AnalysisReportWriter
+from ignore_rules import IgnoreRules
+from js_scanner import scan_javascript
+from keyword_matcher import KeywordMatcher
+from repo_walker import FileEntry, RepoInventory, scan_repository
+from symbol_index import SymbolIndex
+
+
+# 业务关键词表，编译为多关键词匹配器后对每个文件只扫描一遍
+BUSINESS_KEYWORDS = [
+    'user', 'customer', 'order', 'payment', 'invoice', 'product',
+    'service', 'account', 'profile', 'authentication', 'authorization',
+    'login', 'register', 'cart', 'checkout', 'billing', 'shipping',
+    'notification', 'email', 'sms', 'report', 'dashboard', 'analytics',
+    'admin', 'manager', 'role', 'permission', 'security', 'audit',
+    'log', 'error', 'exception', 'validation', 'business', 'process',
+    'workflow', 'rule', 'policy', 'config', 'setting', 'feature',
+    'module', 'component', 'service', 'api', 'endpoint', 'route',
+    'controller', 'model', 'view', 'template', 'database', 'query'
+]
+BUSINESS_KEYWORD_MATCHER = KeywordMatcher(BUSINESS_KEYWORDS)
+
+LINE_BREAK = re.compile(rb'\r\n|\r|\n')
+
 
 class CodeAnalyzer:
     """代码分析器，负责解析和分析代码仓的结构和内容"""
     
-    def __init__(self, repo_path: str):
+    # 支持的文件类型
+    SUPPORTED_EXTENSIONS = {'.py', '.js', '.ts', '.md', '.json', '.yaml', '.yml'}
+    
+    def __init__(self, repo_path: str, manifest_path: Optional[str] = None,
+                 ignore_rules: Optional[IgnoreRules] = None, workers: int = 1,
+                 symbol_index_path: Optional[str] = None):
         self.repo_path = Path(repo_path)
-        
-    def analyze_repository(self) -> Dict[str, Any]:
-        """分析整个代码仓"""
+        self.workers = max(int(workers), 1)
+        self.ignore_rules = ignore_rules or IgnoreRules()
+        # 提供清单路径时启用增量分析：未变化的文件直接复用上次结果
+        self.manifest = AnalysisManifest(manifest_path) if manifest_path else None
+        self.incremental_summary: Dict[str, Any] = {}
+        # 提供索引路径时把符号、导入和调用关系写入SQLite索引，分析结果中以symbol_index提供
+        self.symbol_index = SymbolIndex(symbol_index_path) if symbol_index_path else None
+        
+    def analyze_repository(self, report_path: Optional[str] = None,
+                           on_plan: Optional[Callable[[List[FileEntry]], None]] = None,
+                           on_file: Optional[Callable[[str, Dict[str, Any]], None]] = None) -> Dict[str, Any]:
+        """
+        分析整个代码仓
+
+        report_path: 提供时以JSONL格式边分析边写出报告，返回结果中的file_analysis
+        为按需读取的惰性映射，不在内存中保留全部文件的分析结果
+        on_plan: 确定待分析文件清单后调用一次，参数为文件清单
+        on_file: 每个文件分析完成（并写入报告）后调用，参数为 (相对路径, 分析结果)
+        """
         print("开始分析代码仓库...")
         
-        analysis_result = {
-            'repo_structure': self._analyze_structure(),
-            'file_analysis': self._analyze_files(),
+        # 只遍历一次仓库，结构统计、文件分析、模式识别和依赖分析共享同一份清单
+        inventory = scan_repository(str(self.repo_path), stat_extensions=self.SUPPORTED_EXTENSIONS,
+                                    ignore_rules=self.ignore_rules)
+        print(f" 已跳过 {self.ignore_rules.ignored_count} 个被忽略的文件或目录")
+        structure = self._analyze_structure(inventory)
+        
+        # 汇总部分先于文件分析计算，作为流式报告的摘要头写出
+        summary = {
+            'repo_structure': structure,
             'business_rules': self._extract_business_rules(),
-            'architecture_patterns': self._identify_architecture_patterns(),
-            'dependencies': self._analyze_dependencies(),
-            'documentation_analysis': self._analyze_documentation()
+            'architecture_patterns': self._identify_architecture_patterns(structure),
+            'dependencies': self._analyze_dependencies(inventory),
+            'documentation_analysis': self._analyze_documentation(inventory)
         }
         
+        if report_path:
+            writer = AnalysisReportWriter(report_path, summary)
+            self._analyze_files(inventory, writer, on_plan, on_file)
+            footer = {'incremental': self.incremental_summary} if self.manifest is not None else None
+            file_analysis = writer.close(footer)
+        else:
+            file_analysis = self._analyze_files(inventory, on_plan=on_plan, on_file=on_file)
+        
+        analysis_result = {
+            'repo_structure': structure,
+            'file_analysis': file_analysis,
+            'business_rules': summary['business_rules'],
+            'architecture_patterns': summary['architecture_patterns'],
+            'dependencies': summary['dependencies'],
+            'documentation_analysis': summary['documentation_analysis']
+        }
+        if self.manifest is not None:
+            analysis_result['incremental'] = self.incremental_summary
+        if self.symbol_index is not None:
+            analysis_result['symbol_index'] = self.symbol_index
+        
         print(f"分析完成: {analysis_result['repo_structure']['total_files']} 个文件")
         return analysis_result
     
-    def _analyze_structure(self) -> Dict[str, Any]:
+    def _analyze_structure(self, inventory: RepoInventory) -> Dict[str, Any]:
         """分析仓库结构"""
         structure = {
-            'directories': [],
+            'directories': list(inventory.directories),
             'file_types': {},
-            'total_files': 0,
-            'depth': 0
+            'total_files': len(inventory.files),
+            'depth': inventory.depth,
+            'ignored_directories': list(self.ignore_rules.pruned_dirs)
         }
         
-        for root, dirs, files in os.walk(self.repo_path):
-            level = root.replace(str(self.repo_path), '').count(os.sep)
-            structure['depth'] = max(structure['depth'], level)
-            
-            rel_path = os.path.relpath(root, self.repo_path)
-            if rel_path != '.':
-                structure['directories'].append(rel_path)
-            
-            for file in files:
-                structure['total_files'] += 1
-                ext = Path(file).suffix.lower()
-                structure['file_types'][ext] = structure['file_types'].get(ext, 0) + 1
+        for entry in inventory.files:
+            structure['file_types'][entry.ext] = structure['file_types'].get(entry.ext, 0) + 1
                 
         return structure
     
-    def _analyze_files(self) -> Dict[str, Any]:
-        """分析具体文件内容"""
+    def _analyze_files(self, inventory: RepoInventory,
+                       writer: Optional[AnalysisReportWriter] = None,
+                       on_plan: Optional[Callable[[List[FileEntry]], None]] = None,
+                       on_file: Optional[Callable[[str, Dict[str, Any]], None]] = None) -> Dict[str, Any]:
+        """分析具体文件内容；提供writer时逐个写出结果而不在内存中累积"""
         file_analysis = {}
-        
-        # 支持的文件类型
-        supported_extensions = {'.py', '.js', '.ts', '.md', '.json', '.yaml', '.yml'}
-        
-        for root, dirs, files in os.walk(self.repo_path):
-            for file in files:
-                file_path = Path(root) / file
-                rel_path = file_path.relative_to(self.repo_path)
-                
-                if file_path.suffix.lower() in supported_extensions:
-                    try:
-                        analysis = self._analyze_single_file(file_path)
-                        if analysis:
-                            file_analysis[str(rel_path)] = analysis
-                    except Exception as e:
-                        print(f" 分析文件 {file_path} 时出错: {e}")
+        analyzed_paths = []
+        
+        changes = {'changed_files': [], 'changed_symbols': [], 'reused_files': 0}
+        
+        entries = []
+        skipped_large = 0
+        for entry in inventory.files_with_extensions(self.SUPPORTED_EXTENSIONS):
+            if self.ignore_rules.exceeds_size_limit(entry.size):
+                skipped_large += 1
+                continue
+            entries.append(entry)
+        
+        if skipped_large:
+            print(f" 已跳过 {skipped_large} 个超过大小上限的文件")
+        if on_plan is not None:
+            on_plan(entries)
+        
+        entries_by_path = {entry.rel_path: entry for entry in entries}
+        if self.symbol_index is not None:
+            self.symbol_index.begin()
+        
+        for rel_path, analysis in self._iter_file_analysis(entries, changes):
+            analyzed_paths.append(rel_path)
+            if writer is not None:
+                writer.write_file(rel_path, analysis)
+            else:
+                file_analysis[rel_path] = analysis
+            if self.symbol_index is not None:
+                self.symbol_index.update_file(entries_by_path[rel_path], analysis)
+            if on_file is not None:
+                on_file(rel_path, analysis)
+        
+        if self.symbol_index is not None:
+            self.symbol_index.commit()
+        
+        if self.manifest is not None:
+            removed_files = self.manifest.prune(analyzed_paths)
+            self.manifest.save()
+            self.incremental_summary = {
+                'has_baseline': self.manifest.existed,
+                'reused_files': changes['reused_files'],
+                'changed_files': changes['changed_files'],
+                'removed_files': removed_files,
+                'changed_symbols': changes['changed_symbols']
+            }
+            print(f" 增量分析: 复用 {changes['reused_files']} 个文件, "
+                  f"重新分析 {len(changes['changed_files'])} 个, 删除 {len(removed_files)} 个")
                         
         return file_analysis
     
+    def _iter_file_analysis(self, entries: List[FileEntry],
+                            changes: Dict[str, Any]) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        """按清单顺序产出 (相对路径, 分析结果)；未变化的文件从清单复用，其余重新分析"""
+        plan = []
+        pending = []
+        for entry in entries:
+            cached = None
+            if self.manifest is not None:
+                cached = self.manifest.lookup(entry.rel_path, Path(entry.path), entry.size, entry.mtime)
+            plan.append((entry, cached))
+            if cached is None:
+                pending.append(entry)
+        
+        analyzed = self._analyze_entries(pending)
+        for entry, cached in plan:
+            if cached is not None:
+                changes['reused_files'] += 1
+                yield entry.rel_path, cached
+                continue
+            
+            analysis = next(analyzed)
+            if analysis:
+                self._record_change(entry, analysis, changes)
+                yield entry.rel_path, analysis
+    
+    def _analyze_entries(self, entries: List[FileEntry]) -> Iterator[Optional[Dict[str, Any]]]:
+        """分析一组文件，结果顺序与输入一致；启用多进程时按块分发到进程池"""
+        if self.workers <= 1 or len(entries) < self.workers * 2:
+            for entry in entries:
+                yield _analyze_file_safely(self, entry.path)
+            return
+        
+        # 每个进程处理若干块，块不宜过大以便负载均衡，也不宜过小以减少进程间通信
+        chunk_size = max(1, min(64, len(entries) // (self.workers * 4)))
+        chunks = [[entry.path for entry in entries[i:i + chunk_size]]
+                  for i in range(0, len(entries), chunk_size)]
+        print(f" 使用 {self.workers} 个进程分析 {len(entries)} 个文件 ({len(chunks)} 块)")
+        
+        with ProcessPoolExecutor(max_workers=self.workers) as executor:
+            for results in executor.map(_analyze_file_chunk, chunks):
+                yield from results
+    
+    def _record_change(self, entry: FileEntry, analysis: Dict[str, Any], changes: Dict[str, Any]):
+        """记录重新分析的文件及变化的符号，并更新清单"""
+        if self.manifest is None:
+            return
+        
+        previous = self.manifest.previous_analysis(entry.rel_path)
+        changes['changed_files'].append(entry.rel_path)
+        changes['changed_symbols'].extend(self._diff_symbols(entry.rel_path, previous, analysis))
+        self.manifest.update(entry.rel_path, Path(entry.path), entry.size, entry.mtime, analysis)
+    
+    def _diff_symbols(self, rel_path: str, previous: Optional[Dict[str, Any]],
+                      current: Dict[str, Any]) -> List[Dict[str, str]]:
+        """比较文件前后两次分析结果，找出源码发生变化的函数和类"""
+        changed = []
+        for kind, key in (('function', 'functions'), ('class', 'classes')):
+            old_hashes = self._symbol_fingerprints(previous.get(key, []) if previous else [])
+            new_hashes = self._symbol_fingerprints(current.get(key, []))
+            for symbol_id, fingerprint in new_hashes.items():
+                # 没有源码哈希的符号（如JS）无法细分，文件变化即视为变化
+                if fingerprint is None or old_hashes.get(symbol_id) != fingerprint:
+                    changed.append({'file': rel_path, 'kind': kind, 'name': symbol_id[0]})
+            # 已被删除的符号同样视为变化，以便清理其旧问答对
+            for symbol_id in old_hashes:
+                if symbol_id not in new_hashes:
+                    changed.append({'file': rel_path, 'kind': kind, 'name': symbol_id[0]})
+        return changed
+    
+    def _symbol_fingerprints(self, symbols: List[Dict[str, Any]]) -> Dict[tuple, Optional[str]]:
+        """以 (名称, 同名序号) 标识符号，避免行号偏移导致误判"""
+        fingerprints = {}
+        occurrences: Dict[str, int] = {}
+        for symbol in symbols:
+            name = symbol.get('name', '')
+            index = occurrences.get(name, 0)
+            occurrences[name] = index + 1
+            fingerprints[(name, index)] = symbol.get('source_hash')
+        return fingerprints
+    
     def _analyze_single_file(self, file_path: Path) -> Optional[Dict[str, Any]]:
         """分析单个文件"""
         try:
-            with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-                content = f.read()
+            with open(file_path, 'rb') as f:
+                raw = f.read()
+            # 与文本模式读取一致，换行统一为\n；符号的字节区间按原始字节计算
+            content = raw.decode('utf-8', errors='ignore').replace('\r\n', '\n').replace('\r', '\n')
                 
             analysis = {
                 'file_type': file_path.suffix.lower(),
                 'size': len(content),
-                'lines': len(content.splitlines()),
+                # 与Python解析器一致只按\n计行；str.splitlines还会在\x0c、\x1c-\x1e、\x85、\u2028等字符处分行
+                'lines': content.count('\n') + (1 if content and not content.endswith('\n') else 0),
                 'functions': [],
                 'classes': [],
                 'imports': [],
-                'comments': self._extract_comments(content, file_path.suffix),
+                'comments': [],
                 'business_keywords': self._find_business_keywords(content)
             }
             
             # 特定文件类型的分析
             if file_path.suffix == '.py':
-                analysis.update(self._analyze_python_file(content))
+                analysis.update(self._analyze_python_file(content, raw))
             elif file_path.suffix in ['.js', '.ts']:
                 analysis.update(self._analyze_javascript_file(content))
             elif file_path.suffix == '.md':
@@ -108,91 +292,48 @@ class CodeAnalyzer:
             print(f" 无法读取文件 {file_path}: {e}")
             return None
     
-    def _analyze_python_file(self, content: str) -> Dict[str, Any]:
-        """分析Python文件"""
-        result = {'functions': [], 'classes': [], 'imports': []}
+    def _analyze_python_file(self, content: str, raw: Optional[bytes] = None) -> Dict[str, Any]:
+        """
+        分析Python文件：一次遍历语法树收集函数（含异步函数和方法）、类、导入和调用关系，
+        再按行提取注释（跳过多行字符串内部的行）；提供原始字节时为函数和类记录源码的字节区间
+        """
+        result = {'functions': [], 'classes': [], 'imports': [], 'comments': []}
+        # 不能用splitlines：换页符等字符也会被当作换行，lines[lineno - 1]会偏离语法树的行号
+        lines = content.split('\n')
         
         try:
             tree = ast.parse(content)
-            
-            for node in ast.walk(tree):
-                if isinstance(node, ast.FunctionDef):
-                    func_info = {
-                        'name': node.name,
-                        'args': [arg.arg for arg in node.args.args],
-                        'docstring': ast.get_docstring(node),
-                        'line_number': node.lineno,
-                        'is_async': isinstance(node, ast.AsyncFunctionDef)
-                    }
-                    result['functions'].append(func_info)
-                    
-                elif isinstance(node, ast.ClassDef):
-                    class_info = {
-                        'name': node.name,
-                        'methods': [n.name for n in node.body if isinstance(n, ast.FunctionDef)],
-                        'docstring': ast.get_docstring(node),
-                        'line_number': node.lineno,
-                        'bases': [self._get_node_name(base) for base in node.bases]
-                    }
-                    result['classes'].append(class_info)
-                    
-                elif isinstance(node, (ast.Import, ast.ImportFrom)):
-                    if isinstance(node, ast.Import):
-                        for alias in node.names:
-                            result['imports'].append(alias.name)
-                    else:
-                        module = node.module or ''
-                        for alias in node.names:
-                            result['imports'].append(f"{module}.{alias.name}")
-                            
         except SyntaxError as e:
             print(f"Python语法错误: {e}")
+            result['comments'] = _python_comments(lines, set())
             return result
-            
+        
+        visitor = _PythonFileVisitor(self, lines, _line_offsets(raw) if raw is not None else None)
+        visitor.visit(tree)
+        result.update(functions=visitor.functions, classes=visitor.classes, imports=visitor.imports,
+                      comments=_python_comments(lines, visitor.string_lines))
         return result
     
+    def _source_hash(self, lines: List[str], node: ast.AST) -> str:
+        """计算符号源码片段的哈希，用于增量分析时判断符号是否变化"""
+        segment = '\n'.join(lines[node.lineno - 1:getattr(node, 'end_lineno', node.lineno)])
+        return hashlib.sha1(segment.encode('utf-8', errors='ignore')).hexdigest()[:16]
+    
+    def _byte_span(self, line_offsets: Optional[List[int]], node: ast.AST) -> Dict[str, int]:
+        """符号源码在原始文件中的字节区间 [start_byte, end_byte)，包括装饰器"""
+        end_lineno = getattr(node, 'end_lineno', None)
+        if line_offsets is None or end_lineno is None:
+            return {}
+        start_line = min([decorator.lineno for decorator in getattr(node, 'decorator_list', [])] + [node.lineno])
+        return {
+            'start_byte': line_offsets[start_line - 1] + node.col_offset,
+            'end_byte': line_offsets[end_lineno - 1] + node.end_col_offset
+        }
+    
     def _analyze_javascript_file(self, content: str) -> Dict[str, Any]:
-        """分析JavaScript/TypeScript文件"""
-        result = {'functions': [], 'classes': [], 'imports': []}
-        
-        # 简单的正则表达式匹配
-        # 函数匹配
-        func_patterns = [
-            r'function\s+(\w+)\s*\([^)]*\)',  # function name()
-            r'const\s+(\w+)\s*=\s*\([^)]*\)\s*=>', # const name = () =>
-            r'(\w+)\s*:\s*function\s*\([^)]*\)',  # name: function()
-        ]
-        
-        for pattern in func_patterns:
-            matches = re.findall(pattern, content)
-            for match in matches:
-                if isinstance(match, tuple):
-                    match = match[0]
-                result['functions'].append({
-                    'name': match,
-                    'args': [],  # 简化处理
-                    'type': 'javascript'
-                })
-        
-        # 类匹配
-        class_matches = re.findall(r'class\s+(\w+)', content)
-        for class_name in class_matches:
-            result['classes'].append({
-                'name': class_name,
-                'methods': [],
-                'type': 'javascript'
-            })
-        
-        # 导入匹配
-        import_patterns = [
-            r'import\s+.*\s+from\s+[\'"]([^\'"]+)[\'"]',
-            r'require\s*\(\s*[\'"]([^\'"]+)[\'"]\s*\)'
-        ]
-        
-        for pattern in import_patterns:
-            matches = re.findall(pattern, content)
-            result['imports'].extend(matches)
-            
+        """分析JavaScript/TypeScript文件：一次扫描提取函数（含类方法）、类、导入和注释，跳过字符串和注释中的内容"""
+        result = scan_javascript(content)
+        result['comments'] = [text for _, text in result['comments']]
         return result
     
     def _analyze_markdown_file(self, content: str) -> Dict[str, Any]:
@@ -222,46 +363,11 @@ class CodeAnalyzer:
         
         return result
     
-    def _extract_comments(self, content: str, file_ext: str) -> List[str]:
-        """提取注释"""
-        comments = []
-        lines = content.split('\n')
-        
-        if file_ext == '.py':
-            for line in lines:
-                stripped = line.strip()
-                if stripped.startswith('#'):
-                    comments.append(stripped[1:].strip())
-        elif file_ext in ['.js', '.ts']:
-            for line in lines:
-                stripped = line.strip()
-                if stripped.startswith('//'):
-                    comments.append(stripped[2:].strip())
-        
-        return comments
-    
     def _find_business_keywords(self, content: str) -> List[str]:
         """查找业务关键词"""
-        business_keywords = [
-            'user', 'customer', 'order', 'payment', 'invoice', 'product',
-            'service', 'account', 'profile', 'authentication', 'authorization',
-            'login', 'register', 'cart', 'checkout', 'billing', 'shipping',
-            'notification', 'email', 'sms', 'report', 'dashboard', 'analytics',
-            'admin', 'manager', 'role', 'permission', 'security', 'audit',
-            'log', 'error', 'exception', 'validation', 'business', 'process',
-            'workflow', 'rule', 'policy', 'config', 'setting', 'feature',
-            'module', 'component', 'service', 'api', 'endpoint', 'route',
-            'controller', 'model', 'view', 'template', 'database', 'query'
-        ]
-        
-        found_keywords = []
-        content_lower = content.lower()
-        
-        for keyword in business_keywords:
-            if keyword in content_lower:
-                found_keywords.append(keyword)
-        
-        return list(set(found_keywords))  # 去重
+        # 一次扫描找出全部关键词，按关键词表顺序返回（已去重）
+        found_keywords = BUSINESS_KEYWORD_MATCHER.found(content.lower())
+        return [keyword for keyword in BUSINESS_KEYWORD_MATCHER.keywords if keyword in found_keywords]
     
     def _extract_business_rules(self) -> List[Dict[str, Any]]:
         """提取业务规则"""
@@ -283,7 +389,7 @@ class CodeAnalyzer:
         
         return business_rules
     
-    def _identify_architecture_patterns(self) -> Dict[str, bool]:
+    def _identify_architecture_patterns(self, structure: Dict[str, Any]) -> Dict[str, bool]:
         """识别架构模式"""
         patterns = {
             'mvc': False,
@@ -295,7 +401,6 @@ class CodeAnalyzer:
         
         # 简单的模式识别逻辑
         # 可以根据目录结构、文件命名等来判断
-        structure = self._analyze_structure()
         directories = structure.get('directories', [])
         
         # MVC模式检测
@@ -315,7 +420,7 @@ class CodeAnalyzer:
         
         return patterns
     
-    def _analyze_dependencies(self) -> Dict[str, Any]:
+    def _analyze_dependencies(self, inventory: RepoInventory) -> Dict[str, Any]:
         """分析依赖关系"""
         dependencies = {
             'package_managers': [],
@@ -333,12 +438,12 @@ class CodeAnalyzer:
         }
         
         for file_name, manager in package_files.items():
-            if (self.repo_path / file_name).exists():
+            if inventory.has_root_file(file_name):
                 dependencies['package_managers'].append(manager)
         
         return dependencies
     
-    def _analyze_documentation(self) -> Dict[str, Any]:
+    def _analyze_documentation(self, inventory: RepoInventory) -> Dict[str, Any]:
         """分析文档"""
         doc_analysis = {
             'has_readme': False,
@@ -350,16 +455,16 @@ class CodeAnalyzer:
         
         doc_files = ['README.md', 'readme.md', 'README.txt', 'readme.txt']
         for doc_file in doc_files:
-            if (self.repo_path / doc_file).exists():
+            if inventory.has_root_file(doc_file):
                 doc_analysis['has_readme'] = True
                 break
         
-        if (self.repo_path / 'CONTRIBUTING.md').exists():
+        if inventory.has_root_file('CONTRIBUTING.md'):
             doc_analysis['has_contributing'] = True
         
         license_files = ['LICENSE', 'LICENSE.txt', 'LICENSE.md', 'license']
         for license_file in license_files:
-            if (self.repo_path / license_file).exists():
+            if inventory.has_root_file(license_file):
                 doc_analysis['has_license'] = True
                 break
         
@@ -373,3 +478,196 @@ class CodeAnalyzer:
             return f"{self._get_node_name(node.value)}.{node.attr}"
         else:
             return str(node)
+
+
+def _line_offsets(raw: bytes) -> List[int]:
+    """每行起始位置的字节偏移，换行符与Python解析器一致（\\r\\n、\\r、\\n）"""
+    return [0] + [match.end() for match in LINE_BREAK.finditer(raw)]
+
+
+class _PythonFileVisitor(ast.NodeVisitor):
+    """
+    Python语法树的单次遍历：按源码顺序收集函数、类、导入，并把调用归属到直接所在的函数
+
+    函数和类带有限定名（Outer.method、func.<locals>.inner）和装饰器；装饰器、默认值和
+    基类表达式在外层作用域中求值，其中的调用不计入该函数。同时记录多行字符串覆盖的行，
+    提取注释时跳过这些行
+    """
+
+    def __init__(self, analyzer: CodeAnalyzer, lines: List[str], line_offsets: Optional[List[int]]):
+        self.analyzer = analyzer
+        self.lines = lines
+        self.line_offsets = line_offsets
+        self.functions: List[Dict[str, Any]] = []
+        self.classes: List[Dict[str, Any]] = []
+        self.imports: List[str] = []
+        self.string_lines: Set[int] = set()
+        self._scope: List[str] = []
+        self._calls: List[Set[str]] = []
+        self._handlers: Dict[type, Any] = {}
+
+    def visit(self, node: ast.AST):
+        """按节点类型缓存处理方法；ast.NodeVisitor.visit对每个节点都拼接方法名再getattr"""
+        handler = self._handlers.get(node.__class__)
+        if handler is None:
+            handler = getattr(self, 'visit_' + node.__class__.__name__, self.generic_visit)
+            self._handlers[node.__class__] = handler
+        return handler(node)
+
+    def generic_visit(self, node: ast.AST):
+        """
+        与ast.NodeVisitor.generic_visit相同，但跳过没有字段的子节点（Load/Store、运算符等），
+        它们没有子节点，也没有对应的处理方法
+        """
+        for field in node._fields:
+            value = getattr(node, field, None)
+            if isinstance(value, list):
+                for item in value:
+                    if isinstance(item, ast.AST) and item._fields:
+                        self.visit(item)
+            elif isinstance(value, ast.AST) and value._fields:
+                self.visit(value)
+
+    def visit_FunctionDef(self, node: ast.AST):
+        func_info = {
+            'name': node.name,
+            'qualname': '.'.join(self._scope + [node.name]),
+            'args': [arg.arg for arg in node.args.args],
+            'docstring': ast.get_docstring(node),
+            'line_number': node.lineno,
+            'end_line_number': getattr(node, 'end_lineno', node.lineno),
+            'is_async': isinstance(node, ast.AsyncFunctionDef),
+            'decorators': [self._decorator_name(decorator) for decorator in node.decorator_list],
+            'source_hash': self.analyzer._source_hash(self.lines, node),
+            **self.analyzer._byte_span(self.line_offsets, node)
+        }
+        self.functions.append(func_info)
+        
+        for child in node.decorator_list:
+            self.visit(child)
+        self.visit(node.args)
+        if node.returns is not None:
+            self.visit(node.returns)
+        
+        calls: Set[str] = set()
+        self._scope.extend([node.name, '<locals>'])
+        self._calls.append(calls)
+        for statement in node.body:
+            self.visit(statement)
+        self._calls.pop()
+        del self._scope[-2:]
+        func_info['calls'] = sorted(calls)
+
+    visit_AsyncFunctionDef = visit_FunctionDef
+
+    def visit_ClassDef(self, node: ast.ClassDef):
+        self.classes.append({
+            'name': node.name,
+            'qualname': '.'.join(self._scope + [node.name]),
+            'methods': [n.name for n in node.body if isinstance(n, (ast.FunctionDef, ast.AsyncFunctionDef))],
+            'docstring': ast.get_docstring(node),
+            'line_number': node.lineno,
+            'end_line_number': getattr(node, 'end_lineno', node.lineno),
+            'bases': [self.analyzer._get_node_name(base) for base in node.bases],
+            'decorators': [self._decorator_name(decorator) for decorator in node.decorator_list],
+            'source_hash': self.analyzer._source_hash(self.lines, node),
+            **self.analyzer._byte_span(self.line_offsets, node)
+        })
+        
+        for child in node.decorator_list + node.bases + node.keywords:
+            self.visit(child)
+        self._scope.append(node.name)
+        for statement in node.body:
+            self.visit(statement)
+        self._scope.pop()
+
+    def visit_Import(self, node: ast.Import):
+        self.imports.extend(alias.name for alias in node.names)
+
+    def visit_ImportFrom(self, node: ast.ImportFrom):
+        module = node.module or ''
+        self.imports.extend(f"{module}.{alias.name}" for alias in node.names)
+
+    def visit_Call(self, node: ast.Call):
+        if self._calls:
+            if isinstance(node.func, ast.Name):
+                self._calls[-1].add(node.func.id)
+            elif isinstance(node.func, ast.Attribute):
+                self._calls[-1].add(node.func.attr)
+        self.generic_visit(node)
+
+    def visit_Constant(self, node: ast.Constant):
+        if isinstance(node.value, str):
+            self._mark_string_lines(node)
+
+    def visit_JoinedStr(self, node: ast.JoinedStr):
+        self._mark_string_lines(node)
+        self.generic_visit(node)
+
+    def _mark_string_lines(self, node: ast.AST):
+        """
+        三引号字符串除首行外覆盖的行不可能以注释开头；隐式拼接的多个单行字符串同样跨行，
+        但行间可以有注释，按开头的引号区分
+        """
+        end_lineno = getattr(node, 'end_lineno', None)
+        if end_lineno is None or end_lineno <= node.lineno:
+            return
+        # col_offset按UTF-8字节计
+        opening = self.lines[node.lineno - 1].encode('utf-8')[node.col_offset:node.col_offset + 5]
+        if opening.lstrip(b'rRbBuUfF')[:3] in (b'"""', b"'''"):
+            self.string_lines.update(range(node.lineno + 1, end_lineno + 1))
+
+    def _decorator_name(self, decorator: ast.AST) -> str:
+        """装饰器名称，带参数的装饰器取被调用的名称"""
+        if isinstance(decorator, ast.Call):
+            decorator = decorator.func
+        return self.analyzer._get_node_name(decorator)
+
+
+def _python_comments(lines: List[str], string_lines: Set[int]) -> List[str]:
+    """
+    按行提取Python注释：整行注释和不含引号的行直接按#切分；其余的行只对这一行做词法分析
+    取出行尾注释，从而排除字符串中的#；三引号字符串覆盖的行跳过
+    """
+    comments = []
+    for line_number, line in enumerate(lines, 1):
+        if '#' not in line or line_number in string_lines:
+            continue
+        stripped = line.strip()
+        if stripped.startswith('#'):
+            comments.append(stripped[1:].strip())
+            continue
+        if '"' not in line and "'" not in line:
+            # 行内没有字符串时第一个#就是注释的开始
+            comments.append(line[line.index('#') + 1:].strip())
+            continue
+        try:
+            for token in tokenize.generate_tokens(io.StringIO(line).readline):
+                if token.type == tokenize.COMMENT:
+                    comments.append(token.string[1:].strip())
+                    break
+        except (tokenize.TokenError, SyntaxError):
+            # 该行是多行语句或多行字符串的开头，已取出的注释之外不再处理
+            pass
+    return comments
+
+
+# 进程池工作进程内复用的分析器实例
+_worker_analyzer: Optional[CodeAnalyzer] = None
+
+
+def _analyze_file_safely(analyzer: CodeAnalyzer, file_path: str) -> Optional[Dict[str, Any]]:
+    """分析单个文件，异常时返回None"""
+    try:
+        return analyzer._analyze_single_file(Path(file_path))
+    except Exception as e:
+        print(f" 分析文件 {file_path} 时出错: {e}")
+        return None
+
+
+def _analyze_file_chunk(file_paths: List[str]) -> List[Optional[Dict[str, Any]]]:
+    """进程池工作函数：分析一块文件，返回与输入顺序一致的结果"""
+    global _worker_analyzer
+    if _worker_analyzer is None:
+        _worker_analyzer = CodeAnalyzer('.')
+    return [_analyze_file_safely(_worker_analyzer, path) for path in file_paths]
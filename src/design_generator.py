@@ -3,24 +3,139 @@ Claude集成的设计方案生成器 - 基于代码仓架构生成智能设计
 """
 import json
 import random
-from typing import Dict, List, Any, Optional
-try:
-    from anthropic import Anthropic
-    ANTHROPIC_AVAILABLE = True
-except ImportError:
-    ANTHROPIC_AVAILABLE = False
+from typing import Dict, List, Any, Optional, Callable, Tuple
+
+from claude_client import DEFAULT_MODEL, ClaudeClient, create_anthropic_client
+from json_stream import JSONStreamParser, extract_json_text
+from message_batches import DeferredRequest
+from prompt_budget import DEFAULT_CONTEXT_TOKENS, PromptContextBudget
+from response_cache import ResponseCache
+from run_journal import RunJournal
+from structured_output import OutputTool, schema_from_example
+
+
+# 所有设计方案提示词共用的系统提示词。与每次运行的仓库摘要、各类方案的输出格式一起作为
+# 逐字节不变的前缀发送，提示词缓存按块命中；随方案变化的只有用户消息中的主题
+DESIGN_INSTRUCTIONS = """你是一位资深软件架构师和技术专家，负责基于代码仓库的分析结果生成架构设计方案（增强、重构、新功能和架构迁移）。这些方案是为模型训练数据生成的，需要高质量的推理过程。
+
+通用要求:
+1. **方案必须具体可实施**：提供详细的技术实现路径
+2. **包含完整的推理trace**：解释为什么选择这种方案，分析过程，权衡考虑
+3. **提供详细的实施步骤**：包含技术细节
+4. **考虑业务影响**：分析对现有业务功能的影响
+5. **包含技术选型理由**：解释技术选择的原因
+
+接下来依次给出代码仓库的分析结果和本类方案的JSON格式。请严格按照JSON格式回复，只返回JSON，不要包含解释文字或markdown格式。"""
+
+# 各类方案的输出格式
+DESIGN_FORMATS = {
+    'enhancement': """增强方案的JSON格式（请确保内容详尽）:
+{
+    "title": "具体的方案标题（包含技术关键词）",
+    "description": "详细描述方案的背景、目标、核心思路和预期效果（至少200字）",
+    "technical_approach": "技术实现方案的详细说明（至少150字）",
+    "implementation_steps": [
+        "步骤1：具体的技术实施内容",
+        "步骤2：详细的实现细节",
+        "步骤3：配置和集成说明",
+        "步骤4：测试和验证方案",
+        "步骤5：部署和监控设置",
+        "步骤6：文档和培训",
+        "步骤7：性能优化和调优",
+        "步骤8：维护和支持计划"
+    ],
+    "benefits": [
+        "具体的技术收益",
+        "业务价值的量化描述",
+        "性能提升的具体指标",
+        "可维护性改进",
+        "扩展性增强"
+    ],
+    "challenges_and_solutions": [
+        "挑战1及其解决方案",
+        "挑战2及其解决方案",
+        "挑战3及其解决方案"
+    ],
+    "acceptance_criteria": [
+        "验收标准1：具体的可测量指标",
+        "验收标准2：功能完整性检查",
+        "验收标准3：性能基准测试"
+    ],
+    "estimated_effort": "Medium",
+    "timeline": "预计实施时间和里程碑",
+    "reasoning_trace": "系统性的分析推理过程，必须包含以下深度分析框架：\n\n**1. 现状深度分析**：详细评估当前系统的技术现状、性能瓶颈、架构限制\n\n**2. 问题根因识别**：深入分析问题的根本原因，而非表面现象\n\n**3. 方案对比评估**：比较多种可行方案，分析各自的优劣势\n\n**4. 技术选型推理**：详细解释为什么选择特定技术栈，包含技术成熟度、生态系统、团队技能等考量\n\n**5. 风险评估与缓解**：识别实施风险并提出具体的缓解措施\n\n**6. 实施策略制定**：制定详细的分阶段实施计划，考虑业务连续性\n\n**7. 成功标准定义**：明确可测量的成功指标和验收标准\n\n（要求至少400字，体现架构师的系统性思维和决策过程）"
+}""",
+    'refactoring': """重构方案的JSON格式:
+{
+    "title": "重构方案标题",
+    "description": "详细描述",
+    "implementation_steps": ["步骤1", "步骤2"],
+    "benefits": ["收益1", "收益2"],
+    "risks": ["风险1", "风险2"],
+    "estimated_effort": "Medium/High",
+    "reasoning_trace": "重构分析过程"
+}""",
+    'feature': """功能方案的JSON格式:
+{
+    "title": "功能方案标题",
+    "description": "功能详细描述",
+    "design_approach": "设计方法",
+    "implementation_steps": ["实现步骤1", "实现步骤2"],
+    "integration_points": ["集成点1", "集成点2"],
+    "dependencies": ["依赖1", "依赖2"],
+    "estimated_effort": "Medium/High",
+    "reasoning_trace": "功能设计推理过程"
+}""",
+    'architecture_migration': """迁移方案的JSON格式:
+{
+    "title": "迁移方案标题",
+    "description": "迁移描述",
+    "migration_strategy": "迁移策略",
+    "implementation_phases": ["阶段1", "阶段2"],
+    "benefits": ["收益1", "收益2"],
+    "challenges": ["挑战1", "挑战2"],
+    "estimated_effort": "High",
+    "reasoning_trace": "迁移分析过程"
+}"""
+}
+
+
+# 结构化输出模式下各类方案的输出工具，输入模式由上面的JSON格式示例推出。每个设计方案请求都按相同顺序
+# 声明全部工具，只是强制调用的不同，各类方案的提示词缓存前缀保持一致
+_DESIGN_KIND_NAMES = {'enhancement': '增强', 'refactoring': '重构', 'feature': '功能',
+                      'architecture_migration': '架构迁移'}
+DESIGN_TOOLS = {
+    kind: OutputTool(f'record_{kind}_proposal', f'记录生成的{_DESIGN_KIND_NAMES[kind]}方案',
+                     schema_from_example(json.loads(fmt[fmt.index('{'):], strict=False)))
+    for kind, fmt in DESIGN_FORMATS.items()
+}
+DESIGN_TOOL_SET = tuple(DESIGN_TOOLS.values())
 
 
 class DesignGenerator:
     """Claude驱动的设计方案生成器"""
     
-    def __init__(self, claude_api_key: str):
-        if not ANTHROPIC_AVAILABLE:
-            raise ImportError("需要安装anthropic包: pip install anthropic")
-        
-        self.client = Anthropic(api_key=claude_api_key)
-        self.model = "claude-3-5-sonnet-20241022"
+    def __init__(self, claude_api_key: str, client: Any = None,
+                 response_cache: Optional[ResponseCache] = None,
+                 context_tokens: int = DEFAULT_CONTEXT_TOKENS,
+                 claude: Optional[ClaudeClient] = None):
+        # 传入共享的ClaudeClient时，与其他生成器共用缓存、限流额度和调用统计
+        if claude is not None:
+            client = claude.client
+        elif client is None:
+            client = create_anthropic_client(claude_api_key)
+        
+        self.client = client
+        self.model = claude.model if claude is not None else DEFAULT_MODEL
+        self.claude = claude or ClaudeClient(self.client, self.model, response_cache)
         self.design_patterns = self._load_design_patterns()
+        # 提示词中仓库上下文（目录、核心类、主要功能）的token预算
+        self.context_tokens = context_tokens
+        self.context_budget: Optional[PromptContextBudget] = None
+        # 设置运行日志后，每个方案完成即落盘，续跑时跳过已完成的方案
+        self.journal: Optional[RunJournal] = None
+        # 离线批量模式下本轮已排队的方案请求数
+        self._queued = 0
         
     def _load_design_patterns(self) -> Dict[str, Dict[str, Any]]:
         """加载设计模式模板"""
@@ -55,6 +170,15 @@ class DesignGenerator:
         # 分析当前架构
         current_architecture = self._analyze_current_architecture(code_analysis)
         
+        # 类和函数只排序、打包一次，所有方案的提示词共用
+        self.context_budget = PromptContextBudget(code_analysis, self.context_tokens)
+        current_architecture['repo_context'] = self.context_budget.sections()
+        current_architecture['repo_digest'] = self._repo_digest(current_architecture, code_analysis)
+        context_stats = self.context_budget.stats()
+        print(f" 提示词上下文: 类 {context_stats['classes_included']}/{context_stats['classes_total']}, "
+              f"函数 {context_stats['functions_included']}/{context_stats['functions_total']}, "
+              f"约 {context_stats['estimated_tokens']} tokens")
+        
         # 生成不同类型的设计方案
         generators = [
             self._generate_enhancement_proposals,
@@ -64,12 +188,14 @@ class DesignGenerator:
         ]
         
         proposals_per_type = max(num_proposals // len(generators), 1)
+        self._queued = 0
         
         for generator in generators:
             try:
                 new_proposals = generator(code_analysis, current_architecture, requirements, proposals_per_type)
                 proposals.extend(new_proposals)
-                if len(proposals) >= num_proposals:
+                # 批量模式下排队的请求也计入数量，不为用不上的方案提交请求
+                if len(proposals) + self._queued >= num_proposals:
                     break
             except Exception as e:
                 print(f" 生成器 {generator.__name__} 出错: {e}")
@@ -165,7 +291,8 @@ class DesignGenerator:
         
         for area in enhancement_areas[:num_proposals]:
             try:
-                proposal = self._generate_claude_enhancement_proposal(area, current_arch, code_analysis)
+                proposal = self._run_item(f'design:enhancement:{area}', self._generate_claude_enhancement_proposal,
+                                          area, current_arch, code_analysis)
                 if proposal:
                     proposals.append(proposal)
             except Exception as e:
@@ -177,76 +304,16 @@ class DesignGenerator:
     def _generate_claude_enhancement_proposal(self, area: str, current_arch: Dict[str, Any], 
                                             code_analysis: Dict[str, Any]) -> Optional[Dict[str, Any]]:
         """使用Claude生成增强方案"""
-        claude_prompt = f"""作为资深软件架构师和技术专家，请为以下代码仓库生成一个"{area}"的详细架构设计方案。这是为模型训练数据生成的，需要高质量的推理过程。
-
-## 代码仓库分析:
-- 架构复杂度: {current_arch.get('complexity', '未知')}
-- 技术栈: {', '.join(current_arch.get('technologies', []))}
-- 项目优势: {', '.join(current_arch.get('strengths', []))}
-- 改进领域: {', '.join(current_arch.get('weaknesses', []))}
-- 总文件数: {code_analysis.get('repo_structure', {}).get('total_files', 0)}
-- 目录结构: {code_analysis.get('repo_structure', {}).get('directories', [])}
-- 检测到的架构模式: {[k for k, v in code_analysis.get('architecture_patterns', {}).items() if v]}
-
-## 业务功能分析:
-- 核心类: {[cls['name'] for file_analysis in code_analysis.get('file_analysis', {}).values() for cls in file_analysis.get('classes', [])]}
-- 主要功能: {[func['name'] for file_analysis in code_analysis.get('file_analysis', {}).values() for func in file_analysis.get('functions', [])]}
-
-请生成一个全面、详细的{area}设计方案，要求:
-
-1. **方案必须具体可实施**：提供详细的技术实现路径
-2. **包含完整的推理trace**：解释为什么选择这种方案，分析过程，权衡考虑
-3. **提供详细的实施步骤**：至少6-8个具体步骤，包含技术细节
-4. **考虑业务影响**：分析对现有业务功能的影响
-5. **包含技术选型理由**：解释技术选择的原因
-6. **提供验收标准**：如何验证方案是否成功实施
+        system = self._design_system('enhancement', current_arch, code_analysis)
+        claude_prompt = f"""请为该代码仓库生成一个"{area}"的详细架构设计方案。
 
-JSON格式（请确保内容详尽）:
-{{
-    "title": "具体的方案标题（包含技术关键词）",
-    "description": "详细描述方案的背景、目标、核心思路和预期效果（至少200字）",
-    "technical_approach": "技术实现方案的详细说明（至少150字）",
-    "implementation_steps": [
-        "步骤1：具体的技术实施内容",
-        "步骤2：详细的实现细节",
-        "步骤3：配置和集成说明",
-        "步骤4：测试和验证方案",
-        "步骤5：部署和监控设置",
-        "步骤6：文档和培训",
-        "步骤7：性能优化和调优",
-        "步骤8：维护和支持计划"
-    ],
-    "benefits": [
-        "具体的技术收益",
-        "业务价值的量化描述",
-        "性能提升的具体指标",
-        "可维护性改进",
-        "扩展性增强"
-    ],
-    "challenges_and_solutions": [
-        "挑战1及其解决方案",
-        "挑战2及其解决方案",
-        "挑战3及其解决方案"
-    ],
-    "acceptance_criteria": [
-        "验收标准1：具体的可测量指标",
-        "验收标准2：功能完整性检查",
-        "验收标准3：性能基准测试"
-    ],
-    "estimated_effort": "Medium",
-    "timeline": "预计实施时间和里程碑",
-    "reasoning_trace": "系统性的分析推理过程，必须包含以下深度分析框架：\n\n**1. 现状深度分析**：详细评估当前系统的技术现状、性能瓶颈、架构限制\n\n**2. 问题根因识别**：深入分析问题的根本原因，而非表面现象\n\n**3. 方案对比评估**：比较多种可行方案，分析各自的优劣势\n\n**4. 技术选型推理**：详细解释为什么选择特定技术栈，包含技术成熟度、生态系统、团队技能等考量\n\n**5. 风险评估与缓解**：识别实施风险并提出具体的缓解措施\n\n**6. 实施策略制定**：制定详细的分阶段实施计划，考虑业务连续性\n\n**7. 成功标准定义**：明确可测量的成功指标和验收标准\n\n（要求至少400字，体现架构师的系统性思维和决策过程）"
-}}"""
+要求：方案全面、详细，至少包含6-8个具体的实施步骤（含技术细节），并提供验收标准，说明如何验证方案是否成功实施。"""
 
         try:
             print(f" 正在为 {area} 调用Claude API...")
-            response = self.client.messages.create(
-                model=self.model,
-                max_tokens=2000,
-                messages=[{"role": "user", "content": claude_prompt}]
-            )
-            
-            content = response.content[0].text
+            content = self.claude.complete(claude_prompt, max_tokens=2000, system=system, label='design',
+                                           parser=self._design_parser(),
+                                           tool=DESIGN_TOOLS['enhancement'], tools=DESIGN_TOOL_SET)
             print(f" Claude返回内容: {content[:200]}...")
             
             # 清理和提取JSON
@@ -279,13 +346,18 @@ JSON格式（请确保内容详尽）:
                 # 验证reasoning质量
                 if not self._validate_design_reasoning_quality(proposal_result):
                     print(f" {area} 增强方案的reasoning质量不达标，跳过")
+                    self.claude.discard(claude_prompt, max_tokens=2000, system=system)
                     return None
                 
                 return proposal_result
             except json.JSONDecodeError as e:
+                self.claude.discard(claude_prompt, max_tokens=2000, system=system)
                 print(f" 增强方案的JSON解析错误: {e}")
                 print(f" 问题内容: {content[:200] if content else 'None'}")
                 return None
+        except DeferredRequest:
+            # 离线批量模式下请求已排队，不是失败，由调用方保留为待处理
+            raise
         except Exception as e:
             print(f" Claude增强方案生成失败: {e}")
             return None
@@ -305,7 +377,8 @@ JSON格式（请确保内容详尽）:
         
         for refactor_type in refactoring_types[:num_proposals]:
             try:
-                proposal = self._generate_claude_refactoring_proposal(refactor_type, current_arch, code_analysis)
+                proposal = self._run_item(f'design:refactoring:{refactor_type}', self._generate_claude_refactoring_proposal,
+                                          refactor_type, current_arch, code_analysis)
                 if proposal:
                     proposals.append(proposal)
             except Exception as e:
@@ -317,34 +390,13 @@ JSON格式（请确保内容详尽）:
     def _generate_claude_refactoring_proposal(self, refactor_type: str, current_arch: Dict[str, Any], 
                                             code_analysis: Dict[str, Any]) -> Optional[Dict[str, Any]]:
         """使用Claude生成重构方案"""
-        claude_prompt = f"""作为软件重构专家，请为以下项目生成一个"{refactor_type}"的重构方案：
-
-项目信息:
-- 架构模式: {current_arch.get('detected_patterns', {})}
-- 项目复杂度: {current_arch.get('complexity', '未知')}
-- 技术栈: {', '.join(current_arch.get('technologies', []))}
-
-请生成一个详细的{refactor_type}重构方案。
-
-JSON格式:
-{{
-    "title": "重构方案标题",
-    "description": "详细描述",
-    "implementation_steps": ["步骤1", "步骤2"],
-    "benefits": ["收益1", "收益2"],
-    "risks": ["风险1", "风险2"],
-    "estimated_effort": "Medium/High",
-    "reasoning_trace": "重构分析过程"
-}}"""
+        system = self._design_system('refactoring', current_arch, code_analysis)
+        claude_prompt = f"""作为软件重构专家，请为该项目生成一个详细的"{refactor_type}"重构方案。"""
 
         try:
-            response = self.client.messages.create(
-                model=self.model,
-                max_tokens=2000,
-                messages=[{"role": "user", "content": claude_prompt}]
-            )
-            
-            content = response.content[0].text
+            content = self.claude.complete(claude_prompt, max_tokens=2000, system=system, label='design',
+                                           parser=self._design_parser(),
+                                           tool=DESIGN_TOOLS['refactoring'], tools=DESIGN_TOOL_SET)
             print(f" Claude返回内容: {content[:200]}...")
             
             # 清理和提取JSON
@@ -371,9 +423,13 @@ JSON格式:
                     }
                 }
             except json.JSONDecodeError as e:
+                self.claude.discard(claude_prompt, max_tokens=2000, system=system)
                 print(f" 重构方案的JSON解析错误: {e}")
                 print(f" 问题内容: {content[:200] if content else 'None'}")
                 return None
+        except DeferredRequest:
+            # 离线批量模式下请求已排队，不是失败，由调用方保留为待处理
+            raise
         except Exception as e:
             print(f" Claude重构方案生成失败: {e}")
             return None
@@ -396,7 +452,8 @@ JSON格式:
         
         for requirement in requirements[:num_proposals]:
             try:
-                proposal = self._generate_claude_feature_proposal(requirement, current_arch, code_analysis)
+                proposal = self._run_item(f'design:feature:{requirement}', self._generate_claude_feature_proposal,
+                                          requirement, current_arch, code_analysis)
                 if proposal:
                     proposals.append(proposal)
             except Exception as e:
@@ -408,37 +465,17 @@ JSON格式:
     def _generate_claude_feature_proposal(self, requirement: str, current_arch: Dict[str, Any], 
                                         code_analysis: Dict[str, Any]) -> Optional[Dict[str, Any]]:
         """使用Claude生成功能方案"""
-        claude_prompt = f"""作为产品架构师，请为以下项目设计"{requirement}"功能的实现方案：
-
-项目背景:
-- 当前架构: {current_arch.get('detected_patterns', {})}
-- 技术栈: {', '.join(current_arch.get('technologies', []))}
-- 项目规模: {code_analysis.get('repo_structure', {}).get('total_files', 0)} 个文件
+        system = self._design_system('feature', current_arch, code_analysis)
+        claude_prompt = f"""作为产品架构师，请为该项目设计"{requirement}"功能的实现方案。
 
 需求: {requirement}
 
-请提供详细的功能设计方案。
-
-JSON格式:
-{{
-    "title": "功能方案标题",
-    "description": "功能详细描述",
-    "design_approach": "设计方法",
-    "implementation_steps": ["实现步骤1", "实现步骤2"],
-    "integration_points": ["集成点1", "集成点2"],
-    "dependencies": ["依赖1", "依赖2"],
-    "estimated_effort": "Medium/High",
-    "reasoning_trace": "功能设计推理过程"
-}}"""
+请提供详细的功能设计方案。"""
 
         try:
-            response = self.client.messages.create(
-                model=self.model,
-                max_tokens=2000,
-                messages=[{"role": "user", "content": claude_prompt}]
-            )
-            
-            content = response.content[0].text
+            content = self.claude.complete(claude_prompt, max_tokens=2000, system=system, label='design',
+                                           parser=self._design_parser(),
+                                           tool=DESIGN_TOOLS['feature'], tools=DESIGN_TOOL_SET)
             print(f" Claude返回内容: {content[:200]}...")
             
             # 清理和提取JSON
@@ -466,9 +503,13 @@ JSON格式:
                     }
                 }
             except json.JSONDecodeError as e:
+                self.claude.discard(claude_prompt, max_tokens=2000, system=system)
                 print(f" 功能方案的JSON解析错误: {e}")
                 print(f" 问题内容: {content[:200] if content else 'None'}")
                 return None
+        except DeferredRequest:
+            # 离线批量模式下请求已排队，不是失败，由调用方保留为待处理
+            raise
         except Exception as e:
             print(f" Claude功能方案生成失败: {e}")
             return None
@@ -484,7 +525,8 @@ JSON格式:
         
         for pattern in available_patterns[:num_proposals]:
             try:
-                proposal = self._generate_claude_migration_proposal(pattern, current_arch, code_analysis)
+                proposal = self._run_item(f'design:migration:{pattern}', self._generate_claude_migration_proposal,
+                                          pattern, current_arch, code_analysis)
                 if proposal:
                     proposals.append(proposal)
             except Exception as e:
@@ -498,38 +540,18 @@ JSON格式:
         """使用Claude生成架构迁移方案"""
         pattern_info = self.design_patterns.get(target_pattern, {})
         
-        claude_prompt = f"""作为系统架构师，请为以下项目设计向"{pattern_info.get('name', target_pattern)}"架构迁移的方案：
-
-当前状态:
-- 项目复杂度: {current_arch.get('complexity', '未知')}
-- 现有模式: {current_arch.get('detected_patterns', {})}
-- 技术栈: {', '.join(current_arch.get('technologies', []))}
+        system = self._design_system('architecture_migration', current_arch, code_analysis)
+        claude_prompt = f"""作为系统架构师，请为该项目设计向"{pattern_info.get('name', target_pattern)}"架构迁移的方案。
 
 目标架构: {pattern_info.get('name', target_pattern)}
 架构描述: {pattern_info.get('description', '')}
 
-请提供详细的迁移方案。
-
-JSON格式:
-{{
-    "title": "迁移方案标题",
-    "description": "迁移描述",
-    "migration_strategy": "迁移策略",
-    "implementation_phases": ["阶段1", "阶段2"],
-    "benefits": ["收益1", "收益2"],
-    "challenges": ["挑战1", "挑战2"],
-    "estimated_effort": "High",
-    "reasoning_trace": "迁移分析过程"
-}}"""
+请提供详细的迁移方案。"""
 
         try:
-            response = self.client.messages.create(
-                model=self.model,
-                max_tokens=2000,
-                messages=[{"role": "user", "content": claude_prompt}]
-            )
-            
-            content = response.content[0].text
+            content = self.claude.complete(claude_prompt, max_tokens=2000, system=system, label='design',
+                                           parser=self._design_parser(),
+                                           tool=DESIGN_TOOLS['architecture_migration'], tools=DESIGN_TOOL_SET)
             print(f" Claude返回内容: {content[:200]}...")
             
             # 清理和提取JSON
@@ -558,38 +580,63 @@ JSON格式:
                     }
                 }
             except json.JSONDecodeError as e:
+                self.claude.discard(claude_prompt, max_tokens=2000, system=system)
                 print(f" 迁移方案的JSON解析错误: {e}")
                 print(f" 问题内容: {content[:200] if content else 'None'}")
                 return None
+        except DeferredRequest:
+            # 离线批量模式下请求已排队，不是失败，由调用方保留为待处理
+            raise
         except Exception as e:
             print(f" Claude迁移方案生成失败: {e}")
             return None
     
+    def _design_system(self, kind: str, current_arch: Dict[str, Any],
+                       code_analysis: Dict[str, Any]) -> Tuple[str, str, str]:
+        """设计方案请求的系统提示词块：通用指令、仓库摘要、该类方案的输出格式"""
+        digest = current_arch.get('repo_digest') or self._repo_digest(current_arch, code_analysis)
+        return DESIGN_INSTRUCTIONS, digest, DESIGN_FORMATS[kind]
+    
+    def _repo_digest(self, current_arch: Dict[str, Any], code_analysis: Dict[str, Any]) -> str:
+        """本次运行的仓库摘要，所有设计方案共用；同一分析结果生成的文本逐字节相同"""
+        repo_context = current_arch.get('repo_context') or \
+            PromptContextBudget(code_analysis, self.context_tokens).sections()
+        patterns = current_arch.get('detected_patterns', {})
+        return f"""## 代码仓库分析:
+- 架构复杂度: {current_arch.get('complexity', '未知')}
+- 技术栈: {', '.join(current_arch.get('technologies', []))}
+- 项目优势: {', '.join(current_arch.get('strengths', []))}
+- 改进领域: {', '.join(current_arch.get('weaknesses', []))}
+- 总文件数: {code_analysis.get('repo_structure', {}).get('total_files', 0)}
+- 目录结构: {repo_context['directories']}
+- 检测到的架构模式: {[k for k, v in patterns.items() if v]}
+- 未检测到的架构模式: {[k for k, v in patterns.items() if not v]}
+
+## 业务功能分析:
+- 核心类: {repo_context['classes']}
+- 主要功能: {repo_context['functions']}"""
+    
+    def _run_item(self, item_id: str, func: Callable[..., Optional[Dict[str, Any]]], *args) -> Optional[Dict[str, Any]]:
+        """
+        执行单个方案的生成；有运行日志时经由日志执行，已完成的方案直接复用结果。
+        离线批量模式下请求已排队时返回None并计入本轮排队数，工作项在日志中保持待处理
+        """
+        try:
+            if self.journal is None:
+                return func(*args)
+            self.journal.plan([item_id])
+            return self.journal.run(item_id, func, *args)
+        except DeferredRequest:
+            self._queued += 1
+            return None
+    
     def _extract_json_from_response(self, content: str) -> str:
         """从Claude响应中提取JSON"""
-        # 尝试找到JSON开始和结束位置
-        start_markers = ['{', '```json\n{', '```\n{']
-        
-        for start_marker in start_markers:
-            start_pos = content.find(start_marker)
-            if start_pos != -1:
-                # 找到开始位置后，寻找对应的结束位置
-                json_start = start_pos + (len(start_marker) - 1) if start_marker != '{' else start_pos
-                
-                # 尝试找到匹配的结束括号
-                brace_count = 0
-                for i, char in enumerate(content[json_start:], json_start):
-                    if char == '{':
-                        brace_count += 1
-                    elif char == '}':
-                        brace_count -= 1
-                        if brace_count == 0:
-                            json_content = content[json_start:i+1]
-                            # 清理控制字符
-                            return self._clean_json_string(json_content)
-        
-        # 如果找不到完整的JSON，返回清理后的原内容
-        return self._clean_json_string(content)
+        return self._clean_json_string(extract_json_text(content))
+    
+    def _design_parser(self) -> JSONStreamParser:
+        """设计方案响应的增量解析器：各类方案的字段不同，只要求顶层为对象且包含推理过程"""
+        return JSONStreamParser('object', required=('reasoning_trace',))
     
     def _clean_json_string(self, json_str: str) -> str:
         """清理JSON字符串中的控制字符"""
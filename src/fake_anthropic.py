@@ -0,0 +1,114 @@
+"""
+本地假Anthropic客户端 - 不访问网络，按提示词返回确定的响应并记录收到的每个请求，用于离线验证生成流程
+
+用法: QAGenerator('test', claude=ClaudeClient(FakeAnthropic(), DEFAULT_MODEL))
+"""
+import argparse
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Any, Callable, Dict, List
+
+from claude_client import DEFAULT_MODEL, ClaudeClient
+from code_analyzer import CodeAnalyzer
+from local_batch_server import stand_in_response
+from prompt_budget import estimate_tokens
+from qa_generator import QAGenerator
+
+
+class FakeAnthropic:
+    """
+    Anthropic客户端的替身，只实现messages.create
+
+    响应内容由responder根据请求参数生成（默认与本地替身服务相同），每次调用耗时delay秒；
+    requests按到达顺序记录请求参数，arrivals为对应的到达时间（time.monotonic），peak_concurrency为同时在途请求数的峰值，用于检查并发上限
+    """
+
+    def __init__(self, responder: Callable[[Dict[str, Any]], str] = stand_in_response, delay: float = 0.0):
+        self.messages = _FakeMessages(responder, delay)
+
+    @property
+    def requests(self) -> List[Dict[str, Any]]:
+        return self.messages.requests
+
+    @property
+    def arrivals(self) -> List[float]:
+        return self.messages.arrivals
+
+    @property
+    def peak_concurrency(self) -> int:
+        return self.messages.peak_concurrency
+
+
+class _FakeMessages:
+    def __init__(self, responder: Callable[[Dict[str, Any]], str], delay: float):
+        self.responder = responder
+        self.delay = delay
+        self.requests: List[Dict[str, Any]] = []
+        self.arrivals: List[float] = []
+        self.peak_concurrency = 0
+        self._active = 0
+        self._lock = threading.Lock()
+
+    def create(self, **params: Any) -> Any:
+        with self._lock:
+            self.requests.append(params)
+            self.arrivals.append(time.monotonic())
+            self._active += 1
+            self.peak_concurrency = max(self.peak_concurrency, self._active)
+        try:
+            if self.delay:
+                time.sleep(self.delay)
+            text = self.responder(params)
+        finally:
+            with self._lock:
+                self._active -= 1
+        system = ''.join(block.get('text', '') for block in params.get('system', []) or [])
+        return SimpleNamespace(
+            id=f'msg_{uuid.uuid4().hex[:24]}',
+            content=[SimpleNamespace(type='text', text=text)],
+            stop_reason='end_turn',
+            usage=SimpleNamespace(input_tokens=estimate_tokens(system) + estimate_tokens(str(params['messages'])),
+                                  output_tokens=estimate_tokens(text),
+                                  cache_creation_input_tokens=0, cache_read_input_tokens=0)
+        )
+
+
+def check(condition: bool, message: str):
+    """离线检查脚本共用：条件不成立时打印原因并以非零状态退出"""
+    if not condition:
+        print(f" 检查失败: {message}")
+        sys.exit(1)
+
+
+def main():
+    """用假客户端为仓库生成问答对，检查并发上限和结果的确定性"""
+    parser = argparse.ArgumentParser(description='用本地假Anthropic客户端离线检查问答生成流程')
+    parser.add_argument('--repo-path', default=str(Path(__file__).resolve().parent.parent), help='要分析的代码仓库路径')
+    parser.add_argument('--num-qa-pairs', type=int, default=20, help='生成问答对数量 (默认: 20)')
+    parser.add_argument('--max-concurrency', type=int, default=3, help='并发上限 (默认: 3)')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        analysis = CodeAnalyzer(args.repo_path).analyze_repository(
+            report_path=str(Path(work_dir) / 'analysis_report.jsonl'))
+        runs = []
+        for _ in range(2):
+            client = FakeAnthropic(delay=0.02)
+            generator = QAGenerator('test', max_concurrency=args.max_concurrency,
+                                    claude=ClaudeClient(client, DEFAULT_MODEL, max_concurrency=args.max_concurrency))
+            generator.rng.seed(0)
+            qa_pairs = generator.generate_qa_pairs(analysis, args.num_qa_pairs)
+            print(f"请求 {len(client.requests)} 个, 在途峰值 {client.peak_concurrency}, 问答对 {len(qa_pairs)} 个")
+            check(client.peak_concurrency <= args.max_concurrency, '在途请求数超过并发上限')
+            runs.append([qa['question'] for qa in qa_pairs])
+    check(runs[0] == runs[1], '相同种子的两次运行结果不一致')
+    print("检查通过: 并发不超过上限，相同种子的结果与顺序一致")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,171 @@
+"""
+忽略规则引擎 - 支持.gitignore语义、内置第三方目录列表、排除模式和文件大小上限
+"""
+import os
+import re
+from typing import Dict, Iterable, List, Optional, Pattern, Tuple
+
+
+# 默认跳过的版本控制、包管理器安装和工具缓存目录；只收录不会是源码包的名称，
+# build、dist、vendor、coverage、venv等可能是真实的源码目录，由.gitignore或--exclude排除
+DEFAULT_IGNORED_DIRS = {
+    '.git', '.hg', '.svn', 'node_modules', 'bower_components', '.venv', 'site-packages',
+    '__pycache__', '.eggs', '.tox', '.nox', '.mypy_cache', '.pytest_cache', '.ruff_cache',
+    '.idea', '.vscode', '.cache', 'htmlcov'
+}
+
+# 默认跳过的目录名后缀
+DEFAULT_IGNORED_SUFFIXES = ('.egg-info',)
+
+# 默认的单文件大小上限（字节），超过的文件不读取内容
+DEFAULT_MAX_FILE_SIZE = 1024 * 1024
+
+
+class IgnorePattern:
+    """单条gitignore风格的模式"""
+
+    def __init__(self, pattern: str, base_dir: str = ''):
+        self.base_dir = base_dir
+        self.negated = pattern.startswith('!')
+        if self.negated:
+            pattern = pattern[1:]
+        self.dir_only = pattern.endswith('/')
+        pattern = pattern.rstrip('/')
+
+        # 含有斜杠（结尾除外）的模式相对于.gitignore所在目录锚定，否则匹配任意层级的名称
+        anchored = '/' in pattern
+        pattern = pattern.lstrip('/')
+        prefix = '' if anchored else '(?:.*/)?'
+        self.regex: Pattern = re.compile(f'^{prefix}{_translate(pattern)}$')
+
+    def matches(self, rel_path: str, is_dir: bool) -> bool:
+        """rel_path为相对仓库根目录、以'/'分隔的路径"""
+        if self.dir_only and not is_dir:
+            return False
+        if self.base_dir:
+            if not rel_path.startswith(self.base_dir + '/'):
+                return False
+            rel_path = rel_path[len(self.base_dir) + 1:]
+        return bool(self.regex.match(rel_path))
+
+
+class IgnoreRules:
+    """仓库遍历时使用的忽略规则，在目录层面剪枝，避免进入被忽略的子树"""
+
+    def __init__(self, exclude_patterns: Optional[Iterable[str]] = None,
+                 max_file_size: Optional[int] = DEFAULT_MAX_FILE_SIZE,
+                 use_gitignore: bool = True,
+                 ignored_dirs: Optional[Iterable[str]] = None):
+        # 传入ignored_dirs时替换内置目录列表和后缀，传入空集合即不使用内置规则
+        self.ignored_dirs = set(DEFAULT_IGNORED_DIRS if ignored_dirs is None else ignored_dirs)
+        self.ignored_suffixes = DEFAULT_IGNORED_SUFFIXES if ignored_dirs is None else ()
+        self.max_file_size = max_file_size
+        self.use_gitignore = use_gitignore
+        self.gitignore_patterns: List[IgnorePattern] = []
+        self.exclude_patterns = [IgnorePattern(p) for p in (exclude_patterns or []) if p.strip()]
+        self.ignored_count = 0
+        # 被剪枝的目录及生效的规则（builtin、gitignore、exclude），记录在分析结果的仓库结构中
+        self.pruned_dirs: List[Dict[str, str]] = []
+
+    def load_gitignore(self, rel_dir: str, gitignore_path: str):
+        """加载某个目录下的.gitignore，规则只作用于该目录及其子目录"""
+        if not self.use_gitignore:
+            return
+        try:
+            with open(gitignore_path, 'r', encoding='utf-8', errors='ignore') as f:
+                lines = f.read().splitlines()
+        except OSError:
+            return
+
+        base_dir = rel_dir.replace(os.sep, '/')
+        for line in lines:
+            pattern = _strip_gitignore_line(line)
+            if pattern:
+                self.gitignore_patterns.append(IgnorePattern(pattern, base_dir))
+
+    def is_ignored(self, rel_path: str, is_dir: bool) -> bool:
+        """判断路径是否应被忽略，gitignore规则中最后匹配的一条生效"""
+        rel_path = rel_path.replace(os.sep, '/')
+        name = rel_path.rsplit('/', 1)[-1]
+
+        ignored = is_dir and (name in self.ignored_dirs or name.endswith(self.ignored_suffixes))
+        rule = 'builtin' if ignored else ''
+        for pattern in self.gitignore_patterns:
+            if pattern.matches(rel_path, is_dir):
+                ignored = not pattern.negated
+                rule = 'gitignore'
+
+        if not ignored and any(pattern.matches(rel_path, is_dir) and not pattern.negated
+                               for pattern in self.exclude_patterns):
+            ignored, rule = True, 'exclude'
+
+        if ignored:
+            self.ignored_count += 1
+            if is_dir:
+                self.pruned_dirs.append({'path': rel_path, 'rule': rule})
+        return ignored
+
+    def exceeds_size_limit(self, size: int) -> bool:
+        """文件是否超过大小上限"""
+        return bool(self.max_file_size) and size > self.max_file_size
+
+
+def _strip_gitignore_line(line: str) -> str:
+    """去除空行、注释和未转义的行尾空格，转义字符留给通配符转换处理"""
+    if not line.strip() or line.startswith('#'):
+        return ''
+    stripped = line.rstrip(' ')
+    if stripped.endswith('\\') and len(stripped) < len(line):
+        stripped += ' '
+    return stripped
+
+
+def _translate(pattern: str) -> str:
+    """将gitignore通配符转换为正则表达式"""
+    result: List[str] = []
+    i, n = 0, len(pattern)
+    while i < n:
+        c = pattern[i]
+        if c == '*':
+            if pattern[i:i + 3] == '**/':
+                result.append('(?:.*/)?')
+                i += 3
+                continue
+            if pattern[i:i + 2] == '**':
+                result.append('.*')
+                i += 2
+                continue
+            result.append('[^/]*')
+        elif c == '?':
+            result.append('[^/]')
+        elif c == '[':
+            end, char_class = _translate_char_class(pattern, i)
+            result.append(char_class)
+            i = end
+            continue
+        elif c == '\\' and i + 1 < n:
+            i += 1
+            result.append(re.escape(pattern[i]))
+        else:
+            result.append(re.escape(c))
+        i += 1
+    return ''.join(result)
+
+
+def _translate_char_class(pattern: str, start: int) -> Tuple[int, str]:
+    """转换[...]字符类，返回 (结束位置, 正则片段)；没有闭合括号时按字面量处理"""
+    i = start + 1
+    if i < len(pattern) and pattern[i] in '!^':
+        i += 1
+    if i < len(pattern) and pattern[i] == ']':
+        i += 1
+    while i < len(pattern) and pattern[i] != ']':
+        i += 1
+    if i >= len(pattern):
+        return start + 1, re.escape('[')
+
+    body = pattern[start + 1:i]
+    if body[:1] in ('!', '^'):
+        body = '^' + body[1:]
+    body = body.replace('\\', '\\\\')
+    return i + 1, f'[{body}]'
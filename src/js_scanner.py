@@ -0,0 +1,276 @@
+"""
+JavaScript/TypeScript扫描器 - 一次线性扫描提取函数、类及其方法、导入和注释
+
+字符串、模板字符串、正则字面量和注释作为整体跳过，其中的内容不会被识别为声明；
+不构建语法树，声明按常见写法用正则识别，适用于体积很大（包括压缩过）的前端文件
+"""
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+
+_QUOTED = r"""'(?:[^'\\\n]|\\.)*'|"(?:[^"\\\n]|\\.)*\""""
+# 赋值或属性值处的函数：function表达式、带括号参数或单个参数的箭头函数
+_FUNCTION_VALUE = (r'(?P<{0}_async>async\s*)?(?:function\b\s*\*?\s*[\w$]*\s*\((?:(?P<{0}_fargs>[^()]*)\))?'
+                   r'|\((?P<{0}_args>[^()]*)\)\s*(?::[^=;{{}}()]+)?=>|(?P<{0}_arg>[\w$]+)\s*=>)')
+
+# 字符串、注释等需要整体跳过的记号
+_LEXICAL = [
+    r'(?P<line_comment>//[^\n]*)',
+    r'(?P<block_comment>/\*[\s\S]*?(?:\*/|\Z))',
+    rf'(?P<string>{_QUOTED})',
+    r'(?P<template>`)',
+    r'(?P<slash>/)',
+]
+
+# 以标识符开始的声明，只在标识符的开头尝试
+_DECLARATIONS = [
+    # import x from 'm' / import {a, b} from 'm' / export * from 'm' / import 'm'
+    r'(?:import|export)\s*(?:type\s+)?(?:[\w$]+\s*,?\s*)?(?:\*\s*(?:as\s+[\w$]+\s*)?)?'
+    rf'(?:\{{[^{{}}]*\}}\s*)?(?:from\s*)?(?P<import_source>{_QUOTED})',
+    # require('m') / import('m')
+    rf'(?:require|import)\s*\(\s*(?P<require_source>{_QUOTED})\s*\)',
+    r'class\s+(?P<class_name>[\w$]+)(?P<class_head>[^{};]*)\{',
+    r'(?P<function_async>async\s+)?function\b\s*\*?\s*(?P<function_name>[\w$]+)?\s*'
+    r'(?:<[^(){};]*>\s*)?\((?:(?P<function_args>[^()]*)\))?',
+    # const name = ... / name = ...（类中即为类字段方法）
+    r'(?:(?:const|let|var)\s+)?(?P<assign_name>#?[\w$]+)\s*(?::[^=;{}(),\n]+)?=(?![=>])\s*'
+    + _FUNCTION_VALUE.format('assign'),
+    # name: function() / name: () =>
+    r'(?P<property_name>[\w$]+)\s*:\s*' + _FUNCTION_VALUE.format('property'),
+]
+
+# 类方法：[static] [async] [get|set] name(args) [: 返回类型] {
+_METHOD = (r'(?P<method_modifiers>(?:(?:static|async|get|set|public|private|protected|readonly|override|abstract)'
+           r'\s+)*)(?:\*\s*)?'
+           r'(?P<method_name>#?[\w$]+)\s*(?:<[^(){};]*>\s*)?\((?P<method_args>[^()]*)\)\s*(?::[^{};=]+)?\{')
+
+
+def _token_pattern(in_class: bool) -> re.Pattern:
+    """
+    组合扫描用的正则：只在非空白字符处尝试，声明只在标识符的开头尝试；
+    类体中还要识别方法并匹配花括号以确定类的结束位置，类外不需要
+    """
+    declarations = _DECLARATIONS + [_METHOD] if in_class else _DECLARATIONS
+    alternatives = _LEXICAL + [r'(?<![\w$.#])(?=[\w$#*])(?:' + '|'.join(declarations) + ')']
+    if in_class:
+        alternatives += [r'(?P<open>\{)', r'(?P<close>\})']
+    return re.compile(r'(?=\S)(?:' + '|'.join(alternatives) + ')')
+
+
+_TOKEN = _token_pattern(in_class=False)
+_CLASS_BODY_TOKEN = _token_pattern(in_class=True)
+
+# 模板字符串的文本部分只需找结束的反引号和插值的开始；插值表达式中还要跳过字符串并匹配花括号
+_TEMPLATE_TEXT = re.compile(r'\\[\s\S]|`|\$\{')
+_TEMPLATE_EXPRESSION = re.compile(r'`|\{|\}|' + _QUOTED)
+
+# 正则字面量（含字符类中的/）
+_REGEX_LITERAL = re.compile(r'/(?:[^/\\\[\n]|\\.|\[(?:[^\]\\\n]|\\.)*\])+/[A-Za-z]*')
+
+# 出现在这些字符或关键字之后的/是正则字面量的开始，否则是除号
+_REGEX_PRECEDERS = set('(,=:[!&|?{};+-*%<>~^')
+_REGEX_KEYWORDS = {'return', 'typeof', 'case', 'do', 'else', 'in', 'of', 'new', 'delete', 'void',
+                   'throw', 'instanceof', 'yield', 'await'}
+
+# 形如 name(...) { 但不是方法定义的语句
+_CONTROL_KEYWORDS = {'if', 'for', 'while', 'switch', 'catch', 'with', 'function', 'return', 'typeof',
+                     'await', 'new', 'do', 'else'}
+
+_PARAM_NAME = re.compile(r'^\s*(?:\.\.\.)?\s*(?:(?:public|private|protected|readonly)\s+)*([\w$]+)')
+_EXTENDS = re.compile(r'\bextends\s+([\w$.]+)')
+
+
+def scan_javascript(content: str) -> Dict[str, Any]:
+    """
+    扫描JS/TS源码，返回functions、classes、imports和comments
+
+    functions包括函数声明、赋值给变量或属性的函数表达式和箭头函数以及类方法，
+    类方法带有qualname（类名.方法名）；comments为 (行号, 注释文本) 列表
+    """
+    scanner = _Scanner(content)
+    scanner.run()
+    return {'functions': scanner.functions, 'classes': scanner.classes,
+            'imports': scanner.imports, 'comments': scanner.comments}
+
+
+class _Scanner:
+    """
+    扫描状态：当前行号只在需要时从上次位置向后累计，整个扫描对文件长度是线性的；
+    只有处于类体中时才匹配花括号和方法
+    """
+
+    def __init__(self, content: str):
+        self.content = content
+        self.functions: List[Dict[str, Any]] = []
+        self.classes: List[Dict[str, Any]] = []
+        self.imports: List[str] = []
+        self.comments: List[Tuple[int, str]] = []
+        self._line = 1
+        self._line_pos = 0
+        self._depth = 0
+        # 正在扫描的类：(类信息, 类体所在的花括号深度)
+        self._class_stack: List[Tuple[Dict[str, Any], int]] = []
+
+    def run(self):
+        content = self.content
+        pos = 0
+        while True:
+            match = (_CLASS_BODY_TOKEN if self._class_stack else _TOKEN).search(content, pos)
+            if match is None:
+                break
+            kind = match.lastgroup
+            pos = match.end()
+
+            if kind == 'open':
+                self._depth += 1
+            elif kind == 'close':
+                if self._class_stack and self._class_stack[-1][1] == self._depth:
+                    class_info, _ = self._class_stack.pop()
+                    class_info['end_line_number'] = self._line_at(match.start())
+                self._depth = max(self._depth - 1, 0)
+            elif kind == 'string':
+                continue
+            elif kind == 'line_comment':
+                self.comments.append((self._line_at(match.start()), match.group()[2:].strip()))
+            elif kind == 'block_comment':
+                self._block_comment(match)
+            elif kind == 'template':
+                pos = self._skip_template(pos)
+            elif kind == 'slash':
+                if self._starts_regex(match.start()):
+                    literal = _REGEX_LITERAL.match(content, match.start())
+                    if literal is not None:
+                        pos = literal.end()
+            elif match.group('import_source') or match.group('require_source'):
+                self.imports.append((match.group('import_source') or match.group('require_source'))[1:-1])
+            elif match.group('class_name'):
+                self._class(match)
+            elif match.re is _CLASS_BODY_TOKEN and match.group('method_name'):
+                self._method(match)
+            else:
+                self._function(match)
+
+    def _line_at(self, pos: int) -> int:
+        if pos >= self._line_pos:
+            self._line += self.content.count('\n', self._line_pos, pos)
+        else:
+            self._line -= self.content.count('\n', pos, self._line_pos)
+        self._line_pos = pos
+        return self._line
+
+    def _block_comment(self, match: re.Match):
+        line = self._line_at(match.start())
+        text = match.group()[2:]
+        if text.endswith('*/'):
+            text = text[:-2]
+        lines = [part.strip().lstrip('*').strip() for part in text.split('\n')]
+        self.comments.append((line, '\n'.join(part for part in lines if part)))
+
+    def _skip_template(self, pos: int) -> int:
+        """跳过模板字符串，插值表达式中可以嵌套字符串和模板字符串；返回结束位置"""
+        content = self.content
+        # 栈中为每层模板字符串内已打开的插值花括号数
+        stack = [0]
+        while stack:
+            in_expression = stack[-1] > 0
+            match = (_TEMPLATE_EXPRESSION if in_expression else _TEMPLATE_TEXT).search(content, pos)
+            if match is None:
+                return len(content)
+            pos = match.end()
+            token = match.group()
+            if token == '`':
+                if in_expression:
+                    stack.append(0)
+                else:
+                    stack.pop()
+            elif token == '${':
+                stack[-1] += 1
+            elif token == '{':
+                stack[-1] += 1
+            elif token == '}':
+                stack[-1] -= 1
+        return pos
+
+    def _starts_regex(self, pos: int) -> bool:
+        """根据/之前的非空白字符或关键字判断是否为正则字面量"""
+        content = self.content
+        index = pos - 1
+        while index >= 0 and content[index] in ' \t\r\n':
+            index -= 1
+        if index < 0 or content[index] in _REGEX_PRECEDERS:
+            return True
+        end = index + 1
+        while index >= 0 and (content[index].isalnum() or content[index] in '_$'):
+            index -= 1
+        return content[index + 1:end] in _REGEX_KEYWORDS
+
+    def _current_class(self) -> Optional[Dict[str, Any]]:
+        """当前位置直接处于某个类体中时返回该类"""
+        if self._class_stack and self._class_stack[-1][1] == self._depth:
+            return self._class_stack[-1][0]
+        return None
+
+    def _class(self, match: re.Match):
+        extends = _EXTENDS.search(match.group('class_head'))
+        class_info = {
+            'name': match.group('class_name'),
+            'methods': [],
+            'line_number': self._line_at(match.start('class_name')),
+            'bases': [extends.group(1)] if extends else [],
+            'type': 'javascript'
+        }
+        self.classes.append(class_info)
+        self._depth += 1
+        self._class_stack.append((class_info, self._depth))
+
+    def _method(self, match: re.Match):
+        name = match.group('method_name')
+        class_info = self._current_class()
+        # 匹配以{结束，无论是否为方法都要计入深度
+        self._depth += 1
+        if class_info is None or name in _CONTROL_KEYWORDS:
+            return
+        self._add_function(name, match.group('method_args'), match.start('method_name'), class_info,
+                           'async' in match.group('method_modifiers').split())
+
+    def _function(self, match: re.Match):
+        for prefix in ('function', 'assign', 'property'):
+            name = match.group(f'{prefix}_name')
+            if name is not None:
+                break
+        else:
+            # 匿名函数表达式不单独记录
+            return
+        if prefix == 'function':
+            args = match.group('function_args')
+        else:
+            args = next((match.group(f'{prefix}_{group}') for group in ('args', 'fargs', 'arg')
+                         if match.group(f'{prefix}_{group}') is not None), None)
+        class_info = self._current_class() if prefix == 'assign' else None
+        self._add_function(name, args, match.start(f'{prefix}_name'), class_info,
+                           bool(match.group(f'{prefix}_async')))
+
+    def _add_function(self, name: str, args: Optional[str], pos: int,
+                      class_info: Optional[Dict[str, Any]], is_async: bool):
+        if class_info is not None:
+            class_info['methods'].append(name)
+        self.functions.append({
+            'name': name,
+            'qualname': f"{class_info['name']}.{name}" if class_info is not None else name,
+            'args': _parameter_names(args),
+            'line_number': self._line_at(pos),
+            'is_async': is_async,
+            'type': 'javascript'
+        })
+
+
+def _parameter_names(args: Optional[str]) -> List[str]:
+    """参数列表中的参数名，忽略默认值和类型标注；解构参数没有名称，跳过"""
+    if not args or not args.strip():
+        return []
+    names = []
+    for param in args.split(','):
+        match = _PARAM_NAME.match(param)
+        if match is not None:
+            names.append(match.group(1))
+    return names
@@ -0,0 +1,195 @@
+"""
+增量JSON解析 - 逐块读取流式响应，字符串中的括号不参与匹配；每个对象闭合时立即解码并交给调用方，
+响应明显不是预期格式时尽早报错，使调用方可以中止请求
+"""
+import json
+from typing import Any, Callable, Iterable, List, Optional
+
+
+# JSON开始之前允许出现的非空白字符数（如 ```json 代码块标记或简短的引导语），超出时判定响应不是JSON
+DEFAULT_MAX_PREAMBLE = 200
+
+_OPENERS = {'{': '}', '[': ']'}
+
+
+class MalformedResponse(ValueError):
+    """响应格式错误或不符合预期结构，已提前中止读取"""
+
+
+class JSONStreamParser:
+    """
+    流式响应的增量JSON解析器
+
+    expect为顶层值的类型（object/array）。记录是指顶层对象，或顶层数组中的各个元素：
+    keys给定时记录中只允许出现这些键，required为记录闭合时必须具备的键。顶层为对象时，
+    记录不符合要求即报错；顶层为数组时只丢弃该元素（计入rejected），继续解析后续元素
+    """
+
+    def __init__(self, expect: str = 'object', keys: Optional[Iterable[str]] = None,
+                 required: Iterable[str] = (), max_preamble: int = DEFAULT_MAX_PREAMBLE,
+                 on_value: Optional[Callable[[Any], None]] = None):
+        self.expect = expect
+        self.keys = frozenset(keys) if keys is not None else None
+        self.required = frozenset(required)
+        self.max_preamble = max_preamble
+        self.on_value = on_value
+        self.reset()
+
+    def reset(self):
+        """清空解析状态，重新请求时使用"""
+        self.values: List[Any] = []
+        self.rejected = 0
+        self.done = False
+        self._buffer = ''
+        self._pos = 0
+        self._start: Optional[int] = None
+        self._end: Optional[int] = None
+        self._in_string = False
+        self._escape = False
+        self._string_start = 0
+        # 已打开的容器: [闭合字符, 是否期待键, 是否为记录, 起始位置, 已出现的键, 是否已违反键约束]
+        self._stack: List[list] = []
+
+    @property
+    def text(self) -> str:
+        """顶层JSON值的文本，尚未闭合时为已读取的部分"""
+        if self._start is None:
+            return ''
+        return self._buffer[self._start:self._end]
+
+    @property
+    def started(self) -> bool:
+        return self._start is not None
+
+    def feed(self, chunk: str) -> bool:
+        """读入一块文本，返回顶层值是否已经闭合；格式错误时抛出MalformedResponse"""
+        if self.done:
+            return True
+        self._buffer += chunk
+        if self._start is None and not self._find_start():
+            return False
+        self._scan()
+        return self.done
+
+    def finish(self):
+        """
+        响应结束：顶层为对象时必须已经闭合；顶层为数组时允许因输出长度限制而截断，
+        已闭合的元素仍然有效
+        """
+        if self.done:
+            return
+        if self._start is None:
+            raise MalformedResponse('响应中没有JSON')
+        if self.expect == 'object':
+            raise MalformedResponse('响应在JSON结束前中断')
+
+    def _find_start(self) -> bool:
+        """跳过JSON之前的引导内容，找到顶层值的开始位置"""
+        buffer = self._buffer
+        for index in range(self._pos, len(buffer)):
+            char = buffer[index]
+            if char in _OPENERS:
+                if (char == '{') != (self.expect == 'object'):
+                    raise MalformedResponse(f'顶层值应为{self.expect}')
+                self._start = self._pos = index
+                return True
+        self._pos = len(buffer)
+        if len(buffer.strip()) > self.max_preamble:
+            raise MalformedResponse('响应不是JSON')
+        return False
+
+    def _scan(self):
+        buffer = self._buffer
+        stack = self._stack
+        index = self._pos
+        length = len(buffer)
+        while index < length:
+            char = buffer[index]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == '\\':
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+                    self._end_string(index)
+                index += 1
+                continue
+
+            if char == '"':
+                self._in_string = True
+                self._string_start = index
+            elif char in _OPENERS:
+                is_record = (not stack and self.expect == 'object') or (
+                    len(stack) == 1 and self.expect == 'array')
+                if stack and stack[-1][0] == '}' and stack[-1][1]:
+                    raise MalformedResponse(f'位置{index}处应为键')
+                stack.append([_OPENERS[char], char == '{', is_record, index, set(), False])
+                if is_record and char != '{':
+                    if self.expect == 'object':
+                        raise MalformedResponse('记录应为对象')
+                    stack[-1][5] = True
+            elif char in '}]':
+                if not stack or stack[-1][0] != char:
+                    raise MalformedResponse(f'位置{index}处的{char}不匹配')
+                closer, _, is_record, start, seen, invalid = stack.pop()
+                if is_record:
+                    self._close_record(buffer[start:index + 1], seen, invalid)
+                if not stack:
+                    self.done = True
+                    self._end = index + 1
+                    self._pos = index + 1
+                    return
+            elif char == ',':
+                if stack[-1][0] == '}':
+                    stack[-1][1] = True
+            elif char == ':':
+                if stack[-1][0] != '}' or stack[-1][1]:
+                    raise MalformedResponse(f'位置{index}处的冒号不在键之后')
+            index += 1
+        self._pos = index
+
+    def _end_string(self, index: int):
+        """字符串结束：处于记录对象中期待键的位置时，检查该键"""
+        container = self._stack[-1]
+        if container[0] != '}' or not container[1]:
+            return
+        container[1] = False
+        if not container[2]:
+            return
+        key = json.loads(self._buffer[self._string_start:index + 1], strict=False)
+        container[4].add(key)
+        if self.keys is not None and key not in self.keys:
+            if self.expect == 'object':
+                raise MalformedResponse(f'出现预期之外的键: {key}')
+            container[5] = True
+
+    def _close_record(self, text: str, seen: set, invalid: bool):
+        """记录闭合：解码并检查必需的键，通过后立即交给调用方"""
+        if not invalid and not self.required <= seen:
+            if self.expect == 'object':
+                raise MalformedResponse(f'缺少键: {", ".join(sorted(self.required - seen))}')
+            invalid = True
+        if invalid:
+            self.rejected += 1
+            return
+        try:
+            value = json.loads(text, strict=False)
+        except ValueError as e:
+            raise MalformedResponse(f'JSON格式错误: {e}')
+        self.values.append(value)
+        if self.on_value is not None:
+            self.on_value(value)
+
+
+def extract_json_text(content: str, expect: str = 'object') -> str:
+    """从完整响应中取出从第一个对象（或数组）开始的完整JSON值的文本；找不到完整的值时返回原内容"""
+    start = content.find('{' if expect == 'object' else '[')
+    if start == -1:
+        return content
+    parser = JSONStreamParser(expect)
+    try:
+        parser.feed(content[start:])
+    except MalformedResponse:
+        return content
+    return parser.text if parser.done else content
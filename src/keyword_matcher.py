@@ -0,0 +1,70 @@
+"""
+多关键词匹配器 - 一次扫描文本找出全部关键词（包括相互重叠的匹配），给出出现次数和位置
+"""
+from collections import Counter
+from typing import Dict, Iterable, Iterator, List, Set, Tuple
+
+try:
+    import ahocorasick
+except ImportError:
+    ahocorasick = None
+
+
+class KeywordMatcher:
+    """
+    编译后的多模式匹配器，关键词列表只需编译一次即可反复用于不同文本
+
+    安装了pyahocorasick时构建Aho-Corasick自动机，一次扫描找出全部关键词；
+    未安装时退回逐个关键词的子串查找（与原有写法等价，结果一致）
+    """
+
+    def __init__(self, keywords: Iterable[str]):
+        self.keywords: List[str] = list(dict.fromkeys(keyword for keyword in keywords if keyword))
+        self._automaton = None
+        if ahocorasick is not None and self.keywords:
+            self._automaton = ahocorasick.Automaton()
+            for keyword in self.keywords:
+                self._automaton.add_word(keyword, keyword)
+            self._automaton.make_automaton()
+
+    def finditer(self, text: str) -> Iterator[Tuple[int, str]]:
+        """产出全部匹配的 (起始位置, 关键词)，按匹配结束位置排列"""
+        if not text or not self.keywords:
+            return iter(())
+        if self._automaton is not None:
+            return ((end - len(keyword) + 1, keyword) for end, keyword in self._automaton.iter(text))
+        return iter(sorted(((start, keyword) for keyword in self.keywords
+                            for start in _find_positions(text, keyword)),
+                           key=lambda match: (match[0] + len(match[1]), match[1])))
+
+    def counts(self, text: str) -> Dict[str, int]:
+        """每个出现过的关键词的出现次数"""
+        return dict(Counter(keyword for _, keyword in self.finditer(text)))
+
+    def found(self, text: str) -> Set[str]:
+        """文本中出现过的关键词集合"""
+        if not text or not self.keywords:
+            return set()
+        if self._automaton is not None:
+            return {keyword for _, keyword in self._automaton.iter(text)}
+        return {keyword for keyword in self.keywords if keyword in text}
+
+    def count_found(self, text: str) -> int:
+        """文本中出现过的不同关键词个数，等价于 sum(1 for k in keywords if k in text)"""
+        return len(self.found(text))
+
+    def any_found(self, text: str) -> bool:
+        """文本中是否出现任一关键词"""
+        if not text or not self.keywords:
+            return False
+        if self._automaton is not None:
+            return next(self._automaton.iter(text), None) is not None
+        return any(keyword in text for keyword in self.keywords)
+
+
+def _find_positions(text: str, keyword: str) -> Iterator[int]:
+    """关键词在文本中的全部起始位置（允许重叠）"""
+    start = text.find(keyword)
+    while start != -1:
+        yield start
+        start = text.find(keyword, start + 1)
@@ -0,0 +1,462 @@
+"""
+本地替身服务 - 实现Messages和Message Batches接口的最小HTTP服务，批量模式可在无网络的CI中运行
+
+用法: python local_batch_server.py --port 8765 --processing-seconds 2
+     python local_batch_server.py --port 8765 --stream-chunk-seconds 0.01 --malformed-rate 0.2
+     python local_batch_server.py --port 8765 --rate-limit-rate 0.3 --overload-rate 0.1 --disconnect-rate 0.05
+     python main.py --repo-path ... --batch-mode --api-base-url http://127.0.0.1:8765 --claude-api-key test
+"""
+import argparse
+import hashlib
+import json
+import re
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from prompt_budget import estimate_tokens
+
+
+# 替身响应中的推理过程：满足问答和设计方案的推理质量校验
+_STAND_IN_REASONING = (
+    "1. 现状分析：首先分析该代码的背景与问题，因为当前架构的设计原则和模式影响实现方式。"
+    "2. 方案对比：评估不同技术方案的优势与劣势，考虑风险和缓解措施，所以选择更符合实践的策略。"
+    "3. 实施考量：说明实施步骤、验收标准和评估指标，以及对性能、维护和扩展的影响。"
+    "4. 最佳实践：结合业界实践总结设计原因与架构取舍。"
+)
+
+# 去掉花括号和方括号，避免摘录的提示词干扰响应中JSON的提取
+_BRACKETS = re.compile(r'[{}\[\]`]')
+
+# 格式错误的替身响应：没有按要求返回JSON，而是一大段说明文字
+_MALFORMED_RESPONSE = "抱歉，我无法直接给出JSON格式的结果。下面先对代码的设计背景、实现方式和可能的改进方向做一些说明。" * 30
+
+# 流式响应中每个文本片段的字符数
+_STREAM_CHUNK_CHARS = 16
+
+
+def stand_in_response(params: Dict[str, Any]) -> str:
+    """
+    默认的替身响应：根据提示词生成确定的JSON，系统提示词中要求question字段时返回问答对，否则返回设计方案；
+    系统提示词要求返回JSON数组时，为提示词中的每个编号（F1、F2……）各返回一个对象
+    """
+    prompt = params['messages'][0]['content']
+    if not isinstance(prompt, str):
+        prompt = ''.join(block.get('text', '') for block in prompt)
+    system = ''.join(block.get('text', '') for block in params.get('system', []) or [])
+
+    def entry(text: str) -> Dict[str, Any]:
+        digest = hashlib.sha1(text.encode('utf-8')).hexdigest()[:12]
+        excerpt = ' '.join(_BRACKETS.sub(' ', text).split())[:400]
+        reasoning_trace = f'{_STAND_IN_REASONING}（{digest}）{excerpt[:200]}'
+        if '"question"' in system:
+            return {
+                'question': f'关于以下内容的设计与实现有哪些考量？({digest}) {excerpt[:120]}',
+                'answer': f'本地替身响应 {digest}：{excerpt}',
+                'reasoning_trace': reasoning_trace
+            }
+        return {
+            'title': f'替身方案 {digest}',
+            'description': excerpt,
+            'technical_approach': excerpt[:200],
+            'implementation_steps': [f'步骤{i}: {excerpt[:40]}' for i in range(1, 7)],
+            'benefits': ['可验证'],
+            'challenges_and_solutions': [],
+            'acceptance_criteria': ['结果可复现'],
+            'estimated_effort': 'Medium',
+            'timeline': '2周',
+            'reasoning_trace': reasoning_trace
+        }
+
+    if 'JSON数组' in system:
+        sections = re.split(r'(?m)^#+[^\n]*?\b(F\d+)\b.*$', prompt)
+        items = []
+        for number, text in zip(sections[1::2], sections[2::2]):
+            items.append(dict(entry(text), id=number))
+        return json.dumps(items, ensure_ascii=False)
+    return json.dumps(entry(prompt), ensure_ascii=False)
+
+
+class LocalBatchServer:
+    """
+    Messages和Message Batches接口的本地替身
+
+    批量任务创建后经过processing_seconds秒才结束，模拟异步处理；error_rate按custom_id和该请求的
+    提交次数的哈希确定性地把一部分请求标记为失败（api_error），重新提交时可能成功，用于验证失败重试。
+    malformed_rate以同样的方式（按请求内容和请求次数）让一部分响应返回说明文字而不是JSON；
+    stream为true的请求以SSE逐片段返回，每个片段间隔stream_chunk_seconds秒，模拟生成速度；
+    非流式请求按同样的速度等待全部片段生成后才返回。强制调用工具的请求返回tool_use块，
+    参数按工具的输入模式取齐字段，与严格模式的工具一样不会出现格式错误。
+    rate_limit_rate、overload_rate和disconnect_rate按请求内容和请求次数让一部分Messages请求
+    返回429（带retry-after响应头，值为retry_after_seconds）、返回529或不返回响应直接断开连接，
+    重新请求时可能成功，用于验证客户端的重试与退避
+    """
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 8765, processing_seconds: float = 1.0,
+                 error_rate: float = 0.0,
+                 responder: Callable[[Dict[str, Any]], str] = stand_in_response,
+                 malformed_rate: float = 0.0, stream_chunk_seconds: float = 0.0,
+                 rate_limit_rate: float = 0.0, overload_rate: float = 0.0, disconnect_rate: float = 0.0,
+                 retry_after_seconds: float = 1.0):
+        self.processing_seconds = processing_seconds
+        self.error_rate = error_rate
+        self.responder = responder
+        self.malformed_rate = malformed_rate
+        self.stream_chunk_seconds = stream_chunk_seconds
+        self.rate_limit_rate = rate_limit_rate
+        self.overload_rate = overload_rate
+        self.disconnect_rate = disconnect_rate
+        self.retry_after_seconds = retry_after_seconds
+        self._lock = threading.Lock()
+        self._batches: Dict[str, Dict[str, Any]] = {}
+        # custom_id → 提交次数
+        self._submissions: Dict[str, int] = {}
+        # 请求内容的哈希 → 请求次数
+        self._requests: Dict[str, int] = {}
+        # 请求内容的哈希 → 到达次数，用于确定注入的故障
+        self._deliveries: Dict[str, int] = {}
+        # output_tokens为实际发出的输出token数：流式请求被客户端提前断开时只计已发出的部分
+        self._counters = {'messages': 0, 'batches': 0, 'batch_requests': 0, 'streams': 0,
+                          'stream_disconnects': 0, 'malformed': 0, 'output_tokens': 0,
+                          'rate_limited': 0, 'overloaded': 0, 'disconnected': 0}
+        self.httpd = ThreadingHTTPServer((host, port), self._handler_class())
+        self.base_url = f'http://{host}:{self.httpd.server_address[1]}'
+
+    def serve_forever(self):
+        self.httpd.serve_forever()
+
+    def start(self) -> threading.Thread:
+        """在后台线程中运行服务，返回该线程"""
+        thread = threading.Thread(target=self.serve_forever, name='local-batch-server', daemon=True)
+        thread.start()
+        return thread
+
+    def shutdown(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._counters)
+
+    def create_message(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        with self._lock:
+            self._counters['messages'] += 1
+        message = self._message(params)
+        if self.stream_chunk_seconds:
+            # 非流式请求同样按生成速度等待完整响应
+            chunks = -(-len(message['content'][0]['text']) // _STREAM_CHUNK_CHARS)
+            time.sleep(self.stream_chunk_seconds * chunks)
+        with self._lock:
+            self._counters['output_tokens'] += message['usage']['output_tokens']
+        return message
+
+    def stream_message(self, params: Dict[str, Any], write: Callable[[bytes], None]):
+        """以SSE事件流返回响应；客户端断开时停止发送，只统计已发出的输出token"""
+        with self._lock:
+            self._counters['messages'] += 1
+            self._counters['streams'] += 1
+        message = self._message(params)
+        text = message['content'][0]['text']
+        usage = message['usage']
+
+        def event(name: str, payload: Dict[str, Any]):
+            write(f"event: {name}\ndata: {json.dumps(payload, ensure_ascii=False)}\n\n".encode('utf-8'))
+
+        sent = 0
+        try:
+            event('message_start', {'type': 'message_start',
+                                    'message': dict(message, content=[], stop_reason=None,
+                                                    usage=dict(usage, output_tokens=1))})
+            event('content_block_start', {'type': 'content_block_start', 'index': 0,
+                                          'content_block': {'type': 'text', 'text': ''}})
+            for start in range(0, len(text), _STREAM_CHUNK_CHARS):
+                if self.stream_chunk_seconds:
+                    time.sleep(self.stream_chunk_seconds)
+                event('content_block_delta', {'type': 'content_block_delta', 'index': 0,
+                                              'delta': {'type': 'text_delta',
+                                                        'text': text[start:start + _STREAM_CHUNK_CHARS]}})
+                sent = start + _STREAM_CHUNK_CHARS
+            event('content_block_stop', {'type': 'content_block_stop', 'index': 0})
+            event('message_delta', {'type': 'message_delta',
+                                    'delta': {'stop_reason': 'end_turn', 'stop_sequence': None},
+                                    'usage': {'output_tokens': usage['output_tokens']}})
+            event('message_stop', {'type': 'message_stop'})
+        except (BrokenPipeError, ConnectionResetError):
+            with self._lock:
+                self._counters['stream_disconnects'] += 1
+                self._counters['output_tokens'] += estimate_tokens(text[:sent])
+            return
+        with self._lock:
+            self._counters['output_tokens'] += usage['output_tokens']
+
+    def create_batch(self, requests: List[Dict[str, Any]]) -> Dict[str, Any]:
+        batch_id = f'msgbatch_{uuid.uuid4().hex[:24]}'
+        with self._lock:
+            attempts = []
+            for request in requests:
+                self._submissions[request['custom_id']] = self._submissions.get(request['custom_id'], 0) + 1
+                attempts.append(self._submissions[request['custom_id']])
+            self._batches[batch_id] = {'requests': requests, 'attempts': attempts, 'created': time.time(),
+                                       'results': None}
+            self._counters['batches'] += 1
+            self._counters['batch_requests'] += len(requests)
+        return self.batch_status(batch_id)
+
+    def batch_status(self, batch_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            batch = self._batches.get(batch_id)
+        if batch is None:
+            return None
+        created = datetime.fromtimestamp(batch['created'], timezone.utc)
+        ended = time.time() - batch['created'] >= self.processing_seconds
+        counts = {'processing': 0, 'succeeded': 0, 'errored': 0, 'canceled': 0, 'expired': 0}
+        if ended:
+            for _, result in self._results(batch_id):
+                counts[result['type']] += 1
+        else:
+            counts['processing'] = len(batch['requests'])
+        return {
+            'id': batch_id,
+            'type': 'message_batch',
+            'processing_status': 'ended' if ended else 'in_progress',
+            'request_counts': counts,
+            'created_at': created.isoformat(),
+            'expires_at': (created + timedelta(hours=24)).isoformat(),
+            'ended_at': (created + timedelta(seconds=self.processing_seconds)).isoformat() if ended else None,
+            'cancel_initiated_at': None,
+            'archived_at': None,
+            'results_url': f'{self.base_url}/v1/messages/batches/{batch_id}/results' if ended else None
+        }
+
+    def batch_results(self, batch_id: str) -> Optional[str]:
+        """已结束任务的结果，JSONL格式"""
+        status = self.batch_status(batch_id)
+        if status is None or status['processing_status'] != 'ended':
+            return None
+        return ''.join(json.dumps({'custom_id': custom_id, 'result': result}, ensure_ascii=False) + '\n'
+                       for custom_id, result in self._results(batch_id))
+
+    def _results(self, batch_id: str) -> List[Tuple[str, Dict[str, Any]]]:
+        """任务的结果只计算一次"""
+        with self._lock:
+            batch = self._batches[batch_id]
+            if batch['results'] is None:
+                batch['results'] = [(request['custom_id'], self._result(request, attempt))
+                                    for request, attempt in zip(batch['requests'], batch['attempts'])]
+            return batch['results']
+
+    def _result(self, request: Dict[str, Any], attempt: int) -> Dict[str, Any]:
+        digest = hashlib.sha256(f"{request['custom_id']}:{attempt}".encode('utf-8')).digest()
+        if int.from_bytes(digest[:4], 'big') / 2 ** 32 < self.error_rate:
+            return {'type': 'errored',
+                    'error': {'type': 'error', 'error': {'type': 'api_error', 'message': '替身服务模拟的失败'}}}
+        return {'type': 'succeeded', 'message': self._message(request['params'])}
+
+    def _message(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        system = ''.join(block.get('text', '') for block in params.get('system', []) or [])
+        tool = _forced_tool(params)
+        if tool is not None:
+            arguments = _tool_arguments(tool['input_schema'], json.loads(self.responder(params)))
+            text = json.dumps(arguments, ensure_ascii=False)
+            content = [{'type': 'tool_use', 'id': f'toolu_{uuid.uuid4().hex[:24]}', 'name': tool['name'],
+                        'input': arguments}]
+        else:
+            text = _MALFORMED_RESPONSE if self._malformed(params, system) else self.responder(params)
+            content = [{'type': 'text', 'text': text}]
+        return {
+            'id': f'msg_{uuid.uuid4().hex[:24]}',
+            'type': 'message',
+            'role': 'assistant',
+            'model': params.get('model', ''),
+            'content': content,
+            'stop_reason': 'tool_use' if tool is not None else 'end_turn',
+            'stop_sequence': None,
+            'usage': {'input_tokens': estimate_tokens(system) + estimate_tokens(json.dumps(params['messages'])),
+                      'output_tokens': estimate_tokens(text)}
+        }
+
+    def _malformed(self, params: Dict[str, Any], system: str) -> bool:
+        """按请求内容和该内容的请求次数确定是否返回格式错误的响应，重新请求时可能恢复正常"""
+        if not self.malformed_rate:
+            return False
+        request_hash = hashlib.sha256((system + json.dumps(params['messages'], ensure_ascii=False))
+                                      .encode('utf-8')).hexdigest()
+        with self._lock:
+            attempt = self._requests[request_hash] = self._requests.get(request_hash, 0) + 1
+        digest = hashlib.sha256(f"{request_hash}:{attempt}".encode('utf-8')).digest()
+        if int.from_bytes(digest[:4], 'big') / 2 ** 32 >= self.malformed_rate:
+            return False
+        with self._lock:
+            self._counters['malformed'] += 1
+        return True
+
+    def fault(self, params: Dict[str, Any]) -> Optional[str]:
+        """
+        按请求内容和该内容的到达次数确定注入的故障：'rate_limited'、'overloaded'或'disconnected'，
+        不注入故障时返回None
+        """
+        rates = (('rate_limited', self.rate_limit_rate), ('overloaded', self.overload_rate),
+                 ('disconnected', self.disconnect_rate))
+        if not any(rate for _, rate in rates):
+            return None
+        request_hash = hashlib.sha256(json.dumps(params, ensure_ascii=False, sort_keys=True)
+                                      .encode('utf-8')).hexdigest()
+        with self._lock:
+            attempt = self._deliveries[request_hash] = self._deliveries.get(request_hash, 0) + 1
+        digest = hashlib.sha256(f"fault:{request_hash}:{attempt}".encode('utf-8')).digest()
+        draw = int.from_bytes(digest[:4], 'big') / 2 ** 32
+        for name, rate in rates:
+            if draw < rate:
+                with self._lock:
+                    self._counters[name] += 1
+                return name
+            draw -= rate
+        return None
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def do_POST(self):
+                length = int(self.headers.get('content-length') or 0)
+                try:
+                    body = json.loads(self.rfile.read(length) or b'{}')
+                except ValueError:
+                    self._error(400, 'invalid_request_error', '请求体不是有效的JSON')
+                    return
+                path = self.path.split('?')[0].rstrip('/')
+                fault = server.fault(body) if path == '/v1/messages' else None
+                if fault == 'rate_limited':
+                    self._error(429, 'rate_limit_error', '替身服务模拟的限流',
+                                {'retry-after': f'{server.retry_after_seconds:g}'})
+                elif fault == 'overloaded':
+                    self._error(529, 'overloaded_error', '替身服务模拟的过载')
+                elif fault == 'disconnected':
+                    # 不返回任何响应直接关闭连接
+                    self.close_connection = True
+                elif path == '/v1/messages' and body.get('stream') and body.get('tools'):
+                    self._error(400, 'invalid_request_error', '替身服务不支持流式的工具调用')
+                elif path == '/v1/messages' and body.get('stream'):
+                    self.send_response(200)
+                    self.send_header('content-type', 'text/event-stream')
+                    self.send_header('cache-control', 'no-cache')
+                    self.end_headers()
+                    server.stream_message(body, self._write_event)
+                elif path == '/v1/messages':
+                    self._send(200, server.create_message(body))
+                elif path == '/v1/messages/batches':
+                    self._send(200, server.create_batch(body.get('requests', [])))
+                else:
+                    self._error(404, 'not_found_error', f'未知接口: {path}')
+
+            def do_GET(self):
+                match = re.fullmatch(r'/v1/messages/batches/([\w-]+)(/results)?', self.path.split('?')[0])
+                if match is None:
+                    self._error(404, 'not_found_error', f'未知接口: {self.path}')
+                    return
+                if match.group(2):
+                    results = server.batch_results(match.group(1))
+                    if results is None:
+                        self._error(404, 'not_found_error', '批量任务不存在或尚未结束')
+                    else:
+                        self._send_raw(200, results.encode('utf-8'), 'application/binary')
+                    return
+                status = server.batch_status(match.group(1))
+                if status is None:
+                    self._error(404, 'not_found_error', '批量任务不存在')
+                else:
+                    self._send(200, status)
+
+            def _write_event(self, data: bytes):
+                self.wfile.write(data)
+                self.wfile.flush()
+
+            def _error(self, code: int, error_type: str, message: str,
+                       headers: Optional[Dict[str, str]] = None):
+                self._send(code, {'type': 'error', 'error': {'type': error_type, 'message': message}}, headers)
+
+            def _send(self, code: int, payload: Dict[str, Any], headers: Optional[Dict[str, str]] = None):
+                self._send_raw(code, json.dumps(payload, ensure_ascii=False).encode('utf-8'), 'application/json',
+                               headers)
+
+            def _send_raw(self, code: int, data: bytes, content_type: str,
+                          headers: Optional[Dict[str, str]] = None):
+                self.send_response(code)
+                self.send_header('content-type', content_type)
+                self.send_header('content-length', str(len(data)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+        return Handler
+
+
+def _forced_tool(params: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """请求中强制调用的工具声明，没有时返回None"""
+    choice = params.get('tool_choice') or {}
+    if choice.get('type') != 'tool':
+        return None
+    for tool in params.get('tools', []):
+        if tool.get('name') == choice.get('name'):
+            return tool
+    return None
+
+
+def _tool_arguments(schema: Dict[str, Any], value: Any) -> Any:
+    """把替身响应按输入模式取齐：只保留模式中的字段，缺少的字段填空值；数组放入模式中唯一的数组字段"""
+    if schema.get('type') == 'array':
+        return [_tool_arguments(schema.get('items', {}), item) for item in value] if isinstance(value, list) else []
+    if schema.get('type') != 'object':
+        return value if isinstance(value, str) else ''
+    properties = schema.get('properties', {})
+    if isinstance(value, list):
+        wrapper = next(name for name, field in properties.items() if field.get('type') == 'array')
+        value = {wrapper: value}
+    return {name: _tool_arguments(field, value.get(name)) for name, field in properties.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Claude Messages/Message Batches接口的本地替身服务')
+    parser.add_argument('--host', default='127.0.0.1', help='监听地址 (默认: 127.0.0.1)')
+    parser.add_argument('--port', type=int, default=8765, help='监听端口 (默认: 8765)')
+    parser.add_argument('--processing-seconds', type=float, default=1.0,
+                        help='批量任务从创建到结束的时间，单位秒 (默认: 1)')
+    parser.add_argument('--error-rate', type=float, default=0.0,
+                        help='批量任务中标记为失败的请求比例 (默认: 0)')
+    parser.add_argument('--malformed-rate', type=float, default=0.0,
+                        help='返回说明文字而不是JSON的响应比例 (默认: 0)')
+    parser.add_argument('--stream-chunk-seconds', type=float, default=0.0,
+                        help='流式响应中相邻文本片段的间隔，单位秒 (默认: 0)')
+    parser.add_argument('--rate-limit-rate', type=float, default=0.0,
+                        help='返回429限流错误的Messages请求比例 (默认: 0)')
+    parser.add_argument('--overload-rate', type=float, default=0.0,
+                        help='返回529过载错误的Messages请求比例 (默认: 0)')
+    parser.add_argument('--disconnect-rate', type=float, default=0.0,
+                        help='不返回响应直接断开连接的Messages请求比例 (默认: 0)')
+    parser.add_argument('--retry-after-seconds', type=float, default=1.0,
+                        help='429响应中retry-after响应头的值，单位秒 (默认: 1)')
+    args = parser.parse_args()
+
+    server = LocalBatchServer(args.host, args.port, args.processing_seconds, args.error_rate,
+                              malformed_rate=args.malformed_rate, stream_chunk_seconds=args.stream_chunk_seconds,
+                              rate_limit_rate=args.rate_limit_rate, overload_rate=args.overload_rate,
+                              disconnect_rate=args.disconnect_rate, retry_after_seconds=args.retry_after_seconds)
+    print(f"本地替身服务已启动: {server.base_url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.httpd.server_close()
+
+
+if __name__ == "__main__":
+    main()
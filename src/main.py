@@ -7,31 +7,141 @@ import json
 import math
 import argparse
 from pathlib import Path
-from typing import Dict, List, Any, Optional
+from typing import Dict, List, Any, Optional, Set, Tuple
 from datetime import datetime
 
+from artifact_store import ArtifactStore
+from claude_client import DEFAULT_MODEL, ClaudeClient, create_anthropic_client
 from code_analyzer import CodeAnalyzer
+from ignore_rules import IgnoreRules, DEFAULT_MAX_FILE_SIZE
+from prompt_budget import DEFAULT_CONTEXT_TOKENS
 from qa_generator import QAGenerator
+from rate_limiter import RateLimiter, RetryPolicy
 from design_generator import DesignGenerator
+from keyword_matcher import KeywordMatcher
+from message_batches import DEFAULT_POLL_INTERVAL, BatchQueue
+from near_duplicate import DEFAULT_THRESHOLD, NearDuplicateIndex, load_dataset_texts
 from reasoning_quality_assessor import ReasoningQualityAssessor
+from response_cache import ResponseCache
+from run_journal import RunJournal
+from snippet_service import DEFAULT_MAX_SNIPPET_BYTES, SnippetService
+from stage_scheduler import Stage, StageScheduler
+from streaming_pipeline import AnalysisStream
+
+
+# 推理质量评估使用的指标词表
+ANALYSIS_PATTERNS = ['分析', '首先', '其次', '然后', '最后', '综合', '1)', '2)', '3)', '步骤', '过程', '阶段']
+CAUSAL_PATTERNS = ['因为', '所以', '因此', '由于', '导致', '结果', '原因']
+REASONING_CONNECTORS = ['考虑到', '基于', '根据', '鉴于', '综合考虑', '权衡']
+CONCLUSION_PATTERNS = ['总结', '结论', '综上', '因此可以', '最终', '建议']
+DETAIL_INDICATORS = [
+    '具体', '详细', '例如', '比如', '包括', '涉及', '方面', '层面',
+    '方法', '步骤', '流程', '机制', '策略', '方案', '实现', '技术'
+]
+DEPTH_INDICATORS = [
+    '权衡', '对比', '优缺点', '风险', '挑战', '限制', '影响', '后果',
+    '替代方案', '最佳实践', '经验', '教训', '原则', '标准'
+]
+CLARITY_INDICATORS = ['明确', '清楚', '显然', '可以看出', '表明', '说明', '证明']
+PROFESSIONAL_TERMS = [
+    '系统', '架构', '设计', '实现', '优化', '性能', '安全', '可维护',
+    '扩展', '集成', '接口', '模块', '组件', '服务', '框架', '模式'
+]
+# 全部词表合并为一个匹配器，每条推理只扫描一遍；词表中没有大小写字母，无需先转小写
+REASONING_INDICATOR_MATCHER = KeywordMatcher(
+    ANALYSIS_PATTERNS + CAUSAL_PATTERNS + REASONING_CONNECTORS + CONCLUSION_PATTERNS +
+    DETAIL_INDICATORS + DEPTH_INDICATORS + CLARITY_INDICATORS + PROFESSIONAL_TERMS
+)
+
+# 离线批量模式的最大轮数：首轮收集全部请求，之后的轮次处理补充生成和失败重试
+MAX_BATCH_ROUNDS = 6
+
+
+def _count_found(keywords: List[str], found: Set[str]) -> int:
+    """词表中出现过的词数"""
+    return sum(1 for keyword in keywords if keyword in found)
 
 
 class TrainingDataGenerator:
     """智能训练数据生成系统主类"""
     
-    def __init__(self, repo_path: str, output_dir: str, claude_api_key: str):
+    def __init__(self, repo_path: str, output_dir: str, claude_api_key: str,
+                 max_concurrency: int = 4, use_cache: bool = True,
+                 cache_dir: Optional[str] = None, cache_ttl_hours: float = 168,
+                 cache_max_mb: int = 512, incremental: bool = False,
+                 exclude_patterns: Optional[List[str]] = None,
+                 max_file_size: int = DEFAULT_MAX_FILE_SIZE, analyzer_workers: int = 1,
+                 design_context_tokens: int = DEFAULT_CONTEXT_TOKENS, max_retries: int = 5,
+                 requests_per_minute: Optional[float] = None,
+                 tokens_per_minute: Optional[float] = None, resume: bool = False,
+                 streaming_pipeline: bool = False, concurrent_stages: bool = True,
+                 dedup_against: Optional[List[str]] = None, dedup_threshold: float = DEFAULT_THRESHOLD,
+                 max_snippet_bytes: int = DEFAULT_MAX_SNIPPET_BYTES, qa_batch_size: int = 1,
+                 batch_mode: bool = False, api_base_url: Optional[str] = None,
+                 batch_poll_interval: float = DEFAULT_POLL_INTERVAL, stream_responses: bool = True,
+                 structured_output: bool = False, default_ignores: bool = True):
         self.repo_path = Path(repo_path)
         self.output_dir = Path(output_dir)
         self.output_dir.mkdir(parents=True, exist_ok=True)
         
+        # 响应缓存：相同提示词的请求直接复用上次结果
+        self.response_cache = None
+        if use_cache:
+            self.response_cache = ResponseCache(
+                cache_dir or str(self.output_dir / '.cache'),
+                ttl_seconds=cache_ttl_hours * 3600,
+                max_size_bytes=cache_max_mb * 1024 * 1024
+            )
+        
         # 初始化核心组件
         print("初始化Claude AI增强的训练数据生成系统...")
-        self.analyzer = CodeAnalyzer(str(self.repo_path))
-        self.qa_generator = QAGenerator(claude_api_key)
-        self.design_generator = DesignGenerator(claude_api_key)
+        self.incremental = incremental
+        self.analyzer = CodeAnalyzer(str(self.repo_path),
+                                     manifest_path=str(self.output_dir / 'analysis_manifest.json'),
+                                     ignore_rules=IgnoreRules(exclude_patterns, max_file_size,
+                                                              ignored_dirs=None if default_ignores else ()),
+                                     workers=analyzer_workers,
+                                     symbol_index_path=str(self.output_dir / 'symbol_index.sqlite'))
+        # 两个生成器共用同一个ClaudeClient：缓存、重试、限流额度、全局并发上限和调用统计都在这里
+        self.claude = ClaudeClient(create_anthropic_client(claude_api_key, api_base_url), DEFAULT_MODEL,
+                                   cache=self.response_cache,
+                                   retry_policy=RetryPolicy(max_retries),
+                                   rate_limiter=RateLimiter(requests_per_minute, tokens_per_minute),
+                                   max_concurrency=max_concurrency)
+        # 离线批量模式：问答和设计方案的请求收集后作为Message Batches任务提交
+        self.batch_mode = batch_mode
+        if batch_mode:
+            self.claude.batch_queue = BatchQueue(self.claude.client, batch_poll_interval)
+        # 流式读取响应：JSON闭合即停止读取，格式错误时中止请求
+        self.claude.stream_responses = stream_responses
+        # 结构化输出：问答对和设计方案的格式声明为工具输入模式，直接读取工具参数
+        self.claude.structured_output = structured_output
+        self.qa_generator = QAGenerator(claude_api_key, max_concurrency=max_concurrency,
+                                        claude=self.claude)
+        # 问答提示词中的函数和类源码按分析时记录的字节区间从映射文件中读取
+        self.snippets = SnippetService(str(self.repo_path))
+        self.qa_generator.snippets = self.snippets
+        self.qa_generator.max_snippet_bytes = max_snippet_bytes
+        self.qa_generator.qa_batch_size = max(qa_batch_size, 1)
+        self.design_generator = DesignGenerator(claude_api_key, claude=self.claude,
+                                                context_tokens=design_context_tokens)
         self.quality_assessor = ReasoningQualityAssessor()
         
         self.analysis_result = None
+        self.resume = resume
+        self.journal: Optional[RunJournal] = None
+        # 批量模式需要完整的分析结果来收集全部请求，不与流式流水线同时使用
+        self.streaming_pipeline = streaming_pipeline and not batch_mode
+        if streaming_pipeline and batch_mode:
+            print(" 离线批量模式下不使用流式流水线")
+        self.analysis_stream: Optional[AnalysisStream] = None
+        self.concurrent_stages = concurrent_stages
+        self.scheduler: Optional[StageScheduler] = None
+        # 问答对去重：除本次运行内的近似重复外，还与这些历史数据集去重
+        self.dedup_against = list(dedup_against or [])
+        self.dedup_threshold = dedup_threshold
+        # 本次运行的产物：各阶段结果和派生指标只加载、计算一次，统一在生成综合报告前写盘
+        self.artifacts = ArtifactStore()
         
     def run_full_pipeline(self, num_qa_pairs: int = 50, num_design_proposals: int = 10,
                          custom_requirements: Optional[List[str]] = None) -> Dict[str, str]:
@@ -40,34 +150,107 @@ class TrainingDataGenerator:
         print(f" 分析仓库: {self.repo_path}")
         print(f" 目标: {num_qa_pairs} 个问答对, {num_design_proposals} 个设计方案")
         
-        # Step 1: 代码仓分析
-        print("\n Step 1: 分析代码仓库...")
-        self.analysis_result = self._analyze_repository()
-        
-        # Step 2: 生成问答对
-        print(f"\n❓ Step 2: 生成 {num_qa_pairs} 个问答对...")
-        qa_output_path = self._generate_qa_pairs(num_qa_pairs)
-        
-        # Step 3: 生成设计方案
-        print(f"\n Step 3: 生成 {num_design_proposals} 个设计方案...")
-        design_output_path = self._generate_design_proposals(num_design_proposals, custom_requirements)
+        # 运行日志：每个生成结果完成即落盘，--resume时跳过已完成的工作项
+        self.journal = RunJournal(str(self.output_dir / 'journal'), resume=self.resume, params={
+            'num_qa_pairs': num_qa_pairs,
+            'num_design_proposals': num_design_proposals,
+            'requirements': custom_requirements or [],
+            'incremental': self.incremental,
+            'streaming_pipeline': self.streaming_pipeline
+        })
+        self.qa_generator.journal = self.journal
+        self.qa_generator.rng.seed(self.journal.seed)
+        self.qa_generator.dedup_index = self._build_dedup_index()
+        self.design_generator.journal = self.journal
+        
+        self.scheduler = StageScheduler()
+        self.artifacts = ArtifactStore()
+        design_stage = ('design_generation', self._generate_design_proposals,
+                        (num_design_proposals, custom_requirements))
+        design_title = f"\n Step 3: 生成 {num_design_proposals} 个设计方案..."
+        
+        if self.streaming_pipeline and not self._may_generate_incrementally():
+            # Step 1+2: 分析与问答生成重叠执行，文件分析完成即开始为其中的函数和类发请求
+            print(f"\n Step 1+2: 流式分析代码仓库并生成 {num_qa_pairs} 个问答对...")
+            qa_output_path = self.scheduler.run('analysis_and_qa', self._analyze_and_generate_qa_pairs,
+                                                num_qa_pairs)
+            
+            # Step 3: 设计方案依赖完整的分析结果，在流式阶段结束后生成
+            print(design_title)
+            design_output_path = self.scheduler.run(*design_stage[:2], *design_stage[2])
+        else:
+            # Step 1: 代码仓分析
+            print("\n Step 1: 分析代码仓库...")
+            self.analysis_result = self.scheduler.run('analysis', self._analyze_repository)
+            
+            # Step 2: 生成问答对
+            if self.incremental and self._can_generate_incrementally():
+                qa_title = "\n❓ Step 2: 增量更新问答对..."
+                qa_stage = ('qa_generation', self._generate_incremental_qa_pairs, ())
+            else:
+                qa_title = f"\n❓ Step 2: 生成 {num_qa_pairs} 个问答对..."
+                qa_stage = ('qa_generation', self._generate_qa_pairs, (num_qa_pairs,))
+            
+            # Step 3: 生成设计方案
+            if self.batch_mode:
+                print(qa_title)
+                print(f"{design_title.strip()} (离线批量模式，与Step 2一起按轮提交)")
+                qa_output_path, design_output_path = self._run_batch_rounds([qa_stage, design_stage])
+            elif self.concurrent_stages:
+                # 两个阶段都只读取分析结果，互不依赖；并发执行时共用全局并发数和限流额度
+                print(qa_title)
+                print(f"{design_title.strip()} (与Step 2并发执行)")
+                qa_output_path, design_output_path = self.scheduler.run_concurrently([qa_stage, design_stage])
+            else:
+                print(qa_title)
+                qa_output_path = self.scheduler.run(*qa_stage[:2], *qa_stage[2])
+                print(design_title)
+                design_output_path = self.scheduler.run(*design_stage[:2], *design_stage[2])
         
         # Step 4: 生成训练数据集
         print("\n Step 4: 创建标准训练数据集...")
-        dataset_path = self._create_training_dataset(qa_output_path, design_output_path)
+        dataset_path = self.scheduler.run('training_dataset', self._create_training_dataset,
+                                          qa_output_path, design_output_path)
         
         # Step 5: 推理质量评估
         print("\n🔍 Step 5: 评估推理质量...")
-        quality_report_path = self._assess_reasoning_quality(qa_output_path, design_output_path)
+        quality_report_path = self.scheduler.run('quality_assessment', self._assess_reasoning_quality,
+                                                 qa_output_path, design_output_path)
         
         # Step 6: 生成综合报告
         print("\nStep 6: 生成综合分析报告...")
+        self.artifacts.persist()
         report_path = self._generate_comprehensive_report()
-        
+        prompt_cache = self.claude.stats()['requests']['prompt_cache']
+        print(f"    提示词缓存: 写入 {prompt_cache['cache_write_tokens']} tokens, "
+              f"读取 {prompt_cache['cache_read_tokens']} tokens, "
+              f"未缓存输入 {prompt_cache['uncached_input_tokens']} tokens, "
+              f"不同前缀 {prompt_cache['distinct_prefixes']} 个")
+        qa_generation = self.qa_generator.generation_stats()
+        print(f"    问答生成: {qa_generation['qa_generated']} 个QA, {qa_generation['api_calls']} 次调用, "
+              f"每个QA {qa_generation['calls_per_qa']} 次调用、{qa_generation['tokens_per_qa']} tokens "
+              f"(批量大小 {qa_generation['qa_batch_size']}, 单独重试 {qa_generation['individual_retries']} 个)")
+        streaming = self.claude.stats()['requests']['streaming']
+        if streaming['streamed'] or streaming['aborts']:
+            print(f"    流式响应: {streaming['streamed']} 个, 提前结束读取 {streaming['early_stops']} 个, "
+                  f"格式错误中止 {streaming['aborts']} 个 (中止前输出 {streaming['aborted_output_tokens']} tokens)")
+        parsing = self.claude.stats()['requests']['output_parsing']
+        print(f"    响应解析({parsing['mode']}): {parsing['responses']} 个响应, 解析失败 {parsing['parse_failures']} 个 "
+              f"({parsing['parse_failure_rate']:.1%}), 浪费输出 {parsing['wasted_output_tokens']} tokens, "
+              f"工具声明 {parsing['tool_definition_tokens']} tokens")
+        if self.batch_mode:
+            batches = self.claude.stats()['requests']['message_batches']
+            print(f"    批量任务: {batches['batches']} 个, 提交 {batches['submitted']} 个请求 "
+                  f"(其中重新提交 {batches['resubmitted']} 个), 成功 {batches['succeeded']} 个, "
+                  f"失败 {batches['errored']} 个, 等待 {batches['wait_seconds']} 秒")
+        
+        self.journal.complete()
+        self.journal.close()
+        self.snippets.close()
         print("\n训练数据生成完成!")
         
         return {
-            'analysis_report': str(self.output_dir / 'analysis_report.json'),
+            'analysis_report': str(self.output_dir / 'analysis_report.jsonl'),
             'qa_pairs': qa_output_path,
             'design_proposals': design_output_path,
             'training_dataset': dataset_path,
@@ -75,37 +258,155 @@ class TrainingDataGenerator:
             'comprehensive_report': report_path
         }
     
+    def _run_batch_rounds(self, stages: List[Stage]) -> List[Any]:
+        """
+        离线批量模式：生成阶段按轮执行，直到某一轮不再产生新请求，返回最后一轮的结果
+
+        每轮用已取回的结果生成，没有结果的请求登记到批量队列；本轮结束后把登记的请求作为一个
+        批量任务提交并等待完成。各轮从相同的随机种子和去重索引开始，抽样和提示词与第一轮一致
+        """
+        for round_number in range(1, MAX_BATCH_ROUNDS + 1):
+            self.qa_generator.rng.seed(self.journal.seed)
+            self.qa_generator.dedup_index = self._build_dedup_index()
+            for name in ('qa_pairs', 'design_proposals'):
+                self.artifacts.invalidate(name)
+            
+            if self.concurrent_stages:
+                outputs = self.scheduler.run_concurrently(stages)
+            else:
+                outputs = [self.scheduler.run(name, func, *args) for name, func, args in stages]
+            
+            deferred = self.claude.deferred_requests()
+            if not deferred:
+                return outputs
+            if round_number == MAX_BATCH_ROUNDS:
+                print(f" 已达到最大轮数 {MAX_BATCH_ROUNDS}，{deferred} 个请求不再提交")
+                return outputs
+            print(f"\n 批量模式第{round_number}轮: 收集到 {deferred} 个请求，提交批量任务...")
+            self.claude.flush_batch()
+        return outputs
+    
     def _analyze_repository(self) -> Dict[str, Any]:
         """分析代码仓"""
-        analysis_result = self.analyzer.analyze_repository()
-        
-        # 保存分析结果
-        output_path = self.output_dir / 'analysis_report.json'
-        with open(output_path, 'w', encoding='utf-8') as f:
-            json.dump(analysis_result, f, indent=2, ensure_ascii=False)
-            
+        # 分析结果边分析边写入JSONL报告，文件级结果按需从报告中读取
+        output_path = self.output_dir / 'analysis_report.jsonl'
+        analysis_result = self.analyzer.analyze_repository(report_path=str(output_path))
+        self._print_analysis_summary(analysis_result)
+        return analysis_result
+    
+    def _print_analysis_summary(self, analysis_result: Dict[str, Any]):
+        """输出分析结果摘要"""
         print(f"    已分析 {analysis_result['repo_structure']['total_files']} 个文件")
         print(f"    目录深度: {analysis_result['repo_structure']['depth']}")
+        builtin = [d['path'] for d in analysis_result['repo_structure'].get('ignored_directories', [])
+                   if d['rule'] == 'builtin']
+        if builtin:
+            print(f"    按内置规则跳过的目录: {', '.join(builtin[:10])}{' ...' if len(builtin) > 10 else ''}")
         detected_patterns = [k for k, v in analysis_result['architecture_patterns'].items() if v]
         if detected_patterns:
             print(f"   🔍 检测到架构模式: {', '.join(detected_patterns)}")
-        
-        return analysis_result
+    
+    def _build_dedup_index(self) -> NearDuplicateIndex:
+        """创建问答对的近似重复索引，并载入历史数据集"""
+        index = NearDuplicateIndex(self.dedup_threshold)
+        for path in self.dedup_against:
+            texts = load_dataset_texts(path)
+            indexed = index.add_prior(texts)
+            print(f"   🔁 载入历史数据集 {path}: {len(texts)} 条问答，收录 {indexed} 条用于去重")
+        return index
     
     def _generate_qa_pairs(self, num_pairs: int) -> str:
         """生成问答对"""
         qa_pairs = self.qa_generator.generate_qa_pairs(self.analysis_result, num_pairs)
-        
-        # 保存问答对
+        return self._save_qa_pairs(qa_pairs)
+    
+    def _analyze_and_generate_qa_pairs(self, num_pairs: int) -> str:
+        """流式流水线：后台线程逐个文件分析并写入报告，问答生成从有界队列中读取结果"""
+        output_path = self.output_dir / 'analysis_report.jsonl'
+        self.analysis_stream = AnalysisStream(self.analyzer, report_path=str(output_path))
+        self.analysis_result, qa_pairs = self.qa_generator.generate_qa_pairs_streaming(
+            self.analysis_stream, num_pairs)
+        self._print_analysis_summary(self.analysis_result)
+        print(f"    流式统计: {dict(self.analysis_stream.stats(), **self.qa_generator.streaming_stats)}")
+        return self._save_qa_pairs(qa_pairs)
+    
+    def _save_qa_pairs(self, qa_pairs: List[Dict[str, Any]]) -> str:
+        """保存问答对并输出统计"""
         output_path = str(self.output_dir / 'qa_pairs.json')
-        self.qa_generator.save_qa_pairs(qa_pairs, output_path)
+        self.artifacts.put('qa_pairs', qa_pairs, output_path, self.qa_generator.save_qa_pairs)
         
         # 生成统计信息
         stats = self._generate_qa_statistics(qa_pairs)
         print(f"    生成统计: {stats}")
+        dedup_stats = self.qa_generator.dedup_index.stats()
+        print(f"    去重统计: 检查 {dedup_stats['checked']} 个, 本次运行内重复 {dedup_stats['within_run_duplicates']} 个, "
+              f"与历史数据集重复 {dedup_stats['prior_run_duplicates']} 个, 去重比例 {dedup_stats['dedup_ratio']:.1%}")
         
         return output_path
     
+    def _may_generate_incrementally(self) -> bool:
+        """分析开始前判断能否增量生成：增量模式下存在上次的分析清单和问答对文件"""
+        manifest = self.analyzer.manifest
+        return (self.incremental and manifest is not None and manifest.existed and
+                (self.output_dir / 'qa_pairs.json').exists())
+    
+    def _can_generate_incrementally(self) -> bool:
+        """存在上次的分析清单和问答对文件时才能增量生成"""
+        incremental = self.analysis_result.get('incremental', {})
+        return bool(incremental.get('has_baseline')) and (self.output_dir / 'qa_pairs.json').exists()
+    
+    def _generate_incremental_qa_pairs(self) -> str:
+        """只为源码变化的函数和类重新生成问答对，并合并到已有的qa_pairs.json"""
+        incremental = self.analysis_result['incremental']
+        changed_symbols = {(s['file'], s['kind'], s['name']) for s in incremental['changed_symbols']}
+        stale_files = set(incremental['removed_files'])
+        
+        # 剔除变化或已删除元素对应的旧问答对
+        existing_pairs = self._load_qa_pairs()
+        kept_pairs = [qa for qa in existing_pairs
+                      if not self._is_stale_qa(qa, changed_symbols, stale_files)]
+        
+        # 只保留变化的函数和类，其余生成器（业务规则、架构）不重新运行
+        changed_analysis = dict(self.analysis_result)
+        changed_analysis['file_analysis'] = {}
+        # 符号索引覆盖整个仓库，对变化子集抽样时不能使用
+        changed_analysis.pop('symbol_index', None)
+        for file_path in incremental['changed_files']:
+            analysis = self.analysis_result['file_analysis'].get(file_path)
+            if not analysis:
+                continue
+            changed_analysis['file_analysis'][file_path] = dict(
+                analysis,
+                functions=[f for f in analysis.get('functions', [])
+                           if (file_path, 'function', f.get('name')) in changed_symbols],
+                classes=[c for c in analysis.get('classes', [])
+                         if (file_path, 'class', c.get('name')) in changed_symbols]
+            )
+        
+        new_pairs = self.qa_generator.generate_qa_for_elements(changed_analysis) if changed_symbols else []
+        qa_pairs = kept_pairs + new_pairs
+        
+        output_path = str(self.output_dir / 'qa_pairs.json')
+        self.artifacts.put('qa_pairs', qa_pairs, output_path, self.qa_generator.save_qa_pairs)
+        
+        print(f"    保留 {len(kept_pairs)} 个, 移除 {len(existing_pairs) - len(kept_pairs)} 个, "
+              f"新生成 {len(new_pairs)} 个问答对")
+        print(f"    生成统计: {self._generate_qa_statistics(qa_pairs)}")
+        
+        return output_path
+    
+    def _is_stale_qa(self, qa: Dict[str, Any], changed_symbols: set, stale_files: set) -> bool:
+        """判断问答对是否对应已变化或已删除的代码元素"""
+        metadata = qa.get('metadata', {})
+        source_file = metadata.get('source_file', '')
+        if source_file in stale_files:
+            return True
+        if metadata.get('function_name'):
+            return (source_file, 'function', metadata['function_name']) in changed_symbols
+        if metadata.get('class_name'):
+            return (source_file, 'class', metadata['class_name']) in changed_symbols
+        return False
+    
     def _generate_design_proposals(self, num_proposals: int, 
                                  custom_requirements: Optional[List[str]] = None) -> str:
         """生成设计方案"""
@@ -129,7 +430,8 @@ class TrainingDataGenerator:
         
         # 保存设计方案
         output_path = str(self.output_dir / 'design_proposals.json')
-        self.design_generator.save_design_proposals(proposals, output_path)
+        self.artifacts.put('design_proposals', proposals, output_path,
+                           self.design_generator.save_design_proposals)
         
         # 生成统计信息
         stats = self._generate_design_statistics(proposals)
@@ -139,19 +441,12 @@ class TrainingDataGenerator:
     
     def _assess_reasoning_quality(self, qa_path: str, design_path: str) -> str:
         """评估推理质量"""
-        # 加载数据
-        with open(qa_path, 'r', encoding='utf-8') as f:
-            qa_pairs = json.load(f)
-            
-        with open(design_path, 'r', encoding='utf-8') as f:
-            design_proposals = json.load(f)
-        
-        # 生成质量报告
-        quality_report = self.quality_assessor.generate_quality_report(qa_pairs, design_proposals)
+        # 质量报告只计算一次，综合报告中的推理质量得分直接复用
+        quality_report = self._quality_report(qa_path, design_path)
         
-        # 保存质量报告
         output_path = str(self.output_dir / 'reasoning_quality_report.json')
-        self.quality_assessor.save_quality_report(quality_report, output_path)
+        self.artifacts.put('quality_report', quality_report, output_path,
+                           self.quality_assessor.save_quality_report)
         
         # 打印质量摘要
         overall_summary = quality_report['overall_summary']
@@ -168,68 +463,67 @@ class TrainingDataGenerator:
         
         return output_path
     
+    def _quality_report(self, qa_path: Optional[str] = None, design_path: Optional[str] = None) -> Dict[str, Any]:
+        """推理质量报告，每次运行只计算一次"""
+        return self.artifacts.memoize('quality_report', lambda: self.quality_assessor.generate_quality_report(
+            self._load_qa_pairs(qa_path), self._load_design_proposals(design_path)))
+    
     def _create_training_dataset(self, qa_path: str, design_path: str) -> str:
         """创建标准格式的训练数据集"""
-        # 加载问答对和设计方案
-        with open(qa_path, 'r', encoding='utf-8') as f:
-            qa_pairs = json.load(f)
-            
-        with open(design_path, 'r', encoding='utf-8') as f:
-            design_proposals = json.load(f)
+        qa_pairs = self._load_qa_pairs(qa_path)
+        design_proposals = self._load_design_proposals(design_path)
         
-        # 转换为标准训练格式
-        training_data = []
-        
-        # 处理问答对
-        for qa in qa_pairs:
-            training_item = {
-                'input': qa['question'],
-                'output': qa['answer'],
-                'context': qa['code_context'],
-                'reasoning': qa['reasoning_trace'],
-                'metadata': qa['metadata'],
-                'type': 'qa_pair'
-            }
-            training_data.append(training_item)
-        
-        # 处理设计方案
-        for proposal in design_proposals:
-            training_item = {
-                'input': f"请为以下需求设计解决方案: {proposal['title']}",
-                'output': proposal['description'],
-                'context': proposal.get('design_approach', ''),
-                'reasoning': proposal['reasoning_trace'],
-                'metadata': proposal['metadata'],
-                'type': 'design_proposal'
-            }
-            training_data.append(training_item)
-        
-        # 保存训练数据集
+        # 转换为标准训练格式，逐条写出，不在内存中另存一份
         output_path = str(self.output_dir / 'training_dataset.jsonl')
         with open(output_path, 'w', encoding='utf-8') as f:
-            for item in training_data:
-                f.write(json.dumps(item, ensure_ascii=False) + '\n')
-        
-        print(f"   📦 创建了包含 {len(training_data)} 条记录的训练数据集")
+            # 处理问答对
+            for qa in qa_pairs:
+                training_item = {
+                    'input': qa['question'],
+                    'output': qa['answer'],
+                    'context': qa['code_context'],
+                    'reasoning': qa['reasoning_trace'],
+                    'metadata': qa['metadata'],
+                    'type': 'qa_pair'
+                }
+                f.write(json.dumps(training_item, ensure_ascii=False) + '\n')
+            
+            # 处理设计方案
+            for proposal in design_proposals:
+                training_item = {
+                    'input': f"请为以下需求设计解决方案: {proposal['title']}",
+                    'output': proposal['description'],
+                    'context': proposal.get('design_approach', ''),
+                    'reasoning': proposal['reasoning_trace'],
+                    'metadata': proposal['metadata'],
+                    'type': 'design_proposal'
+                }
+                f.write(json.dumps(training_item, ensure_ascii=False) + '\n')
+        
+        print(f"   📦 创建了包含 {len(qa_pairs) + len(design_proposals)} 条记录的训练数据集")
         return output_path
     
     def _generate_comprehensive_report(self) -> str:
         """生成综合报告"""
+        qa_pairs = self._load_qa_pairs()
+        design_proposals = self._load_design_proposals()
         report = {
             'project_overview': {
                 'repository_path': str(self.repo_path),
                 'analysis_timestamp': datetime.now().isoformat(),
                 'total_files': self.analysis_result['repo_structure']['total_files'],
                 'file_types': self.analysis_result['repo_structure']['file_types'],
+                'ignored_directories': self.analysis_result['repo_structure'].get('ignored_directories', []),
                 'architecture_patterns': self.analysis_result['architecture_patterns'],
                 'technologies': self._detect_technologies()
             },
             'data_generation_summary': {
-                'qa_pairs_generated': len(self._load_qa_pairs()),
-                'design_proposals_generated': len(self._load_design_proposals()),
-                'total_training_items': len(self._load_qa_pairs()) + len(self._load_design_proposals())
+                'qa_pairs_generated': len(qa_pairs),
+                'design_proposals_generated': len(design_proposals),
+                'total_training_items': len(qa_pairs) + len(design_proposals)
             },
             'quality_metrics': self._calculate_quality_metrics(),
+            'runtime_statistics': self._collect_runtime_statistics(),
             'recommendations': self._generate_recommendations(),
             'next_steps': [
                 "使用生成的training_dataset.jsonl训练您的模型",
@@ -245,6 +539,24 @@ class TrainingDataGenerator:
             
         return output_path
     
+    def _collect_runtime_statistics(self) -> Dict[str, Any]:
+        """收集运行时统计信息"""
+        context_budget = self.design_generator.context_budget
+        return {
+            'response_cache': self.response_cache.stats() if self.response_cache else {'enabled': False},
+            'requests': self.claude.stats()['requests'],
+            'journal': self.journal.stats() if self.journal else {},
+            'design_context': context_budget.stats() if context_budget else {},
+            'streaming_pipeline': ({**self.analysis_stream.stats(), **self.qa_generator.streaming_stats}
+                                   if self.analysis_stream else {'enabled': False}),
+            'stage_timings': self.scheduler.timings() if self.scheduler else {},
+            'qa_generation': self.qa_generator.generation_stats(),
+            'deduplication': self.qa_generator.dedup_index.stats(),
+            'snippets': self.snippets.stats(),
+            'symbol_index': self.analyzer.symbol_index.stats() if self.analyzer.symbol_index else {},
+            'artifacts': self.artifacts.stats()
+        }
+    
     def _generate_qa_statistics(self, qa_pairs: List[Dict[str, Any]]) -> Dict[str, int]:
         """生成问答对统计信息"""
         stats = {}
@@ -430,10 +742,7 @@ class TrainingDataGenerator:
         
         # 计算总的代码元素数量
         total_files = self.analysis_result['repo_structure']['total_files']
-        total_functions = sum(len(analysis.get('functions', [])) 
-                            for analysis in self.analysis_result['file_analysis'].values())
-        total_classes = sum(len(analysis.get('classes', [])) 
-                          for analysis in self.analysis_result['file_analysis'].values())
+        total_functions, total_classes = self._symbol_totals()
         
         # 计算覆盖率
         file_coverage = len(covered_files) / max(total_files, 1)
@@ -445,13 +754,26 @@ class TrainingDataGenerator:
         
         return round(min(coverage_score, 1.0), 3)
     
+    def _symbol_totals(self) -> Tuple[int, int]:
+        """分析结果中的函数总数和类总数，有符号索引时直接查询，否则一次遍历同时统计；结果缓存"""
+        def count() -> Tuple[int, int]:
+            symbol_index = self.analysis_result.get('symbol_index')
+            if symbol_index is not None:
+                return symbol_index.count_symbols('function'), symbol_index.count_symbols('class')
+            functions = classes = 0
+            for analysis in self.analysis_result['file_analysis'].values():
+                functions += len(analysis.get('functions', []))
+                classes += len(analysis.get('classes', []))
+            return functions, classes
+        return self.artifacts.memoize('symbol_totals', count)
+    
     def _calculate_enhanced_reasoning_quality_score(self, qa_pairs: List[Dict], design_proposals: List[Dict]) -> float:
         """使用新的质量评估器计算推理质量得分"""
         if not qa_pairs and not design_proposals:
             return 0.0
         
-        # 使用新的质量评估器
-        quality_report = self.quality_assessor.generate_quality_report(qa_pairs, design_proposals)
+        # 复用Step 5已生成的质量报告
+        quality_report = self._quality_report()
         combined_score = quality_report['overall_summary']['combined_score']
         
         # 返回0-1范围的分数
@@ -490,17 +812,19 @@ class TrainingDataGenerator:
         if not reasoning or not content:
             return 0.0
             
+        found = REASONING_INDICATOR_MATCHER.found(reasoning)
+        
         # 1. 结构完整性评估 (40%)
-        structure_score = self._evaluate_logical_structure(reasoning)
+        structure_score = self._evaluate_logical_structure(reasoning, found)
         
         # 2. 内容相关性评估 (30%)
         relevance_score = self._evaluate_content_relevance(reasoning, content, title)
         
         # 3. 深度和详细程度评估 (20%)
-        depth_score = self._evaluate_reasoning_depth(reasoning, content_type)
+        depth_score = self._evaluate_reasoning_depth(reasoning, content_type, found)
         
         # 4. 语言质量评估 (10%)
-        language_score = self._evaluate_language_quality(reasoning)
+        language_score = self._evaluate_language_quality(reasoning, found)
         
         # 优化权重分配，提高相关性和语言质量权重
         total_score = (
@@ -512,32 +836,24 @@ class TrainingDataGenerator:
         
         return min(total_score, 1.0)
     
-    def _evaluate_logical_structure(self, reasoning: str) -> float:
+    def _evaluate_logical_structure(self, reasoning: str, found: Set[str]) -> float:
         """评估推理的逻辑结构"""
         score = 0.0
-        reasoning_lower = reasoning.lower()
         
         # 检查是否有明确的分析步骤
-        analysis_patterns = [
-            '分析', '首先', '其次', '然后', '最后', '综合',
-            '1)', '2)', '3)', '步骤', '过程', '阶段'
-        ]
-        has_steps = sum(1 for pattern in analysis_patterns if pattern in reasoning_lower)
+        has_steps = _count_found(ANALYSIS_PATTERNS, found)
         step_score = min(has_steps / 2, 1.0)  # 至少2个步骤标识得满分
         
         # 检查因果逻辑
-        causal_patterns = ['因为', '所以', '因此', '由于', '导致', '结果', '原因']
-        has_causality = sum(1 for pattern in causal_patterns if pattern in reasoning_lower)
+        has_causality = _count_found(CAUSAL_PATTERNS, found)
         causal_score = min(has_causality / 1, 1.0)  # 至少1个因果关系得满分
         
         # 检查推理连接词
-        reasoning_connectors = ['考虑到', '基于', '根据', '鉴于', '综合考虑', '权衡']
-        has_connectors = sum(1 for connector in reasoning_connectors if connector in reasoning_lower)
+        has_connectors = _count_found(REASONING_CONNECTORS, found)
         connector_score = min(has_connectors / 1, 1.0)  # 至少1个连接词得满分
         
         # 检查结论性语句
-        conclusion_patterns = ['总结', '结论', '综上', '因此可以', '最终', '建议']
-        has_conclusion = any(pattern in reasoning_lower for pattern in conclusion_patterns)
+        has_conclusion = _count_found(CONCLUSION_PATTERNS, found) > 0
         conclusion_score = 1.0 if has_conclusion else 0.5
         
         # 加权计算结构得分 - 优化后的权重分配
@@ -570,7 +886,7 @@ class TrainingDataGenerator:
         
         return min(relevance_score, 1.0)
     
-    def _evaluate_reasoning_depth(self, reasoning: str, content_type: str) -> float:
+    def _evaluate_reasoning_depth(self, reasoning: str, content_type: str, found: Set[str]) -> float:
         """评估推理的深度和详细程度"""
         # 长度评估（合理范围内）
         min_length = 100 if content_type == 'qa' else 200  # 降低最低长度要求
@@ -586,19 +902,11 @@ class TrainingDataGenerator:
             length_score = max(0.8, optimal_length / length)
         
         # 细节丰富度评估
-        detail_indicators = [
-            '具体', '详细', '例如', '比如', '包括', '涉及', '方面', '层面',
-            '方法', '步骤', '流程', '机制', '策略', '方案', '实现', '技术'
-        ]
-        detail_count = sum(1 for indicator in detail_indicators if indicator in reasoning)
+        detail_count = _count_found(DETAIL_INDICATORS, found)
         detail_score = min(detail_count / 3, 1.0)  # 至少3个细节指标得满分
         
         # 深度思考指标
-        depth_indicators = [
-            '权衡', '对比', '优缺点', '风险', '挑战', '限制', '影响', '后果',
-            '替代方案', '最佳实践', '经验', '教训', '原则', '标准'
-        ]
-        depth_count = sum(1 for indicator in depth_indicators if indicator in reasoning)
+        depth_count = _count_found(DEPTH_INDICATORS, found)
         depth_thinking_score = min(depth_count / 2, 1.0)  # 至少2个深度思考指标得满分
         
         # 综合深度得分
@@ -606,7 +914,7 @@ class TrainingDataGenerator:
         
         return depth_score
     
-    def _evaluate_language_quality(self, reasoning: str) -> float:
+    def _evaluate_language_quality(self, reasoning: str, found: Set[str]) -> float:
         """评估语言质量和表达清晰度"""
         if not reasoning:
             return 0.0
@@ -631,16 +939,11 @@ class TrainingDataGenerator:
             length_quality = max(0.5, 60 / avg_length)
         
         # 表达清晰度（检查是否有清晰的表达）
-        clarity_indicators = ['明确', '清楚', '显然', '可以看出', '表明', '说明', '证明']
-        clarity_count = sum(1 for indicator in clarity_indicators if indicator in reasoning)
+        clarity_count = _count_found(CLARITY_INDICATORS, found)
         clarity_score = min(clarity_count / 2, 1.0)
         
         # 专业性评估
-        professional_terms = [
-            '系统', '架构', '设计', '实现', '优化', '性能', '安全', '可维护',
-            '扩展', '集成', '接口', '模块', '组件', '服务', '框架', '模式'
-        ]
-        professional_count = sum(1 for term in professional_terms if term in reasoning)
+        professional_count = _count_found(PROFESSIONAL_TERMS, found)
         professional_score = min(professional_count / 3, 1.0)
         
         # 综合语言质量得分
@@ -706,40 +1009,46 @@ class TrainingDataGenerator:
         """评估技术栈一致性"""
         # 获取实际技术栈
         actual_tech_stack = set()
-        for file_analysis in self.analysis_result['file_analysis'].values():
-            imports = file_analysis.get('imports', [])
-            for imp in imports:
-                # 提取主要技术栈
-                if 'flask' in imp.lower():
-                    actual_tech_stack.add('Flask')
-                elif 'jwt' in imp.lower():
-                    actual_tech_stack.add('JWT')  
-                elif 'redis' in imp.lower():
-                    actual_tech_stack.add('Redis')
-                elif 'hashlib' in imp.lower():
-                    actual_tech_stack.add('bcrypt/hashlib')
+        for imp in self._imported_modules():
+            # 提取主要技术栈
+            if 'flask' in imp.lower():
+                actual_tech_stack.add('Flask')
+            elif 'jwt' in imp.lower():
+                actual_tech_stack.add('JWT')  
+            elif 'redis' in imp.lower():
+                actual_tech_stack.add('Redis')
+            elif 'hashlib' in imp.lower():
+                actual_tech_stack.add('bcrypt/hashlib')
         
         # 评估问答对中技术栈的匹配度
         matched_items = 0
         total_items = len(qa_pairs) + len(design_proposals)
+        tech_matcher = KeywordMatcher(tech.lower() for tech in actual_tech_stack)
         
         for qa in qa_pairs:
             answer = qa.get('answer', '').lower()
             context = qa.get('code_context', '').lower()
             
             # 检查是否包含实际技术栈相关内容
-            if any(tech.lower() in answer or tech.lower() in context 
-                   for tech in actual_tech_stack):
+            if tech_matcher.any_found(answer) or tech_matcher.any_found(context):
                 matched_items += 1
         
         # 评估设计方案中技术栈的匹配度
         for proposal in design_proposals:
             description = proposal.get('description', '').lower()
-            if any(tech.lower() in description for tech in actual_tech_stack):
+            if tech_matcher.any_found(description):
                 matched_items += 1
                 
         return matched_items / max(total_items, 1)
     
+    def _imported_modules(self) -> List[str]:
+        """仓库中导入过的模块，有符号索引时直接查询"""
+        symbol_index = self.analysis_result.get('symbol_index')
+        if symbol_index is not None:
+            return symbol_index.imported_modules()
+        return [imp for file_analysis in self.analysis_result['file_analysis'].values()
+                for imp in file_analysis.get('imports', [])]
+    
     def _evaluate_business_relevance(self, qa_pairs: List[Dict], design_proposals: List[Dict]) -> float:
         """评估业务场景相关性"""
         # 获取实际业务关键词
@@ -750,6 +1059,7 @@ class TrainingDataGenerator:
         
         matched_items = 0
         total_items = len(qa_pairs) + len(design_proposals)
+        keyword_matcher = KeywordMatcher(keyword.lower() for keyword in actual_keywords)
         
         # 评估问答对业务相关性
         for qa in qa_pairs:
@@ -757,8 +1067,7 @@ class TrainingDataGenerator:
             reasoning = qa.get('reasoning_trace', '').lower()
             
             # 检查是否包含实际业务关键词
-            keywords_found = sum(1 for keyword in actual_keywords 
-                               if keyword.lower() in context or keyword.lower() in reasoning)
+            keywords_found = len(keyword_matcher.found(context) | keyword_matcher.found(reasoning))
             if keywords_found >= 2:  # 至少包含2个业务关键词
                 matched_items += 1
         
@@ -767,8 +1076,7 @@ class TrainingDataGenerator:
             description = proposal.get('description', '').lower()
             reasoning = proposal.get('reasoning_trace', '').lower()
             
-            keywords_found = sum(1 for keyword in actual_keywords
-                               if keyword.lower() in description or keyword.lower() in reasoning)
+            keywords_found = len(keyword_matcher.found(description) | keyword_matcher.found(reasoning))
             if keywords_found >= 2:
                 matched_items += 1
                 
@@ -777,12 +1085,22 @@ class TrainingDataGenerator:
     def _evaluate_code_context_accuracy(self, qa_pairs: List[Dict]) -> float:
         """评估代码上下文准确性"""
         accurate_items = 0
+        symbol_index = self.analysis_result.get('symbol_index')
         
         for qa in qa_pairs:
             metadata = qa.get('metadata', {})
             source_file = metadata.get('source_file', '')
             function_name = metadata.get('function_name', '')
             
+            # 有符号索引时直接查询文件和函数是否存在，不读取文件分析结果
+            if symbol_index is not None:
+                if source_file and symbol_index.has_file(source_file):
+                    if not function_name:
+                        accurate_items += 0.5
+                    elif symbol_index.has_symbol(source_file, 'function', function_name):
+                        accurate_items += 1
+                continue
+            
             # 检查引用的文件是否存在于分析结果中
             if source_file and source_file in self.analysis_result['file_analysis']:
                 file_analysis = self.analysis_result['file_analysis'][source_file]
@@ -807,33 +1125,27 @@ class TrainingDataGenerator:
         # 获取实际架构模式
         actual_patterns = [k for k, v in self.analysis_result['architecture_patterns'].items() if v]
         
+        pattern_matcher = KeywordMatcher(pattern.lower() for pattern in actual_patterns)
+        
         consistent_proposals = 0
         for proposal in design_proposals:
             description = proposal.get('description', '').lower()
             reasoning = proposal.get('reasoning_trace', '').lower()
             
             # 检查设计方案是否符合现有架构模式
-            if any(pattern.lower() in description or pattern.lower() in reasoning 
-                   for pattern in actual_patterns):
+            if pattern_matcher.any_found(description) or pattern_matcher.any_found(reasoning):
                 consistent_proposals += 1
             
         return consistent_proposals / len(design_proposals)
     
-    def _load_qa_pairs(self) -> List[Dict[str, Any]]:
-        """加载问答对"""
-        try:
-            with open(self.output_dir / 'qa_pairs.json', 'r', encoding='utf-8') as f:
-                return json.load(f)
-        except:
-            return []
-    
-    def _load_design_proposals(self) -> List[Dict[str, Any]]:
-        """加载设计方案"""
-        try:
-            with open(self.output_dir / 'design_proposals.json', 'r', encoding='utf-8') as f:
-                return json.load(f)
-        except:
-            return []
+    def _load_qa_pairs(self, path: Optional[str] = None) -> List[Dict[str, Any]]:
+        """加载问答对，本次运行已生成时直接使用内存中的结果"""
+        return self.artifacts.load_json('qa_pairs', path or str(self.output_dir / 'qa_pairs.json'), [])
+    
+    def _load_design_proposals(self, path: Optional[str] = None) -> List[Dict[str, Any]]:
+        """加载设计方案，本次运行已生成时直接使用内存中的结果"""
+        return self.artifacts.load_json('design_proposals',
+                                        path or str(self.output_dir / 'design_proposals.json'), [])
 
 
 def main():
@@ -845,11 +1157,63 @@ def main():
     parser.add_argument('--num-design-proposals', type=int, default=10, help='生成设计方案数量 (默认: 10)')
     parser.add_argument('--claude-api-key', help='Claude API密钥 (也可使用环境变量 ANTHROPIC_API_KEY)')
     parser.add_argument('--requirements', nargs='+', help='自定义需求列表')
+    parser.add_argument('--max-concurrency', type=int, default=4, help='Claude请求的最大并发数 (默认: 4)')
+    parser.add_argument('--cache-dir', help='响应缓存目录 (默认: <output-dir>/.cache)')
+    parser.add_argument('--no-cache', action='store_true', help='禁用响应缓存')
+    parser.add_argument('--cache-ttl-hours', type=float, default=168, help='缓存有效期，单位小时 (默认: 168)')
+    parser.add_argument('--cache-max-mb', type=int, default=512, help='缓存容量上限，单位MB (默认: 512)')
+    parser.add_argument('--incremental', action='store_true',
+                        help='增量模式: 只为源码变化的函数和类重新生成问答对并合并到已有结果')
+    parser.add_argument('--exclude', nargs='+', default=[],
+                        help='额外排除的路径模式 (gitignore语法，如 "tests/" "*.min.js")')
+    parser.add_argument('--no-default-ignores', action='store_true',
+                        help='不使用内置的忽略目录列表 (.git、node_modules、__pycache__等)，只按.gitignore和--exclude排除')
+    parser.add_argument('--max-file-size', type=int, default=DEFAULT_MAX_FILE_SIZE // 1024,
+                        help=f'单文件大小上限，单位KB，超过则不分析 (默认: {DEFAULT_MAX_FILE_SIZE // 1024})')
+    parser.add_argument('--analyzer-workers', type=int, default=1,
+                        help='代码分析使用的进程数，大型仓库可设为CPU核数 (默认: 1)')
+    parser.add_argument('--design-context-tokens', type=int, default=DEFAULT_CONTEXT_TOKENS,
+                        help=f'设计方案提示词中仓库上下文的token预算 (默认: {DEFAULT_CONTEXT_TOKENS})')
+    parser.add_argument('--resume', action='store_true',
+                        help='从上次中断处续跑: 复用运行日志中已完成的问答对和设计方案，只生成剩余部分')
+    parser.add_argument('--max-retries', type=int, default=5,
+                        help='遇到限流(429)、超时或服务端错误时的最大重试次数 (默认: 5)')
+    parser.add_argument('--requests-per-minute', type=float,
+                        help='每分钟请求数上限，按账户限额设置 (默认: 不限制)')
+    parser.add_argument('--tokens-per-minute', type=float,
+                        help='每分钟token数上限（输入+输出），按账户限额设置 (默认: 不限制)')
+    parser.add_argument('--streaming-pipeline', action='store_true',
+                        help='流式流水线: 文件分析完成即开始为其中的函数和类生成问答对，分析与请求重叠执行')
+    parser.add_argument('--sequential-stages', action='store_true',
+                        help='依次执行问答生成和设计方案生成（默认两者并发执行，共用 --max-concurrency 和限流额度）')
+    parser.add_argument('--dedup-against', nargs='+', default=[],
+                        help='历史数据集（qa_pairs.json、training_dataset.jsonl或其所在的输出目录），'
+                             '本次生成的问答对与之近似重复时剔除')
+    parser.add_argument('--dedup-threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help=f'近似重复的Jaccard相似度阈值 (默认: {DEFAULT_THRESHOLD})')
+    parser.add_argument('--max-snippet-bytes', type=int, default=DEFAULT_MAX_SNIPPET_BYTES,
+                        help=f'问答提示词中单个函数或类源码的字节上限，0表示不附源码 (默认: {DEFAULT_MAX_SNIPPET_BYTES})')
+    parser.add_argument('--qa-batch-size', type=int, default=1,
+                        help='每次Claude请求生成问答对的函数个数，同一文件的函数优先合并；'
+                             '批量结果中无效的函数单独重试 (默认: 1，即逐个请求)')
+    parser.add_argument('--batch-mode', action='store_true',
+                        help='离线批量模式: 收集问答和设计方案的全部请求，作为Message Batches任务提交并轮询结果，'
+                             '不追求交互延迟，适合夜间任务')
+    parser.add_argument('--batch-poll-interval', type=float, default=DEFAULT_POLL_INTERVAL,
+                        help=f'批量模式下轮询任务状态的间隔，单位秒 (默认: {DEFAULT_POLL_INTERVAL:g})')
+    parser.add_argument('--api-base-url',
+                        help='Claude API地址，例如本地替身服务 http://127.0.0.1:8765 (默认: Anthropic官方地址)')
+    parser.add_argument('--no-stream-responses', action='store_true',
+                        help='等待完整响应后再解析JSON（默认以流式读取响应，JSON闭合即停止读取，'
+                             '响应明显不是预期格式时立即中止请求）')
+    parser.add_argument('--structured-output', action='store_true',
+                        help='结构化输出: 把问答对和设计方案的JSON格式声明为工具输入模式并强制调用，'
+                             '直接读取工具参数，消除JSON解析失败（此模式不使用流式读取）')
     
     args = parser.parse_args()
     
     # 获取Claude API密钥
-    claude_api_key = claude_api_key
+    claude_api_key = args.claude_api_key or os.environ.get('ANTHROPIC_API_KEY')
     if not claude_api_key:
         print(" 错误: 需要提供Claude API密钥")
         print(" 方法1: --claude-api-key 'your-api-key'")
@@ -860,13 +1224,43 @@ def main():
     if not Path(args.repo_path).exists():
         print(f" 错误: 仓库路径不存在: {args.repo_path}")
         return
+    for dataset_path in args.dedup_against:
+        if not Path(dataset_path).exists():
+            print(f" 错误: 去重数据集不存在: {dataset_path}")
+            return
     
     try:
         # 创建生成器
         generator = TrainingDataGenerator(
             repo_path=args.repo_path,
             output_dir=args.output_dir,
-            claude_api_key=claude_api_key
+            claude_api_key=claude_api_key,
+            max_concurrency=args.max_concurrency,
+            use_cache=not args.no_cache,
+            cache_dir=args.cache_dir,
+            cache_ttl_hours=args.cache_ttl_hours,
+            cache_max_mb=args.cache_max_mb,
+            incremental=args.incremental,
+            exclude_patterns=args.exclude,
+            max_file_size=args.max_file_size * 1024,
+            analyzer_workers=args.analyzer_workers,
+            design_context_tokens=args.design_context_tokens,
+            max_retries=args.max_retries,
+            requests_per_minute=args.requests_per_minute,
+            tokens_per_minute=args.tokens_per_minute,
+            resume=args.resume,
+            streaming_pipeline=args.streaming_pipeline,
+            concurrent_stages=not args.sequential_stages,
+            dedup_against=args.dedup_against,
+            dedup_threshold=args.dedup_threshold,
+            max_snippet_bytes=args.max_snippet_bytes,
+            qa_batch_size=args.qa_batch_size,
+            batch_mode=args.batch_mode,
+            api_base_url=args.api_base_url,
+            batch_poll_interval=args.batch_poll_interval,
+            stream_responses=not args.no_stream_responses,
+            structured_output=args.structured_output,
+            default_ignores=not args.no_default_ignores
         )
         
         # 运行生成流水线
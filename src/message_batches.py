@@ -0,0 +1,151 @@
+"""
+离线批量队列 - 收集生成阶段的请求，作为一个Message Batches任务提交，轮询完成后按请求取回结果
+"""
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+
+# 单个批量任务的请求数上限（Message Batches API的限制），超出时拆为多个任务
+MAX_BATCH_REQUESTS = 100000
+
+# 轮询批量任务状态的默认间隔，单位秒
+DEFAULT_POLL_INTERVAL = 30.0
+
+# 批量任务中失败的请求最多提交的次数；请求本身无效的不再重试
+MAX_BATCH_ATTEMPTS = 3
+_NON_RETRYABLE_ERRORS = {'invalid_request_error', 'authentication_error', 'permission_error', 'not_found_error'}
+
+
+class DeferredRequest(Exception):
+    """请求已加入批量队列，结果在批量任务完成后的下一轮生成中取得"""
+
+
+class BatchRequestError(Exception):
+    """请求在批量任务中失败（errored/canceled/expired），且不再重试"""
+
+
+class BatchQueue:
+    """
+    批量模式的请求队列，以缓存键作为custom_id
+
+    生成阶段的每次调用先查询已取回的结果，没有结果时登记请求并抛出DeferredRequest；
+    一轮生成结束后由flush把登记的请求作为批量任务提交并等待完成，下一轮相同的调用即可取得结果
+    """
+
+    def __init__(self, client: Any, poll_interval: float = DEFAULT_POLL_INTERVAL):
+        self.client = client
+        self.poll_interval = max(float(poll_interval), 0.0)
+        self._lock = threading.Lock()
+        # custom_id → (请求参数, 调用方标签)
+        self._pending: Dict[str, Tuple[Dict[str, Any], Optional[str]]] = {}
+        # custom_id → (结果类型, 响应消息或错误说明)
+        self._results: Dict[str, Tuple[str, Any]] = {}
+        self._attempts: Dict[str, int] = {}
+        self._counters = {'batches': 0, 'submitted': 0, 'succeeded': 0, 'errored': 0, 'canceled': 0,
+                          'expired': 0, 'resubmitted': 0, 'polls': 0, 'wait_seconds': 0.0}
+
+    def result(self, custom_id: str) -> Optional[Any]:
+        """
+        取得请求的响应消息；尚未提交或失败后可以重新提交时返回None，
+        失败且不再重试时抛出BatchRequestError
+        """
+        with self._lock:
+            outcome = self._results.get(custom_id)
+            if outcome is None:
+                return None
+            kind, value = outcome
+            if kind == 'succeeded':
+                return value
+            if self._attempts.get(custom_id, 0) < MAX_BATCH_ATTEMPTS and value.get('retryable', True):
+                return None
+        raise BatchRequestError(f"批量请求{kind}: {value.get('message', '')}")
+
+    def defer(self, custom_id: str, request: Dict[str, Any], label: Optional[str] = None):
+        """登记请求并抛出DeferredRequest，同一请求在一轮中只登记一次"""
+        with self._lock:
+            self._pending.setdefault(custom_id, (request, label))
+        raise DeferredRequest("请求已加入批量队列")
+
+    def pending_count(self) -> int:
+        with self._lock:
+            return len(self._pending)
+
+    def flush(self) -> List[Tuple[Optional[str], Any]]:
+        """
+        把登记的请求作为批量任务提交，轮询直到处理结束并取回结果；
+        返回本次成功请求的 (调用方标签, 响应消息) 列表，供调用方统计用量
+        """
+        with self._lock:
+            pending = list(self._pending.items())
+            self._pending.clear()
+            for custom_id, _ in pending:
+                if custom_id in self._results:
+                    self._counters['resubmitted'] += 1
+                self._attempts[custom_id] = self._attempts.get(custom_id, 0) + 1
+
+        succeeded = []
+        for start in range(0, len(pending), MAX_BATCH_REQUESTS):
+            chunk = pending[start:start + MAX_BATCH_REQUESTS]
+            labels = {custom_id: label for custom_id, (_, label) in chunk}
+            for custom_id, message in self._run_batch(chunk):
+                succeeded.append((labels[custom_id], message))
+        return succeeded
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            counters = dict(self._counters)
+        counters['wait_seconds'] = round(counters['wait_seconds'], 3)
+        return counters
+
+    def _run_batch(self, chunk: List[Tuple[str, Tuple[Dict[str, Any], Optional[str]]]]) -> List[Tuple[str, Any]]:
+        """提交一个批量任务并等待完成，返回成功请求的 (custom_id, 响应消息) 列表"""
+        batches = self.client.messages.batches
+        batch = batches.create(requests=[{'custom_id': custom_id, 'params': request}
+                                         for custom_id, (request, _) in chunk])
+        print(f" 已提交批量任务 {batch.id}，共 {len(chunk)} 个请求")
+        with self._lock:
+            self._counters['batches'] += 1
+            self._counters['submitted'] += len(chunk)
+
+        started = time.monotonic()
+        while batch.processing_status != 'ended':
+            time.sleep(self.poll_interval)
+            batch = batches.retrieve(batch.id)
+            counts = batch.request_counts
+            print(f" 批量任务 {batch.id}: {batch.processing_status}, 处理中 {counts.processing}, "
+                  f"成功 {counts.succeeded}, 失败 {counts.errored}")
+            with self._lock:
+                self._counters['polls'] += 1
+        with self._lock:
+            self._counters['wait_seconds'] += time.monotonic() - started
+
+        succeeded = []
+        returned = set()
+        for entry in batches.results(batch.id):
+            result = entry.result
+            returned.add(entry.custom_id)
+            if result.type == 'succeeded':
+                outcome = ('succeeded', result.message)
+                succeeded.append((entry.custom_id, result.message))
+            else:
+                outcome = (result.type, _error_detail(result))
+            with self._lock:
+                self._results[entry.custom_id] = outcome
+                self._counters[result.type if result.type in self._counters else 'errored'] += 1
+
+        # 结果文件中缺少的请求按失败处理，下一轮重新提交
+        with self._lock:
+            for custom_id, _ in chunk:
+                if custom_id not in returned:
+                    self._results[custom_id] = ('errored', {'message': '批量结果中缺少该请求', 'retryable': True})
+                    self._counters['errored'] += 1
+        return succeeded
+
+
+def _error_detail(result: Any) -> Dict[str, Any]:
+    """失败结果的说明；请求本身无效时标记为不可重试"""
+    error = getattr(getattr(result, 'error', None), 'error', None)
+    error_type = getattr(error, 'type', None) or result.type
+    return {'message': getattr(error, 'message', None) or error_type,
+            'retryable': error_type not in _NON_RETRYABLE_ERRORS}
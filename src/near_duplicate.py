@@ -0,0 +1,243 @@
+"""
+近似重复检测 - MinHash签名配合LSH分桶，每条文本只与同桶的候选比较，去重耗时随条目数线性增长
+"""
+import json
+import re
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+DEFAULT_THRESHOLD = 0.8
+DEFAULT_NUM_PERM = 128
+# 按字符切分的shingle长度，中英文混排的文本都适用
+DEFAULT_SHINGLE_SIZE = 5
+
+# 选择LSH参数时漏判的权重：误判的候选还要经过签名比对，漏判则直接放过重复条目
+FALSE_NEGATIVE_WEIGHT = 0.9
+
+_MASK64 = (1 << 64) - 1
+_SHINGLE_BASE = 1000003
+_MIX_MULTIPLIER = 0x9E3779B97F4A7C15
+_BIN_SHIFT = 57
+_VALUE_MASK = (1 << _BIN_SHIFT) - 1
+_EMPTY = _MASK64
+_WHITESPACE = re.compile(r'\s+')
+
+
+def qa_text(qa: Dict[str, Any]) -> str:
+    """参与去重的文本：问题、答案和推理过程"""
+    return '\n'.join(str(qa.get(key) or '') for key in ('question', 'answer', 'reasoning_trace'))
+
+
+def load_dataset_texts(path: str) -> List[str]:
+    """
+    读取历史数据集中的问答文本
+
+    支持qa_pairs.json（问答对列表）和training_dataset.jsonl（只取qa_pair类型的记录）；
+    传入目录时读取其中的qa_pairs.json，不存在时读取training_dataset.jsonl
+    """
+    dataset_path = Path(path)
+    if dataset_path.is_dir():
+        dataset_path = next((dataset_path / name for name in ('qa_pairs.json', 'training_dataset.jsonl')
+                             if (dataset_path / name).exists()), dataset_path / 'qa_pairs.json')
+
+    if dataset_path.suffix == '.jsonl':
+        texts = []
+        with open(dataset_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                item = json.loads(line)
+                if item.get('type', 'qa_pair') == 'qa_pair':
+                    texts.append(qa_text({'question': item.get('input'), 'answer': item.get('output'),
+                                          'reasoning_trace': item.get('reasoning')}))
+        return texts
+
+    with open(dataset_path, 'r', encoding='utf-8') as f:
+        return [qa_text(qa) for qa in json.load(f)]
+
+
+def lsh_parameters(threshold: float, num_perm: int) -> Tuple[int, int]:
+    """选择 (分桶数, 每桶行数)，使相似度低于阈值的误判与高于阈值的漏判加权面积最小"""
+    steps = 200
+    best = None
+    for rows in range(1, num_perm + 1):
+        bands = num_perm // rows
+        false_positive = sum(1 - (1 - ((i + 0.5) / steps * threshold) ** rows) ** bands
+                             for i in range(steps)) * threshold / steps
+        false_negative = sum((1 - (threshold + (i + 0.5) / steps * (1 - threshold)) ** rows) ** bands
+                             for i in range(steps)) * (1 - threshold) / steps
+        error = (1 - FALSE_NEGATIVE_WEIGHT) * false_positive + FALSE_NEGATIVE_WEIGHT * false_negative
+        if best is None or error < best[0]:
+            best = (error, bands, rows)
+    return best[1], best[2]
+
+
+class NearDuplicateIndex:
+    """
+    近似重复索引：问答文本按字符shingle计算MinHash签名，签名分段放入LSH桶
+
+    签名采用单次哈希的分箱MinHash（每个shingle只哈希一次，按高位分到num_perm个箱中取最小值，
+    空箱向右借用相邻箱的值），计算量与文本长度成正比；新文本只与同一桶中的候选比较签名，
+    估计的Jaccard相似度达到阈值即视为近似重复。安装了numpy时向量化计算签名，
+    未安装时逐个shingle计算，两者的签名完全一致
+    """
+
+    def __init__(self, threshold: float = DEFAULT_THRESHOLD, num_perm: int = DEFAULT_NUM_PERM,
+                 shingle_size: int = DEFAULT_SHINGLE_SIZE):
+        if not 0 < threshold <= 1:
+            raise ValueError(f"相似度阈值必须在(0, 1]之间: {threshold}")
+        if num_perm < 1 or num_perm > (1 << (64 - _BIN_SHIFT)):
+            raise ValueError(f"签名长度必须在1到{1 << (64 - _BIN_SHIFT)}之间: {num_perm}")
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.shingle_size = max(int(shingle_size), 1)
+        self.bands, self.rows = lsh_parameters(threshold, num_perm)
+        self._signatures: List[Sequence[int]] = []
+        self._prior: List[bool] = []
+        self._tables: List[Dict[int, Any]] = [{} for _ in range(self.bands)]
+        self._counters = {'prior_items': 0, 'prior_duplicates': 0, 'checked': 0,
+                          'within_run_duplicates': 0, 'prior_run_duplicates': 0, 'candidate_checks': 0}
+
+    def add(self, text: str, prior: bool = False) -> bool:
+        """文本与已收录的条目都不近似时收录并返回True；是近似重复时不收录，返回False"""
+        if prior:
+            self._counters['prior_items'] += 1
+        else:
+            self._counters['checked'] += 1
+
+        signature = self.signature(text)
+        if signature is None:
+            return True
+
+        keys = self._band_keys(signature)
+        duplicate_of = self._find_duplicate(signature, keys)
+        if duplicate_of is not None:
+            if prior:
+                self._counters['prior_duplicates'] += 1
+            elif self._prior[duplicate_of]:
+                self._counters['prior_run_duplicates'] += 1
+            else:
+                self._counters['within_run_duplicates'] += 1
+            return False
+
+        item_id = len(self._signatures)
+        self._signatures.append(signature)
+        self._prior.append(prior)
+        for table, key in zip(self._tables, keys):
+            bucket = table.get(key)
+            if bucket is None:
+                table[key] = item_id
+            elif isinstance(bucket, list):
+                bucket.append(item_id)
+            else:
+                table[key] = [bucket, item_id]
+        return True
+
+    def add_prior(self, texts: Iterable[str]) -> int:
+        """收录历史数据集的文本，本次生成的条目与之近似时被剔除；返回收录的条数"""
+        return sum(1 for text in texts if self.add(text, prior=True))
+
+    def signature(self, text: str) -> Optional[Sequence[int]]:
+        """文本的MinHash签名（num_perm个32位整数），空文本返回None"""
+        normalized = _WHITESPACE.sub(' ', text.casefold()).strip()
+        if not normalized:
+            return None
+        if np is not None:
+            return self._signature_numpy(normalized)
+        return self._signature_python(normalized)
+
+    def similarity(self, first: Sequence[int], second: Sequence[int]) -> float:
+        """由签名估计的Jaccard相似度"""
+        if np is not None:
+            return float(np.count_nonzero(first == second)) / self.num_perm
+        return sum(1 for a, b in zip(first, second) if a == b) / self.num_perm
+
+    def stats(self) -> Dict[str, Any]:
+        """去重统计：去重比例为本次剔除的条目占检查条目的比例"""
+        counters = self._counters
+        duplicates = counters['within_run_duplicates'] + counters['prior_run_duplicates']
+        checked = counters['checked']
+        return {
+            'threshold': self.threshold,
+            'num_perm': self.num_perm,
+            'bands': self.bands,
+            'rows': self.rows,
+            'indexed_items': len(self._signatures),
+            **counters,
+            'dedup_ratio': round(duplicates / checked, 4) if checked else 0.0,
+            'within_run_ratio': round(counters['within_run_duplicates'] / checked, 4) if checked else 0.0,
+            'prior_run_ratio': round(counters['prior_run_duplicates'] / checked, 4) if checked else 0.0
+        }
+
+    def _find_duplicate(self, signature: Sequence[int], keys: List[int]) -> Optional[int]:
+        """在同桶的候选中查找相似度达到阈值的条目"""
+        seen = set()
+        for table, key in zip(self._tables, keys):
+            bucket = table.get(key)
+            if bucket is None:
+                continue
+            for item_id in (bucket if isinstance(bucket, list) else (bucket,)):
+                if item_id in seen:
+                    continue
+                seen.add(item_id)
+                self._counters['candidate_checks'] += 1
+                if self.similarity(signature, self._signatures[item_id]) >= self.threshold:
+                    return item_id
+        return None
+
+    def _band_keys(self, signature: Sequence[int]) -> List[int]:
+        rows = self.rows
+        if np is not None:
+            return [hash(signature[band * rows:(band + 1) * rows].tobytes()) for band in range(self.bands)]
+        return [hash(tuple(signature[band * rows:(band + 1) * rows])) for band in range(self.bands)]
+
+    def _signature_numpy(self, text: str):
+        codes = np.frombuffer(text.encode('utf-32-le'), dtype=np.uint32).astype(np.uint64)
+        width = min(self.shingle_size, len(codes))
+        count = len(codes) - width + 1
+        hashes = np.zeros(count, dtype=np.uint64)
+        for offset in range(width):
+            hashes = hashes * np.uint64(_SHINGLE_BASE) + codes[offset:offset + count]
+        hashes ^= hashes >> np.uint64(31)
+        hashes *= np.uint64(_MIX_MULTIPLIER)
+        hashes ^= hashes >> np.uint64(29)
+
+        bins = np.full(self.num_perm, _EMPTY, dtype=np.uint64)
+        np.minimum.at(bins, (hashes >> np.uint64(_BIN_SHIFT)).astype(np.intp) % self.num_perm,
+                      hashes & np.uint64(_VALUE_MASK))
+
+        # 空箱借用右侧（循环）最近的非空箱，距离编码在高位，使借用值不会与原值相同
+        filled = np.flatnonzero(bins != _EMPTY)
+        positions = np.arange(self.num_perm)
+        extended = np.concatenate((filled, filled + self.num_perm))
+        source = extended[np.searchsorted(extended, positions)]
+        values = bins[source % self.num_perm] + ((source - positions).astype(np.uint64) << np.uint64(_BIN_SHIFT))
+        return ((values ^ (values >> np.uint64(32))) & np.uint64(0xFFFFFFFF)).astype(np.uint32)
+
+    def _signature_python(self, text: str) -> List[int]:
+        codes = [ord(char) for char in text]
+        width = min(self.shingle_size, len(codes))
+        bins = [_EMPTY] * self.num_perm
+        for start in range(len(codes) - width + 1):
+            value = 0
+            for code in codes[start:start + width]:
+                value = (value * _SHINGLE_BASE + code) & _MASK64
+            value ^= value >> 31
+            value = (value * _MIX_MULTIPLIER) & _MASK64
+            value ^= value >> 29
+            index = (value >> _BIN_SHIFT) % self.num_perm
+            bins[index] = min(bins[index], value & _VALUE_MASK)
+
+        filled = [index for index, value in enumerate(bins) if value != _EMPTY]
+        signature = []
+        for position in range(self.num_perm):
+            source = next((index for index in filled if index >= position), filled[0] + self.num_perm)
+            value = bins[source % self.num_perm] + ((source - position) << _BIN_SHIFT)
+            signature.append((value ^ (value >> 32)) & 0xFFFFFFFF)
+        return signature
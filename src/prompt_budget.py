@@ -0,0 +1,136 @@
+"""
+提示词上下文预算 - 按重要性对类和函数排序，并在token预算内打包进设计方案提示词
+"""
+import math
+from collections import Counter
+from typing import Any, Dict, List, Mapping, Tuple
+
+from code_analyzer import BUSINESS_KEYWORD_MATCHER
+
+
+# 设计方案提示词中仓库上下文（目录、核心类、主要功能）的默认token预算
+DEFAULT_CONTEXT_TOKENS = 4000
+
+# 各部分占预算的比例，前一部分用不完的额度顺延给后一部分
+SECTION_SHARES = (('directories', 0.2), ('classes', 0.4), ('functions', 0.4))
+
+
+def estimate_tokens(text: str) -> int:
+    """粗略估算token数：中日韩字符约1个token，其余字符约4个1个token"""
+    cjk = sum(1 for char in text if '\u2e80' <= char <= '\u9fff' or '\uac00' <= char <= '\ud7af')
+    return cjk + math.ceil((len(text) - cjk) / 4)
+
+
+class PromptContextBudget:
+    """仓库上下文的排序结果，每次运行构建一次，供所有设计方案提示词复用"""
+
+    def __init__(self, code_analysis: Dict[str, Any], max_tokens: int = DEFAULT_CONTEXT_TOKENS):
+        self.max_tokens = max_tokens
+        directories = code_analysis.get('repo_structure', {}).get('directories', [])
+        # 浅层目录更能体现整体结构，优先列出
+        self.directories = sorted(directories, key=lambda d: (d.replace('\\', '/').count('/'), d))
+        self.classes, self.functions = rank_symbols(code_analysis.get('file_analysis', {}))
+        self._sections = None
+        self._included: Dict[str, int] = {}
+
+    def sections(self) -> Dict[str, str]:
+        """返回按预算打包后的 目录/核心类/主要功能 文本"""
+        if self._sections is None:
+            self._sections = self._pack()
+        return self._sections
+
+    def stats(self) -> Dict[str, Any]:
+        """打包统计：各部分的总数、列出数和估算token数"""
+        sections = self.sections()
+        return {
+            'max_tokens': self.max_tokens,
+            'estimated_tokens': sum(estimate_tokens(text) for text in sections.values()),
+            **{f'{name}_total': len(self._items(name)) for name, _ in SECTION_SHARES},
+            **{f'{name}_included': self._included[name] for name, _ in SECTION_SHARES}
+        }
+
+    def _items(self, name: str) -> List[str]:
+        if name == 'directories':
+            return self.directories
+        return [symbol for symbol, _ in (self.classes if name == 'classes' else self.functions)]
+
+    def _pack(self) -> Dict[str, str]:
+        """按排序结果依次放入，直到用完各部分的预算"""
+        sections = {}
+        carry = 0
+        for name, share in SECTION_SHARES:
+            items = self._items(name)
+            budget = int(self.max_tokens * share) + carry
+            selected, used = [], 2
+            for item in items:
+                cost = estimate_tokens(repr(item)) + 1
+                if used + cost > budget:
+                    break
+                selected.append(item)
+                used += cost
+            carry = max(budget - used, 0)
+            self._included[name] = len(selected)
+
+            text = str(selected)
+            if len(selected) < len(items):
+                text += f"（共 {len(items)} 个，按重要性列出前 {len(selected)} 个）"
+            sections[name] = text
+        return sections
+
+
+def rank_symbols(file_analysis: Mapping[str, Dict[str, Any]]) -> Tuple[List[Tuple[str, float]], List[Tuple[str, float]]]:
+    """
+    按重要性对类和函数排序，返回 (类列表, 函数列表)，元素为 (名称, 得分)
+
+    得分综合三项：代码规模（行数）、被引用次数（import和继承）、名称和文档中的业务关键词；
+    同名符号合并取最高分，以私有前缀开头的符号降权
+    """
+    # 第一遍统计被引用次数，第二遍打分（file_analysis可能是流式报告，不整体载入内存）
+    fan_in: Counter = Counter()
+    for analysis in file_analysis.values():
+        for imported in analysis.get('imports', []):
+            fan_in[imported.rsplit('.', 1)[-1]] += 1
+        for class_info in analysis.get('classes', []):
+            for base in class_info.get('bases', []):
+                fan_in[str(base).rsplit('.', 1)[-1]] += 1
+
+    class_scores: Dict[str, float] = {}
+    function_scores: Dict[str, float] = {}
+    for analysis in file_analysis.values():
+        for class_info in analysis.get('classes', []):
+            size = _symbol_lines(class_info) or len(class_info.get('methods', [])) * 5
+            _keep_best(class_scores, class_info['name'], _score(class_info, size, fan_in))
+        for func_info in analysis.get('functions', []):
+            _keep_best(function_scores, func_info['name'],
+                       _score(func_info, _symbol_lines(func_info) or 1, fan_in))
+
+    def ordered(scores: Dict[str, float]) -> List[Tuple[str, float]]:
+        return sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+
+    return ordered(class_scores), ordered(function_scores)
+
+
+def _symbol_lines(symbol: Dict[str, Any]) -> int:
+    """符号的源码行数，旧的分析结果没有结束行时返回0"""
+    end_line = symbol.get('end_line_number')
+    if not end_line or not symbol.get('line_number'):
+        return 0
+    return end_line - symbol['line_number'] + 1
+
+
+def _score(symbol: Dict[str, Any], size: int, fan_in: Counter) -> float:
+    """单个符号的重要性得分"""
+    name = symbol.get('name', '')
+    text = f"{name} {symbol.get('docstring') or ''}".lower()
+    score = (math.log1p(size) +
+             2 * math.log1p(fan_in.get(name, 0)) +
+             0.5 * BUSINESS_KEYWORD_MATCHER.count_found(text) +
+             (0.5 if symbol.get('docstring') else 0))
+    if name.startswith('_'):
+        score *= 0.5
+    return score
+
+
+def _keep_best(scores: Dict[str, float], name: str, score: float):
+    if score > scores.get(name, float('-inf')):
+        scores[name] = score
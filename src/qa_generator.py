@@ -1,26 +1,176 @@
 """
 Claude集成的问答对生成器 - 基于代码分析生成高质量训练数据
 """
+import hashlib
 import json
 import random
-from typing import Dict, List, Any, Optional, Tuple
-try:
-    from anthropic import Anthropic
-    ANTHROPIC_AVAILABLE = True
-except ImportError:
-    ANTHROPIC_AVAILABLE = False
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, wait
+from pathlib import Path
+from typing import Dict, List, Any, Optional, Tuple, Callable, Mapping
+
+from claude_client import DEFAULT_MODEL, ClaudeClient, create_anthropic_client
+from json_stream import JSONStreamParser, MalformedResponse, extract_json_text
+from message_batches import DeferredRequest
+from near_duplicate import NearDuplicateIndex, qa_text
+from request_engine import ConcurrentRequestEngine
+from response_cache import ResponseCache
+from run_journal import RunJournal
+from snippet_service import DEFAULT_MAX_SNIPPET_BYTES, SnippetService
+from structured_output import OutputTool, object_schema, string_fields
+from streaming_pipeline import AnalysisStream, StreamSampler
+from symbol_index import SYMBOL_KINDS, SymbolIndex
+
+
+# 单个生成任务: (调用函数, 参数元组)
+GenerationTask = Tuple[Callable[..., Optional[Dict[str, Any]]], tuple]
+
+# 所有问答提示词共用的系统提示词：各类素材的推理质量要求和输出格式。
+# 内容逐字节不变，作为提示词缓存的前缀；随素材变化的内容只放在用户消息中
+QA_INSTRUCTIONS = """你是一位资深软件工程师、架构师和业务分析专家，负责基于代码仓库的信息生成高质量的问答对，用于训练AI模型理解代码、架构和业务逻辑。
+每个请求会给出一项素材（函数、类、业务规则或架构模式）和具体要求，请按该类素材的Reasoning Trace质量要求生成问答对。
+
+## 函数问答的Reasoning Trace质量要求：
+reasoning_trace必须遵循以下结构化推理框架：
+
+**阶段1：问题理解与分解**
+- 识别问题的核心要点
+- 分析问题的技术背景和业务背景
+- 确定需要考虑的关键因素
+
+**阶段2：技术分析**
+- 代码功能分析：具体做了什么
+- 设计模式识别：使用了哪些模式
+- 架构考量：在整体架构中的作用
+
+**阶段3：深度推理**
+- 因果关系分析：为什么这样设计
+- 假设验证：如果采用其他方案会如何
+- 权衡分析：优势与劣势的对比
+
+**阶段4：实践考虑**
+- 实际应用场景
+- 潜在问题和解决方案
+- 最佳实践建议
+
+**示例格式**：
+"1. 问题分析：[分析问题的核心要点和技术背景]
+2. 技术考察：[详细分析代码的功能、模式、架构]
+3. 深度推理：[解释设计原因、分析替代方案、评估优劣]
+4. 实践洞察：[应用场景、潜在问题、最佳实践]"
+
+## 类问答的Reasoning Trace质量要求：
+必须包含结构化的架构分析推理：
+
+**1. 设计意图分析**：解释该类的设计目的和在系统中的角色
+**2. 架构模式识别**：分析使用的设计模式和架构原则
+**3. 职责边界分析**：评估类的职责是否清晰，是否符合单一职责原则
+**4. 依赖关系分析**：分析类与其他组件的耦合关系
+**5. 扩展性评估**：评估类的可扩展性和可维护性
+**6. 最佳实践对比**：与业界最佳实践进行对比分析
+
+## 业务规则问答的Reasoning Trace质量要求：
+必须包含完整的业务分析推理：
+
+**1. 业务背景分析**：解释该业务规则的背景和目的
+**2. 规则逻辑分析**：详细分析规则的执行逻辑和条件
+**3. 业务价值评估**：评估该规则对业务的价值和重要性
+**4. 影响范围分析**：分析该规则对其他业务流程的影响
+**5. 异常情况考虑**：分析可能的异常情况和处理方式
+**6. 优化建议**：基于最佳实践提出改进建议
+
+## 架构问答的Reasoning Trace质量要求：
+必须包含系统性的架构分析推理：
+
+**1. 架构模式识别**：深入分析当前架构模式的特征和适用性
+**2. 设计原则评估**：评估架构是否符合SOLID、DRY、KISS等设计原则
+**3. 可扩展性分析**：分析架构的水平扩展和垂直扩展能力
+**4. 性能影响评估**：评估架构对系统性能的影响
+**5. 维护性考量**：分析架构的可维护性和技术债务风险
+**6. 演进策略**：提出架构演进和优化建议
+
+## 输出格式
+请严格按照以下JSON格式回复，不要添加任何其他内容:
+{
+    "question": "具体的问题（体现深度思考）",
+    "answer": "详细的答案（包含技术细节和实践经验）",
+    "reasoning_trace": "结构化的推理过程（遵循对应素材类型的推理框架）"
+}
+
+注意：reasoning_trace必须具有逻辑连贯性，体现专家级的技术洞察力。只返回JSON，不要包含解释文字或markdown格式。"""
+
+# 问答请求的系统提示词块
+QA_SYSTEM = (QA_INSTRUCTIONS,)
+
+# 批量函数问答追加的输出格式；第一块指令不变，与单个请求共用同一缓存前缀
+QA_BATCH_FORMAT = """## 批量输出格式
+请求中包含多个编号的函数时，不使用上面的单个对象格式，而是返回一个JSON数组，每个函数对应一个对象，id填写请求中该函数的编号:
+[
+    {
+        "id": "F1",
+        "question": "具体的问题（体现深度思考）",
+        "answer": "详细的答案（包含技术细节和实践经验）",
+        "reasoning_trace": "结构化的推理过程（遵循函数问答的推理框架）"
+    }
+]
+
+每个函数都必须生成且只对应一个对象，各函数的问答相互独立。只返回JSON数组，不要包含解释文字或markdown格式。"""
+
+QA_BATCH_SYSTEM = (QA_INSTRUCTIONS, QA_BATCH_FORMAT)
+
+# 问答对响应中的键：流式读取时出现其他键即中止请求，缺少任一键的对象无效
+QA_KEYS = ('question', 'answer', 'reasoning_trace')
+QA_BATCH_KEYS = ('id',) + QA_KEYS
+
+# 结构化输出模式下的输出工具。每个问答请求都按相同顺序声明这两个工具，只是强制调用的不同，
+# 单个和批量请求的提示词缓存前缀保持一致
+QA_TOOL = OutputTool('record_qa_pair', '记录生成的问答对', object_schema(string_fields(QA_KEYS)))
+QA_BATCH_TOOL = OutputTool(
+    'record_qa_pairs', '记录为每个编号的函数生成的问答对，id为函数编号',
+    object_schema({'qa_pairs': {'type': 'array', 'items': object_schema(string_fields(QA_BATCH_KEYS))}}),
+    wrapper='qa_pairs')
+QA_TOOLS = (QA_TOOL, QA_BATCH_TOOL)
+
+# 批量请求中每个函数预留的输出token数，以及单次请求的输出token上限
+BATCH_TOKENS_PER_FUNCTION = 1000
+MAX_BATCH_OUTPUT_TOKENS = 8192
 
 
 class QAGenerator:
     """Claude驱动的问答对生成器"""
     
-    def __init__(self, claude_api_key: str):
-        if not ANTHROPIC_AVAILABLE:
-            raise ImportError("需要安装anthropic包: pip install anthropic")
-        
-        self.client = Anthropic(api_key=claude_api_key)
-        self.model = "claude-3-5-sonnet-20241022"
+    def __init__(self, claude_api_key: str, max_concurrency: int = 4, client: Any = None,
+                 response_cache: Optional[ResponseCache] = None,
+                 claude: Optional[ClaudeClient] = None):
+        # 传入共享的ClaudeClient时，与其他生成器共用缓存、限流额度和调用统计
+        if claude is not None:
+            client = claude.client
+        elif client is None:
+            client = create_anthropic_client(claude_api_key)
+        
+        # client可替换为本地的假客户端，便于离线测试
+        self.client = client
+        self.model = claude.model if claude is not None else DEFAULT_MODEL
+        self.claude = claude or ClaudeClient(self.client, self.model, response_cache)
         self.question_templates = self._load_question_templates()
+        self.engine = ConcurrentRequestEngine(max_concurrency)
+        # 抽样和问题类型使用独立的随机数生成器，续跑时以相同种子重现同一计划
+        self.rng = random.Random()
+        # 设置运行日志后，每个生成结果完成即落盘，续跑时跳过已完成的元素
+        self.journal: Optional[RunJournal] = None
+        # 流式模式下的请求统计，由generate_qa_pairs_streaming填写
+        self.streaming_stats: Dict[str, Any] = {}
+        # 近似重复索引，可预先载入历史数据集，使本次生成的问答对也与之去重
+        self.dedup_index = NearDuplicateIndex()
+        # 设置后在函数和类的代码上下文中附上其源码，单个片段不超过max_snippet_bytes
+        self.snippets: Optional[SnippetService] = None
+        self.max_snippet_bytes = DEFAULT_MAX_SNIPPET_BYTES
+        # 大于1时每次请求为这么多个函数生成问答对，同一文件的函数优先合在一起
+        self.qa_batch_size = 1
+        self._counters_lock = threading.Lock()
+        self._counters = {'qa_generated': 0, 'batch_requests': 0, 'batched_functions': 0,
+                          'batched_qa': 0, 'individual_retries': 0}
         
     def _load_question_templates(self) -> Dict[str, List[str]]:
         """加载问题模板以确保多样性"""
@@ -65,103 +215,333 @@ class QAGenerator:
     def generate_qa_pairs(self, code_analysis: Dict[str, Any], num_pairs: int = 50) -> List[Dict[str, Any]]:
         """生成问答对"""
         print(f"使用Claude生成 {num_pairs} 个问答对...")
-        print(f"DEBUG: 开始执行generate_qa_pairs方法")
-        
-        qa_pairs = []
         
-        # 从不同代码元素生成问答对
-        generators = [
-            self._generate_function_qa,
-            self._generate_class_qa,
-            self._generate_business_rule_qa,
-            self._generate_architecture_qa,
+        # 从不同代码元素收集生成任务
+        collectors = [
+            ('_generate_function_qa', self._collect_function_tasks),
+            ('_generate_class_qa', self._collect_class_tasks),
+            ('_generate_business_rule_qa', self._collect_business_rule_tasks),
+            ('_generate_architecture_qa', self._collect_architecture_tasks),
         ]
-        print(f"DEBUG: 已定义 {len(generators)} 个生成器")
         
         # 每个生成器分配更多数量，确保总数足够
-        pairs_per_generator = max((num_pairs * 2) // len(generators), 2)
+        pairs_per_generator = max((num_pairs * 2) // len(collectors), 2)
         print(f"每个生成器目标: {pairs_per_generator} 个QA")
-        print(f"DEBUG: 计算完成，开始循环执行生成器")
         
-        for generator in generators:
+        task_groups = []
+        for name, collector in collectors:
             try:
-                pairs = generator(code_analysis, pairs_per_generator)
-                if pairs:
-                    qa_pairs.extend(pairs)
-                    print(f"{generator.__name__} 生成了 {len(pairs)} 个QA")
-                else:
-                    print(f"{generator.__name__} 没有生成任何QA")
+                task_groups.append((name, collector(code_analysis, pairs_per_generator)))
             except Exception as e:
-                print(f"生成器 {generator.__name__} 出错: {e}")
-                continue
+                print(f"生成器 {name} 出错: {e}")
+        
+        # 所有元素的请求统一扇出，结果按任务顺序返回以保证输出确定性
+        all_tasks = [task for _, tasks in task_groups for task in tasks]
+        results = self._execute(all_tasks)
+        
+        group_results = []
+        offset = 0
+        for name, tasks in task_groups:
+            group_results.append((name, results[offset:offset + len(tasks)]))
+            offset += len(tasks)
+        
+        return self._finalize_qa_pairs(code_analysis, group_results, num_pairs)
+    
+    def generate_qa_pairs_streaming(self, stream: AnalysisStream,
+                                    num_pairs: int = 50) -> Tuple[Dict[str, Any], List[Dict[str, Any]]]:
+        """
+        流式生成问答对：函数和类的请求在所在文件分析完成后立即发出，与后续文件的分析重叠执行
+
+        在途请求数达到上限时暂停读取分析队列，队列满后分析线程随之暂停（背压），
+        内存中只保留被选中元素所在文件的分析结果。返回 (完整分析结果, 问答对列表)
+        """
+        print(f"使用Claude流式生成 {num_pairs} 个问答对...")
+        
+        # 与generate_qa_pairs相同，函数、类、业务规则、架构四个生成器各分配 num_pairs*2/4
+        pairs_per_generator = max((num_pairs * 2) // 4, 2)
+        max_in_flight = self.engine.max_concurrency * 2
+        print(f"每个生成器目标: {pairs_per_generator} 个QA (在途请求上限: {max_in_flight})")
+        
+        # 每个Future的结果为单个问答对，批量请求的Future（标记为True）为问答对列表
+        futures: Dict[str, List[Tuple[Future, bool]]] = {'_generate_function_qa': [], '_generate_class_qa': []}
+        in_flight = set()
+        samplers = None
+        first_request = None
+        
+        try:
+            for file_path, analysis, size in stream:
+                if samplers is None:
+                    samplers = {key: StreamSampler(pairs_per_generator, stream.planned_bytes, self.rng)
+                                for key in ('functions', 'classes')}
+                
+                function_tasks = [self._function_task(file_path, func_info, analysis)
+                                  for func_info in samplers['functions'].select(analysis.get('functions', []), size)]
+                # 同一文件中选中的函数每qa_batch_size个合并为一次请求
+                batch_size = max(self.qa_batch_size, 1)
+                groups = [('_generate_function_qa', function_tasks[start:start + batch_size])
+                          for start in range(0, len(function_tasks), batch_size)]
+                groups += [('_generate_class_qa', [(self._generate_claude_qa_for_class, (file_path, class_info, analysis))])
+                           for class_info in samplers['classes'].select(analysis.get('classes', []), size)]
+                
+                for name, group in groups:
+                    if len(in_flight) >= max_in_flight:
+                        _, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                    is_batch = len(group) > 1
+                    future = self._submit_batch(group) if is_batch else self._submit(group[0])
+                    in_flight.add(future)
+                    futures[name].append((future, is_batch))
+                    if first_request is None:
+                        first_request = time.monotonic() - stream.started_at
+        finally:
+            stream.close()
+        
+        code_analysis = stream.result()
+        submitted = sum(len(group) for group in futures.values())
+        self.streaming_stats = {
+            'requests_submitted': submitted,
+            'first_request_after_seconds': round(first_request, 3) if first_request is not None else None,
+            'max_in_flight': max_in_flight
+        }
+        print(f"分析结束时已发出 {submitted} 个函数和类的请求")
+        
+        # 业务规则和架构模式依赖整个仓库的分析结果，在分析结束后生成
+        tail_groups = [
+            ('_generate_business_rule_qa', self._collect_business_rule_tasks(code_analysis, pairs_per_generator)),
+            ('_generate_architecture_qa', self._collect_architecture_tasks(code_analysis, pairs_per_generator)),
+        ]
+        tail_results = self._execute([task for _, tasks in tail_groups for task in tasks])
+        
+        group_results = []
+        for name, group in futures.items():
+            results = []
+            for future, is_batch in group:
+                if is_batch:
+                    results.extend(future.result() or [])
+                else:
+                    results.append(future.result())
+            group_results.append((name, results))
+        offset = 0
+        for name, tasks in tail_groups:
+            group_results.append((name, tail_results[offset:offset + len(tasks)]))
+            offset += len(tasks)
+        
+        return code_analysis, self._finalize_qa_pairs(code_analysis, group_results, num_pairs)
+    
+    def _finalize_qa_pairs(self, code_analysis: Dict[str, Any],
+                           group_results: List[Tuple[str, List[Optional[Dict[str, Any]]]]],
+                           num_pairs: int) -> List[Dict[str, Any]]:
+        """汇总各生成器的结果，剔除近似重复，数量不足时从函数补充，最后平衡问题类型"""
+        qa_pairs = []
+        for name, results in group_results:
+            pairs = [qa for qa in results if qa]
+            if pairs:
+                qa_pairs.extend(pairs)
+                print(f"{name} 生成了 {len(pairs)} 个QA")
+            else:
+                print(f"{name} 没有生成任何QA")
         
         print(f"总共生成了 {len(qa_pairs)} 个QA，目标: {num_pairs}")
         
-        # 确保多样性并保证数量
-        qa_pairs = self._ensure_diversity(qa_pairs)
+        # 剔除本次运行内以及与历史数据集近似重复的问答对
+        qa_pairs = self._deduplicate(qa_pairs)
         
-        # 如果数量不足，尝试从函数生成器补充
-        if len(qa_pairs) < num_pairs:
+        # 如果数量不足，尝试从函数生成器补充；离线批量模式下本轮还有排队的请求时，
+        # 数量要等结果取回后才能确定，补充推迟到下一轮
+        if len(qa_pairs) < num_pairs and self.claude.deferred_requests():
+            print("批量模式: 本轮还有排队的请求，补充生成推迟到下一轮")
+        elif len(qa_pairs) < num_pairs:
             additional_needed = num_pairs - len(qa_pairs)
             print(f"数量不足，尝试补充 {additional_needed} 个QA")
             try:
-                additional_pairs = self._generate_function_qa(code_analysis, additional_needed)
-                qa_pairs.extend(additional_pairs)
+                additional_pairs = self._run_tasks(
+                    self._collect_function_tasks(code_analysis, additional_needed), 'supplement')
+                qa_pairs.extend(self._deduplicate(additional_pairs))
             except Exception as e:
                 print(f"补充生成失败: {e}")
         
-        return qa_pairs[:num_pairs]
+        return self._balance_question_types(qa_pairs, num_pairs)
     
-    def _generate_function_qa(self, code_analysis: Dict[str, Any], num_pairs: int) -> List[Dict[str, Any]]:
-        """基于函数生成问答对"""
-        qa_pairs = []
+    def generate_qa_for_elements(self, code_analysis: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """为分析结果中的全部函数和类生成问答对（不抽样），用于增量更新"""
         file_analysis = code_analysis.get('file_analysis', {})
+        num_functions = sum(len(analysis.get('functions', [])) for analysis in file_analysis.values())
+        num_classes = sum(len(analysis.get('classes', [])) for analysis in file_analysis.values())
+        print(f"为 {num_functions} 个函数和 {num_classes} 个类重新生成问答对...")
         
-        # 收集所有函数
-        all_functions = []
-        for file_path, analysis in file_analysis.items():
-            functions = analysis.get('functions', [])
-            for func_info in functions:
-                all_functions.append((file_path, func_info, analysis))
-        
-        if not all_functions:
-            return qa_pairs
+        tasks = (self._collect_function_tasks(code_analysis, num_functions) +
+                 self._collect_class_tasks(code_analysis, num_classes))
+        return self._run_tasks(tasks)
+    
+    def _run_tasks(self, tasks: List[GenerationTask], round_name: Optional[str] = None) -> List[Dict[str, Any]]:
+        """并发执行生成任务，过滤失败结果"""
+        return [qa for qa in self._execute(tasks, round_name) if qa]
+    
+    def _execute(self, tasks: List[GenerationTask], round_name: Optional[str] = None) -> List[Optional[Dict[str, Any]]]:
+        """
+        并发执行生成任务，结果与任务一一对应；有运行日志时经由日志执行，已完成的任务直接复用结果
+
+        qa_batch_size大于1时，函数任务按文件排序后每qa_batch_size个合并为一次批量请求
+        """
+        item_ids = self._plan(tasks, round_name)
+        batches = self._function_batches(tasks)
+        batched = {index for batch in batches for index in batch}
+        singles = [index for index in range(len(tasks)) if index not in batched]
+        
+        jobs = [(self._generate_function_batch, ([(item_ids[index], tasks[index]) for index in batch],))
+                for batch in batches]
+        jobs += [self._job(tasks[index], item_ids[index]) for index in singles]
+        outputs = self.engine.run(jobs)
+        
+        results: List[Optional[Dict[str, Any]]] = [None] * len(tasks)
+        for batch, batch_results in zip(batches, outputs):
+            for index, qa in zip(batch, batch_results or []):
+                results[index] = qa
+        for index, qa in zip(singles, outputs[len(batches):]):
+            results[index] = qa
+        return results
+    
+    def _plan(self, tasks: List[GenerationTask], round_name: Optional[str] = None) -> List[Optional[str]]:
+        """在运行日志中登记任务，返回各任务的工作项标识；没有运行日志时均为None"""
+        if self.journal is None:
+            return [None] * len(tasks)
+        
+        item_ids = [self._task_id(task) for task in tasks]
+        if round_name:
+            item_ids = [f"{round_name}/{item_id}" for item_id in item_ids]
+        self.journal.plan(item_ids)
+        return item_ids
+    
+    def _job(self, task: GenerationTask, item_id: Optional[str]) -> GenerationTask:
+        """任务的实际执行方式：有工作项标识时经由运行日志执行，实际执行时统计生成的问答对"""
+        func, args = task
+        if item_id is None:
+            return (self._counted, (func,) + args)
+        return (self.journal.run, (item_id, self._counted, func) + args)
+    
+    def _submit(self, task: GenerationTask) -> Future:
+        """提交单个生成任务，返回Future；有运行日志时与_execute一样经由日志执行"""
+        func, args = self._job(task, self._plan([task])[0])
+        return self.engine.submit(func, *args)
+    
+    def _submit_batch(self, tasks: List[GenerationTask]) -> Future:
+        """把同一文件的多个函数任务作为一次批量请求提交，Future的结果为与任务对应的列表"""
+        return self.engine.submit(self._generate_function_batch, list(zip(self._plan(tasks), tasks)))
+    
+    def _counted(self, func: Callable[..., Optional[Dict[str, Any]]], *args) -> Optional[Dict[str, Any]]:
+        """执行生成函数并计数，运行日志中复用的结果不经过这里"""
+        qa = func(*args)
+        if qa:
+            with self._counters_lock:
+                self._counters['qa_generated'] += 1
+        return qa
+    
+    def _task_id(self, task: GenerationTask) -> str:
+        """任务对应的工作项标识，按生成元素区分"""
+        func, args = task
+        if func == self._generate_claude_qa_for_function:
+            file_path, func_info = args[0], args[1]
+            return f"qa:function:{file_path}::{func_info.get('name')}:{func_info.get('line_number')}"
+        if func == self._generate_claude_qa_for_class:
+            file_path, class_info = args[0], args[1]
+            return f"qa:class:{file_path}::{class_info.get('name')}:{class_info.get('line_number')}"
+        if func == self._generate_claude_qa_for_business_rule:
+            rule = json.dumps(args[0], sort_keys=True, ensure_ascii=False)
+            return f"qa:business_rule:{hashlib.sha1(rule.encode('utf-8')).hexdigest()[:16]}"
+        if func == self._generate_claude_qa_for_architecture:
+            return f"qa:architecture:{args[0]}"
+        return f"qa:{func.__name__}:{hashlib.sha1(repr(args).encode('utf-8')).hexdigest()[:16]}"
+    
+    def _generate_function_qa(self, code_analysis: Dict[str, Any], num_pairs: int) -> List[Dict[str, Any]]:
+        """基于函数生成问答对"""
+        return self._run_tasks(self._collect_function_tasks(code_analysis, num_pairs))
+    
+    def _collect_function_tasks(self, code_analysis: Dict[str, Any], num_pairs: int) -> List[GenerationTask]:
+        """收集函数问答生成任务"""
+        tasks = []
         
-        # 随机选择函数
-        selected_functions = random.sample(all_functions, min(len(all_functions), num_pairs))
+        # 随机选择函数，问题类型和角度在提交前确定，保证并发下结果可复现
+        selected_functions = self._sample_elements(code_analysis, 'functions', num_pairs)
         
         for file_path, func_info, analysis in selected_functions:
-            try:
-                qa_pair = self._generate_claude_qa_for_function(file_path, func_info, analysis)
-                if qa_pair:
-                    qa_pairs.append(qa_pair)
-            except Exception as e:
-                print(f"为函数 {func_info.get('name', 'unknown')} 生成QA时出错: {e}")
-                continue
+            tasks.append(self._function_task(file_path, func_info, analysis))
         
-        return qa_pairs
+        return tasks
+    
+    def _function_task(self, file_path: str, func_info: Dict[str, Any],
+                       analysis: Dict[str, Any]) -> GenerationTask:
+        """为选中的函数确定问题类型、难度和角度，构造生成任务"""
+        question_type = self.rng.choice(list(self.question_templates.keys()))
+        complexity_level = self.rng.choice(['basic', 'intermediate', 'advanced'])
+        perspective = self.rng.choice(['developer', 'architect', 'business_analyst', 'user'])
+        return (self._generate_claude_qa_for_function,
+                (file_path, func_info, analysis, question_type, complexity_level, perspective))
+    
+    def _sample_elements(self, code_analysis: Dict[str, Any], key: str,
+                         num_pairs: int) -> List[Tuple[str, Dict[str, Any], Dict[str, Any]]]:
+        """
+        从所有文件中随机抽取函数或类，返回 (文件路径, 元素信息, 文件分析) 列表
+
+        有符号索引时由索引计数并按序号定位，只读取被抽中的文件；否则第一遍只计数，
+        第二遍按抽中的序号取出，file_analysis为流式报告时只有被抽中的文件分析结果
+        会留在内存中。两种方式的抽样结果相同，与对完整列表抽样一致
+        """
+        file_analysis: Mapping[str, Dict[str, Any]] = code_analysis.get('file_analysis', {})
+        symbol_index = code_analysis.get('symbol_index')
+        if symbol_index is not None:
+            return self._sample_indexed_elements(symbol_index, file_analysis, key, num_pairs)
+        
+        total = sum(len(analysis.get(key, [])) for analysis in file_analysis.values())
+        if not total:
+            return []
+        
+        picks = self.rng.sample(range(total), min(total, num_pairs))
+        wanted = set(picks)
+        found = {}
+        index = 0
+        for file_path, analysis in file_analysis.items():
+            elements = analysis.get(key, [])
+            for element in elements:
+                if index in wanted:
+                    found[index] = (file_path, element, analysis)
+                index += 1
+            if len(found) == len(wanted):
+                break
+        
+        return [found[i] for i in picks]
+    
+    def _sample_indexed_elements(self, symbol_index: SymbolIndex, file_analysis: Mapping[str, Dict[str, Any]],
+                                 key: str, num_pairs: int) -> List[Tuple[str, Dict[str, Any], Dict[str, Any]]]:
+        """按符号索引的全局序号抽样，每个被抽中的文件只读取一次分析结果"""
+        total = symbol_index.count_symbols(SYMBOL_KINDS[key])
+        if not total:
+            return []
+        
+        picks = self.rng.sample(range(total), min(total, num_pairs))
+        analyses = {}
+        selected = []
+        for file_path, ordinal in symbol_index.symbols_by_rank(SYMBOL_KINDS[key], picks):
+            if file_path not in analyses:
+                analyses[file_path] = file_analysis[file_path]
+            analysis = analyses[file_path]
+            selected.append((file_path, analysis[key][ordinal], analysis))
+        return selected
     
     def _generate_claude_qa_for_function(self, file_path: str, func_info: Dict[str, Any], 
-                                       file_analysis: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+                                       file_analysis: Dict[str, Any],
+                                       question_type: Optional[str] = None,
+                                       complexity_level: Optional[str] = None,
+                                       perspective: Optional[str] = None) -> Optional[Dict[str, Any]]:
         """使用Claude为函数生成问答对"""
         function_name = func_info.get('name', '')
-        args = func_info.get('args', [])
-        docstring = func_info.get('docstring', '')
-        business_keywords = file_analysis.get('business_keywords', [])
-        
-        # 构建代码上下文
-        context = f"""文件: {file_path}
-函数: {function_name}({', '.join(args)})
-文档: {docstring if docstring else '无文档'}
-业务关键词: {', '.join(business_keywords) if business_keywords else '无'}"""
+        context = self._function_context(file_path, func_info, file_analysis)
 
         # 选择问题类型和角度
-        question_type = random.choice(list(self.question_templates.keys()))
-        complexity_level = random.choice(['basic', 'intermediate', 'advanced'])
-        perspective = random.choice(['developer', 'architect', 'business_analyst', 'user'])
+        question_type = question_type or self.rng.choice(list(self.question_templates.keys()))
+        complexity_level = complexity_level or self.rng.choice(['basic', 'intermediate', 'advanced'])
+        perspective = perspective or self.rng.choice(['developer', 'architect', 'business_analyst', 'user'])
         
         # 构建Claude提示词
-        claude_prompt = f"""作为一位资深软件工程师和技术专家，请基于以下代码信息生成一个高质量的问答对，用于训练AI模型理解代码。
+        claude_prompt = f"""请基于以下代码信息生成一个函数问答对。
 
 代码上下文:
 {context}
@@ -172,60 +552,12 @@ class QAGenerator:
 3. 回答角度: {perspective}
 4. 问题要具体、有针对性，体现深度思考
 5. 答案要详细、准确，包含技术细节和实践经验
-6. reasoning_trace必须包含完整的分析推理过程
-
-## Reasoning Trace质量要求：
-reasoning_trace必须遵循以下结构化推理框架：
-
-**阶段1：问题理解与分解**
-- 识别问题的核心要点
-- 分析问题的技术背景和业务背景
-- 确定需要考虑的关键因素
-
-**阶段2：技术分析**
-- 代码功能分析：具体做了什么
-- 设计模式识别：使用了哪些模式
-- 架构考量：在整体架构中的作用
-
-**阶段3：深度推理**
-- 因果关系分析：为什么这样设计
-- 假设验证：如果采用其他方案会如何
-- 权衡分析：优势与劣势的对比
-
-**阶段4：实践考虑**
-- 实际应用场景
-- 潜在问题和解决方案
-- 最佳实践建议
-
-**示例格式**：
-"1. 问题分析：[分析问题的核心要点和技术背景]
-2. 技术考察：[详细分析代码的功能、模式、架构]
-3. 深度推理：[解释设计原因、分析替代方案、评估优劣]
-4. 实践洞察：[应用场景、潜在问题、最佳实践]"
-
-请严格按照以下JSON格式回复，不要添加任何其他内容:
-{{
-    "question": "具体的问题（体现深度思考）",
-    "answer": "详细的答案（包含技术细节和实践经验）",
-    "reasoning_trace": "结构化的推理过程（至少150字，遵循上述4阶段框架）"
-}}
-
-注意：reasoning_trace必须具有逻辑连贯性，体现专家级的技术洞察力。只返回JSON，不要包含解释文字或markdown格式。"""
+6. reasoning_trace必须包含完整的分析推理过程，至少150字，遵循函数问答的4阶段框架"""
 
         try:
             print(f"正在为函数 {function_name} 调用Claude API...")
-            response = self.client.messages.create(
-                model=self.model,
-                max_tokens=1000,
-                messages=[
-                    {
-                        "role": "user",
-                        "content": claude_prompt
-                    }
-                ]
-            )
-            
-            content = response.content[0].text
+            content = self.claude.complete(claude_prompt, max_tokens=1000, system=QA_SYSTEM, label='qa',
+                                           parser=self._qa_parser(), tool=QA_TOOL, tools=QA_TOOLS)
             print(f"Claude返回内容: {content[:200]}...")
             
             # 清理和提取JSON
@@ -234,64 +566,194 @@ reasoning_trace必须遵循以下结构化推理框架：
             # 尝试解析JSON
             try:
                 qa_data = json.loads(content)
-                
-                qa_result = {
-                    'question': qa_data.get('question', ''),
-                    'answer': qa_data.get('answer', ''),
-                    'code_context': context,
-                    'reasoning_trace': qa_data.get('reasoning_trace', ''),
-                    'metadata': {
-                        'source_file': file_path,
-                        'function_name': function_name,
-                        'question_type': question_type,
-                        'complexity_level': complexity_level,
-                        'perspective': perspective,
-                        'element_type': 'function',
-                        'generated_by': 'claude'
-                    }
-                }
+                qa_result = self._function_qa_record(qa_data, file_path, func_info, context,
+                                                     question_type, complexity_level, perspective)
                 
                 # 验证reasoning质量
                 if not self._validate_reasoning_quality(qa_result):
                     print(f"函数 {function_name} 的reasoning质量不达标，跳过")
+                    self.claude.discard(claude_prompt, max_tokens=1000, system=QA_SYSTEM)
                     return None
                 
                 return qa_result
             except json.JSONDecodeError:
+                self.claude.discard(claude_prompt, max_tokens=1000, system=QA_SYSTEM)
                 print(f"Claude返回的内容不是有效JSON: {content[:100]}...")
                 return None
                 
+        except DeferredRequest:
+            # 离线批量模式下请求已排队，不是失败，由调用方保留为待处理
+            raise
         except Exception as e:
             print(f"Claude API调用失败: {e}")
             return None
     
+    def _function_context(self, file_path: str, func_info: Dict[str, Any], file_analysis: Dict[str, Any]) -> str:
+        """函数问答的代码上下文"""
+        args = func_info.get('args', [])
+        docstring = func_info.get('docstring', '')
+        business_keywords = file_analysis.get('business_keywords', [])
+        return f"""文件: {file_path}
+函数: {func_info.get('name', '')}({', '.join(args)})
+文档: {docstring if docstring else '无文档'}
+业务关键词: {', '.join(business_keywords) if business_keywords else '无'}""" + self._source_section(file_path, func_info)
+    
+    def _function_qa_record(self, qa_data: Dict[str, Any], file_path: str, func_info: Dict[str, Any],
+                            context: str, question_type: str, complexity_level: str,
+                            perspective: str) -> Dict[str, Any]:
+        """由Claude返回的问答内容构造函数问答记录"""
+        return {
+            'question': qa_data.get('question', ''),
+            'answer': qa_data.get('answer', ''),
+            'code_context': context,
+            'reasoning_trace': qa_data.get('reasoning_trace', ''),
+            'metadata': {
+                'source_file': file_path,
+                'function_name': func_info.get('name', ''),
+                'question_type': question_type,
+                'complexity_level': complexity_level,
+                'perspective': perspective,
+                'element_type': 'function',
+                'generated_by': 'claude'
+            }
+        }
+    
+    def _function_batches(self, tasks: List[GenerationTask]) -> List[List[int]]:
+        """把函数任务按文件排序后每qa_batch_size个分为一批，返回各批的任务序号；不足两个的不成批"""
+        if self.qa_batch_size <= 1:
+            return []
+        indices = [index for index, (func, _) in enumerate(tasks) if func == self._generate_claude_qa_for_function]
+        indices.sort(key=lambda index: tasks[index][1][0])
+        batches = [indices[start:start + self.qa_batch_size]
+                   for start in range(0, len(indices), self.qa_batch_size)]
+        return [batch for batch in batches if len(batch) > 1]
+    
+    def _generate_function_batch(self, entries: List[Tuple[Optional[str], GenerationTask]]) -> List[Optional[Dict[str, Any]]]:
+        """
+        一次请求为多个函数生成问答对，entries为 (工作项标识, 函数任务) 列表，返回与之对应的结果
+
+        运行日志中已完成的函数直接复用结果；批量响应中缺失、无法解析或质量不达标的函数单独重试
+        """
+        results: List[Optional[Dict[str, Any]]] = [None] * len(entries)
+        pending = []
+        for index, (item_id, (func, args)) in enumerate(entries):
+            if item_id is not None and self.journal.is_done(item_id):
+                results[index] = self.journal.run(item_id, func, *args)
+            else:
+                pending.append(index)
+        
+        def record(position: int, qa: Dict[str, Any]):
+            # 批量响应中的对象一闭合即落盘，请求中途失败或进程中断时已完成的函数不必重做
+            item_id = entries[pending[position]][0]
+            if item_id is not None:
+                self.journal.record(item_id, qa)
+        
+        if len(pending) > 1:
+            batch_results = self._request_function_batch([entries[index][1][1] for index in pending],
+                                                         on_result=record)
+        else:
+            batch_results = [None] * len(pending)
+        for index, qa in zip(pending, batch_results):
+            item_id, (func, args) = entries[index]
+            if qa is None:
+                if len(pending) > 1:
+                    with self._counters_lock:
+                        self._counters['individual_retries'] += 1
+                job, job_args = self._job((func, args), item_id)
+                qa = job(*job_args)
+            results[index] = qa
+        return results
+    
+    def _request_function_batch(self, items: List[tuple],
+                                on_result: Optional[Callable[[int, Dict[str, Any]], None]] = None) -> List[Optional[Dict[str, Any]]]:
+        """
+        发送一次批量请求，items为函数任务的参数元组，返回各函数的问答记录，未能生成的为None
+
+        函数在提示词中按F1、F2……编号，响应为以编号标识的JSON数组。流式读取时每个对象闭合即校验，
+        有效的问答记录立即交给on_result(序号, 记录)；输出被截断或中途格式错误时保留已完整的对象
+        """
+        contexts = [self._function_context(file_path, func_info, file_analysis)
+                    for file_path, func_info, file_analysis, *_ in items]
+        sections = []
+        for number, (context, (_, _, _, question_type, complexity_level, perspective)) in enumerate(zip(contexts, items), 1):
+            sections.append(f"""### 函数 F{number}
+代码上下文:
+{context}
+
+问题类型: "{question_type}"，问题复杂度: {complexity_level}，回答角度: {perspective}""")
+        
+        claude_prompt = f"""请基于以下代码信息，为每个函数分别生成一个函数问答对，共{len(items)}个。
+
+{chr(10).join(sections)}
+
+要求:
+1. 每个问答对只针对对应编号的函数，使用该函数指定的问题类型、复杂度和回答角度
+2. 问题要具体、有针对性，体现深度思考
+3. 答案要详细、准确，包含技术细节和实践经验
+4. reasoning_trace必须包含完整的分析推理过程，至少150字，遵循函数问答的4阶段框架
+5. 按批量输出格式返回JSON数组，id为函数编号"""
+        max_tokens = min(BATCH_TOKENS_PER_FUNCTION * len(items), MAX_BATCH_OUTPUT_TOKENS)
+        
+        results: List[Optional[Dict[str, Any]]] = [None] * len(items)
+        numbers = {f"F{index + 1}": index for index in range(len(items))}
+        
+        def surface(qa_data: Dict[str, Any]):
+            index = numbers.get(str(qa_data['id']).strip().upper())
+            # 重试请求时已闭合的对象会再次出现，同一函数只取第一个有效结果
+            if index is None or results[index] is not None:
+                return
+            file_path, func_info, _, question_type, complexity_level, perspective = items[index]
+            qa_result = self._function_qa_record(qa_data, file_path, func_info, contexts[index],
+                                                 question_type, complexity_level, perspective)
+            if self._validate_reasoning_quality(qa_result):
+                results[index] = qa_result
+                if on_result is not None:
+                    on_result(index, qa_result)
+        
+        parser = JSONStreamParser('array', keys=QA_BATCH_KEYS, required=QA_BATCH_KEYS, on_value=surface)
+        try:
+            print(f"正在为 {len(items)} 个函数批量调用Claude API...")
+            self.claude.complete(claude_prompt, max_tokens=max_tokens, system=QA_BATCH_SYSTEM, label='qa',
+                                 parser=parser, tool=QA_BATCH_TOOL, tools=QA_TOOLS)
+        except DeferredRequest:
+            # 离线批量模式下请求已排队，结果在下一轮取得，此时不单独重试
+            raise
+        except MalformedResponse as e:
+            print(f"批量响应格式错误，已中止读取: {e}")
+        except Exception as e:
+            print(f"Claude API批量调用失败: {e}")
+            return results
+        
+        generated = sum(1 for qa in results if qa)
+        print(f"批量请求 {len(items)} 个函数，得到 {generated} 个有效QA")
+        if not generated:
+            self.claude.discard(claude_prompt, max_tokens=max_tokens, system=QA_BATCH_SYSTEM)
+        with self._counters_lock:
+            self._counters['batch_requests'] += 1
+            self._counters['batched_functions'] += len(items)
+            self._counters['batched_qa'] += generated
+            self._counters['qa_generated'] += generated
+        return results
+    
+    def _source_section(self, file_path: str, element: Dict[str, Any]) -> str:
+        """代码上下文中的源码部分，未设置片段服务或元素没有记录源码区间时为空"""
+        if self.snippets is None or not self.max_snippet_bytes:
+            return ''
+        source = self.snippets.element_source(file_path, element, self.max_snippet_bytes)
+        if not source:
+            return ''
+        return f"\n源码:\n```{Path(file_path).suffix.lstrip('.')}\n{source}\n```"
+    
     def _generate_class_qa(self, code_analysis: Dict[str, Any], num_pairs: int) -> List[Dict[str, Any]]:
         """基于类生成问答对"""
-        qa_pairs = []
-        file_analysis = code_analysis.get('file_analysis', {})
-        
-        # 收集所有类
-        all_classes = []
-        for file_path, analysis in file_analysis.items():
-            classes = analysis.get('classes', [])
-            for class_info in classes:
-                all_classes.append((file_path, class_info, analysis))
-        
-        if not all_classes:
-            return qa_pairs
-        
-        selected_classes = random.sample(all_classes, min(len(all_classes), num_pairs))
-        
-        for file_path, class_info, analysis in selected_classes:
-            try:
-                qa_pair = self._generate_claude_qa_for_class(file_path, class_info, analysis)
-                if qa_pair:
-                    qa_pairs.append(qa_pair)
-            except Exception as e:
-                print(f"为类 {class_info.get('name', 'unknown')} 生成QA时出错: {e}")
-                continue
+        return self._run_tasks(self._collect_class_tasks(code_analysis, num_pairs))
+    
+    def _collect_class_tasks(self, code_analysis: Dict[str, Any], num_pairs: int) -> List[GenerationTask]:
+        """收集类问答生成任务"""
+        selected_classes = self._sample_elements(code_analysis, 'classes', num_pairs)
         
-        return qa_pairs
+        return [(self._generate_claude_qa_for_class, (file_path, class_info, analysis))
+                for file_path, class_info, analysis in selected_classes]
     
     def _generate_claude_qa_for_class(self, file_path: str, class_info: Dict[str, Any], 
                                     file_analysis: Dict[str, Any]) -> Optional[Dict[str, Any]]:
@@ -303,39 +765,18 @@ reasoning_trace必须遵循以下结构化推理框架：
         context = f"""文件: {file_path}
 类: {class_name}
 方法: {', '.join(methods) if methods else '无'}
-文档: {docstring if docstring else '无文档'}"""
+文档: {docstring if docstring else '无文档'}""" + self._source_section(file_path, class_info)
 
-        claude_prompt = f"""作为资深软件架构师，请为以下类信息生成一个高质量的问答对，用于训练AI模型理解代码架构设计。
+        claude_prompt = f"""请为以下类信息生成一个类问答对。
 
 {context}
 
 请生成一个关于类设计和架构的深度问题，以及专业的回答。
-
-## Reasoning Trace质量要求：
-必须包含结构化的架构分析推理：
-
-**1. 设计意图分析**：解释该类的设计目的和在系统中的角色
-**2. 架构模式识别**：分析使用的设计模式和架构原则
-**3. 职责边界分析**：评估类的职责是否清晰，是否符合单一职责原则
-**4. 依赖关系分析**：分析类与其他组件的耦合关系
-**5. 扩展性评估**：评估类的可扩展性和可维护性
-**6. 最佳实践对比**：与业界最佳实践进行对比分析
-
-JSON格式:
-{{
-    "question": "关于类设计的深度架构问题",
-    "answer": "详细的架构分析回答",
-    "reasoning_trace": "结构化的架构推理过程（至少200字，体现架构师的专业洞察）"
-}}"""
+reasoning_trace为结构化的架构推理过程，至少200字，体现架构师的专业洞察。"""
 
         try:
-            response = self.client.messages.create(
-                model=self.model,
-                max_tokens=1000,
-                messages=[{"role": "user", "content": claude_prompt}]
-            )
-            
-            content = response.content[0].text
+            content = self.claude.complete(claude_prompt, max_tokens=1000, system=QA_SYSTEM, label='qa',
+                                           parser=self._qa_parser(), tool=QA_TOOL, tools=QA_TOOLS)
             content = self._extract_json_from_response(content)
             
             try:
@@ -357,66 +798,44 @@ JSON格式:
                     }
                 }
             except json.JSONDecodeError as e:
+                self.claude.discard(claude_prompt, max_tokens=1000, system=QA_SYSTEM)
                 print(f"类QA的JSON解析错误: {e}")
                 print(f"问题内容: {content[:200] if content else 'None'}")
                 return None
+        except DeferredRequest:
+            # 离线批量模式下请求已排队，不是失败，由调用方保留为待处理
+            raise
         except Exception as e:
             print(f"为类生成QA失败: {e}")
             return None
     
     def _generate_business_rule_qa(self, code_analysis: Dict[str, Any], num_pairs: int) -> List[Dict[str, Any]]:
         """基于业务规则生成问答对"""
-        qa_pairs = []
+        return self._run_tasks(self._collect_business_rule_tasks(code_analysis, num_pairs))
+    
+    def _collect_business_rule_tasks(self, code_analysis: Dict[str, Any], num_pairs: int) -> List[GenerationTask]:
+        """收集业务规则问答生成任务"""
         business_rules = code_analysis.get('business_rules', [])
         
-        for rule_info in business_rules[:num_pairs]:
-            try:
-                qa_pair = self._generate_claude_qa_for_business_rule(rule_info)
-                if qa_pair:
-                    qa_pairs.append(qa_pair)
-            except Exception as e:
-                print(f"为业务规则生成QA时出错: {e}")
-                continue
-        
-        return qa_pairs
+        return [(self._generate_claude_qa_for_business_rule, (rule_info,))
+                for rule_info in business_rules[:num_pairs]]
     
     def _generate_claude_qa_for_business_rule(self, rule_info: Dict[str, Any]) -> Optional[Dict[str, Any]]:
         """为业务规则生成问答对"""
         rule = rule_info.get('rule', '')
         source_file = rule_info.get('source_file', '')
         
-        claude_prompt = f"""作为资深业务分析师和技术专家，请基于以下业务规则生成高质量的问答对，用于训练AI模型理解业务逻辑。
+        claude_prompt = f"""请基于以下业务规则生成一个业务规则问答对。
 
 业务规则: {rule}
 来源: {source_file}
 
 请生成一个深度的业务逻辑问题和专业回答。
-
-## Reasoning Trace质量要求：
-必须包含完整的业务分析推理：
-
-**1. 业务背景分析**：解释该业务规则的背景和目的
-**2. 规则逻辑分析**：详细分析规则的执行逻辑和条件
-**3. 业务价值评估**：评估该规则对业务的价值和重要性
-**4. 影响范围分析**：分析该规则对其他业务流程的影响
-**5. 异常情况考虑**：分析可能的异常情况和处理方式
-**6. 优化建议**：基于最佳实践提出改进建议
-
-JSON格式:
-{{
-    "question": "深度的业务逻辑问题",
-    "answer": "专业的业务分析回答",
-    "reasoning_trace": "结构化的业务推理过程（至少180字，体现业务分析师的专业能力）"
-}}"""
+reasoning_trace为结构化的业务推理过程，至少180字，体现业务分析师的专业能力。"""
 
         try:
-            response = self.client.messages.create(
-                model=self.model,
-                max_tokens=800,
-                messages=[{"role": "user", "content": claude_prompt}]
-            )
-            
-            content = response.content[0].text
+            content = self.claude.complete(claude_prompt, max_tokens=800, system=QA_SYSTEM, label='qa',
+                                           parser=self._qa_parser(), tool=QA_TOOL, tools=QA_TOOLS)
             content = self._extract_json_from_response(content)
             
             try:
@@ -438,67 +857,45 @@ JSON格式:
                     }
                 }
             except json.JSONDecodeError as e:
+                self.claude.discard(claude_prompt, max_tokens=800, system=QA_SYSTEM)
                 print(f"业务规则QA的JSON解析错误: {e}")
                 print(f"问题内容: {content[:200] if content else 'None'}")
                 return None
+        except DeferredRequest:
+            # 离线批量模式下请求已排队，不是失败，由调用方保留为待处理
+            raise
         except Exception as e:
             print(f"业务规则QA生成失败: {e}")
             return None
     
     def _generate_architecture_qa(self, code_analysis: Dict[str, Any], num_pairs: int) -> List[Dict[str, Any]]:
         """基于架构模式生成问答对"""
-        qa_pairs = []
+        return self._run_tasks(self._collect_architecture_tasks(code_analysis, num_pairs))
+    
+    def _collect_architecture_tasks(self, code_analysis: Dict[str, Any], num_pairs: int) -> List[GenerationTask]:
+        """收集架构模式问答生成任务"""
         architecture_patterns = code_analysis.get('architecture_patterns', {})
         
         detected_patterns = [pattern for pattern, is_present in architecture_patterns.items() if is_present]
         
-        for pattern in detected_patterns[:num_pairs]:
-            try:
-                qa_pair = self._generate_claude_qa_for_architecture(pattern, code_analysis)
-                if qa_pair:
-                    qa_pairs.append(qa_pair)
-            except Exception as e:
-                print(f"为架构模式 {pattern} 生成QA时出错: {e}")
-                continue
-        
-        return qa_pairs
+        return [(self._generate_claude_qa_for_architecture, (pattern, code_analysis))
+                for pattern in detected_patterns[:num_pairs]]
     
     def _generate_claude_qa_for_architecture(self, pattern: str, code_analysis: Dict[str, Any]) -> Optional[Dict[str, Any]]:
         """为架构模式生成问答对"""
         repo_structure = code_analysis.get('repo_structure', {})
         
-        claude_prompt = f"""作为系统架构师和技术领域专家，请基于以下项目信息生成高质量的架构问答对，用于训练AI模型理解系统架构设计。
+        claude_prompt = f"""请基于以下项目信息生成一个架构问答对。
 
 检测到的架构模式: {pattern}
 项目结构: {repo_structure}
 
 请生成一个深度的架构设计问题和专业回答。
-
-## Reasoning Trace质量要求：
-必须包含系统性的架构分析推理：
-
-**1. 架构模式识别**：深入分析当前架构模式的特征和适用性
-**2. 设计原则评估**：评估架构是否符合SOLID、DRY、KISS等设计原则
-**3. 可扩展性分析**：分析架构的水平扩展和垂直扩展能力
-**4. 性能影响评估**：评估架构对系统性能的影响
-**5. 维护性考量**：分析架构的可维护性和技术债务风险
-**6. 演进策略**：提出架构演进和优化建议
-
-JSON格式:
-{{
-    "question": "深度的架构设计问题",
-    "answer": "专业的架构分析和设计建议",
-    "reasoning_trace": "系统性的架构推理过程（至少220字，体现架构师的系统性思维）"
-}}"""
+reasoning_trace为系统性的架构推理过程，至少220字，体现架构师的系统性思维。"""
 
         try:
-            response = self.client.messages.create(
-                model=self.model,
-                max_tokens=1000,
-                messages=[{"role": "user", "content": claude_prompt}]
-            )
-            
-            content = response.content[0].text
+            content = self.claude.complete(claude_prompt, max_tokens=1000, system=QA_SYSTEM, label='qa',
+                                           parser=self._qa_parser(), tool=QA_TOOL, tools=QA_TOOLS)
             content = self._extract_json_from_response(content)
             
             try:
@@ -519,9 +916,13 @@ JSON格式:
                     }
                 }
             except json.JSONDecodeError as e:
+                self.claude.discard(claude_prompt, max_tokens=1000, system=QA_SYSTEM)
                 print(f"架构QA的JSON解析错误: {e}")
                 print(f"问题内容: {content[:200] if content else 'None'}")
                 return None
+        except DeferredRequest:
+            # 离线批量模式下请求已排队，不是失败，由调用方保留为待处理
+            raise
         except Exception as e:
             print(f"架构QA生成失败: {e}")
             return None
@@ -550,55 +951,37 @@ JSON格式:
         
         return indicator_count >= 3 and has_structure and len(reasoning) >= 100
     
-    def _ensure_diversity(self, qa_pairs: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
-        """确保问答对的多样性"""
-        if not qa_pairs:
+    def _deduplicate(self, qa_pairs: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """剔除近似重复的问答对：问题、答案和推理过程与已保留的条目或历史数据集近似时丢弃"""
+        unique_pairs = [qa for qa in qa_pairs if self.dedup_index.add(qa_text(qa))]
+        if len(unique_pairs) < len(qa_pairs):
+            print(f"剔除 {len(qa_pairs) - len(unique_pairs)} 个近似重复的QA")
+        return unique_pairs
+    
+    def _balance_question_types(self, qa_pairs: List[Dict[str, Any]], num_pairs: int) -> List[Dict[str, Any]]:
+        """超出目标数量时按问题类型轮流选取，使各类型数量均衡；不足时全部保留"""
+        if len(qa_pairs) <= num_pairs:
             return qa_pairs
         
-        # 按问题类型分组
+        # 按问题类型分组，组内保持生成顺序
         by_type = {}
         for qa in qa_pairs:
-            qtype = qa['metadata'].get('question_type', 'other')
-            if qtype not in by_type:
-                by_type[qtype] = []
-            by_type[qtype].append(qa)
+            by_type.setdefault(qa['metadata'].get('question_type', 'other'), []).append(qa)
         
-        # 平衡不同类型的数量
         balanced_pairs = []
-        max_per_type = max(len(qa_pairs) // len(by_type), 1) if by_type else 1
-        
-        for qtype, pairs in by_type.items():
-            selected = random.sample(pairs, min(len(pairs), max_per_type))
-            balanced_pairs.extend(selected)
-        
-        return balanced_pairs
+        for round_index in range(max(len(pairs) for pairs in by_type.values())):
+            for pairs in by_type.values():
+                if round_index < len(pairs):
+                    balanced_pairs.append(pairs[round_index])
+        return balanced_pairs[:num_pairs]
     
     def _extract_json_from_response(self, content: str) -> str:
         """从Claude响应中提取JSON"""
-        # 尝试找到JSON开始和结束位置
-        start_markers = ['{', '```json\n{', '```\n{']
-        end_markers = ['}', '}\n```', '}```']
-        
-        for start_marker in start_markers:
-            start_pos = content.find(start_marker)
-            if start_pos != -1:
-                # 找到开始位置后，寻找对应的结束位置
-                json_start = start_pos + (len(start_marker) - 1) if start_marker != '{' else start_pos
-                
-                # 尝试找到匹配的结束括号
-                brace_count = 0
-                for i, char in enumerate(content[json_start:], json_start):
-                    if char == '{':
-                        brace_count += 1
-                    elif char == '}':
-                        brace_count -= 1
-                        if brace_count == 0:
-                            json_content = content[json_start:i+1]
-                            # 清理控制字符
-                            return self._clean_json_string(json_content)
-        
-        # 如果找不到完整的JSON，返回清理后的原内容
-        return self._clean_json_string(content)
+        return self._clean_json_string(extract_json_text(content))
+    
+    def _qa_parser(self) -> JSONStreamParser:
+        """单个问答对响应的增量解析器"""
+        return JSONStreamParser('object', keys=QA_KEYS, required=QA_KEYS)
     
     def _clean_json_string(self, json_str: str) -> str:
         """清理JSON字符串中的控制字符"""
@@ -607,6 +990,23 @@ JSON格式:
         json_str = re.sub(r'[\x00-\x08\x0B\x0C\x0E-\x1F]', '', json_str)
         return json_str
     
+    def generation_stats(self) -> Dict[str, Any]:
+        """问答生成统计：批量请求情况，以及平均每个有效问答对的Claude调用次数和token用量"""
+        with self._counters_lock:
+            counters = dict(self._counters)
+        usage = self.claude.stats()['requests']['by_label'].get('qa', {})
+        tokens = sum(usage.get(key, 0) for key in ('input_tokens', 'output_tokens',
+                                                   'cache_creation_input_tokens', 'cache_read_input_tokens'))
+        generated = counters['qa_generated']
+        return {
+            'qa_batch_size': self.qa_batch_size,
+            **counters,
+            'api_calls': usage.get('api_calls', 0),
+            'tokens': tokens,
+            'calls_per_qa': round(usage.get('api_calls', 0) / generated, 3) if generated else None,
+            'tokens_per_qa': round(tokens / generated, 1) if generated else None
+        }
+    
     def save_qa_pairs(self, qa_pairs: List[Dict[str, Any]], output_path: str):
         """保存问答对到文件"""
         with open(output_path, 'w', encoding='utf-8') as f:
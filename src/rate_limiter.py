@@ -0,0 +1,83 @@
+"""
+请求调度 - 令牌桶限流（每分钟请求数/token数）与带抖动的指数退避重试策略
+"""
+import random
+import threading
+import time
+from typing import Optional
+
+
+class TokenBucket:
+    """线程安全的令牌桶，按每分钟速率匀速补充，容量为一分钟的额度"""
+
+    def __init__(self, per_minute: float):
+        self.rate = per_minute / 60.0
+        self.capacity = float(per_minute)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, amount: float = 1.0) -> float:
+        """取出指定数量的令牌，不足时阻塞等待，返回等待的秒数"""
+        # 单次请求超过桶容量时按容量计，避免永远等不到
+        amount = min(amount, self.capacity)
+        waited = 0.0
+        while True:
+            with self._lock:
+                self._refill()
+                if self._tokens >= amount:
+                    self._tokens -= amount
+                    return waited
+                delay = (amount - self._tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+    def adjust(self, amount: float):
+        """按实际用量修正：正数表示多用了令牌（允许透支），负数表示归还"""
+        with self._lock:
+            self._refill()
+            self._tokens = min(self._tokens - amount, self.capacity)
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+
+class RateLimiter:
+    """组合每分钟请求数和每分钟token数两个限额，未设置的限额不生效"""
+
+    def __init__(self, requests_per_minute: Optional[float] = None,
+                 tokens_per_minute: Optional[float] = None):
+        self.requests = TokenBucket(requests_per_minute) if requests_per_minute else None
+        self.tokens = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+
+    def acquire(self, estimated_tokens: int) -> float:
+        """请求发送前调用，返回因限流等待的秒数"""
+        waited = 0.0
+        if self.requests is not None:
+            waited += self.requests.acquire(1)
+        if self.tokens is not None:
+            waited += self.tokens.acquire(estimated_tokens)
+        return waited
+
+    def record_usage(self, estimated_tokens: int, actual_tokens: int):
+        """请求完成后用实际token用量修正预估值"""
+        if self.tokens is not None:
+            self.tokens.adjust(actual_tokens - estimated_tokens)
+
+
+class RetryPolicy:
+    """指数退避重试策略，使用全抖动（full jitter）避免并发请求同时重试"""
+
+    def __init__(self, max_retries: int = 5, base_delay: float = 1.0, max_delay: float = 60.0):
+        self.max_retries = max(int(max_retries), 0)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def delay(self, attempt: int, retry_after: Optional[float] = None) -> float:
+        """第attempt次重试（从0开始）前的等待秒数，服务端给出retry-after时不早于该时间"""
+        backoff = random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+        if retry_after is not None:
+            return max(retry_after, backoff)
+        return backoff
@@ -3,15 +3,52 @@
 """
 import json
 import re
-from typing import Dict, List, Any, Tuple
+from typing import Dict, List, Any, Set, Tuple
 from collections import Counter
 
+from keyword_matcher import KeywordMatcher
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+# 逻辑连接词
+LOGICAL_CONNECTORS = [
+    '因为', '所以', '由于', '因此', '然而', '但是', '并且',
+    '同时', '首先', '其次', '最后', '综上', '总结', '基于'
+]
+
+# 句子切分：按中英文句末标点
+SENTENCE_DELIMITERS = re.compile(r'[。！？.]')
+
+# 批量评估时每块的条目数，限制指标命中矩阵的内存占用
+BATCH_CHUNK_SIZE = 8192
+
+# 五项子得分，顺序与评估结果中的字段顺序一致
+SUB_SCORES = ('length_score', 'quality_score', 'structure_score', 'completeness_score', 'coherence_score')
+
 
 class ReasoningQualityAssessor:
     """推理质量评估器"""
     
     def __init__(self):
         self.quality_frameworks = self._load_quality_frameworks()
+        # 每个框架的全部指标词编译为一个匹配器，每条推理只扫描一遍
+        self.matchers = {name: self._build_matcher(framework)
+                         for name, framework in self.quality_frameworks.items()}
+        # 批量评估用的各框架权重表，首次用到时构建
+        self._batch_tables: Dict[str, Dict[str, Any]] = {}
+        
+    def _build_matcher(self, framework: Dict[str, Any]) -> KeywordMatcher:
+        """汇总框架中的指标词、结构模式、必要元素和逻辑连接词"""
+        keywords = list(framework['quality_indicators']) + list(framework['structure_patterns'])
+        for element in framework['required_elements']:
+            keywords.append(element)
+            keywords.extend(element.split())
+        keywords.extend(LOGICAL_CONNECTORS)
+        return KeywordMatcher(keywords)
         
     def _load_quality_frameworks(self) -> Dict[str, Dict[str, Any]]:
         """加载不同类型内容的质量评估框架"""
@@ -68,22 +105,25 @@ class ReasoningQualityAssessor:
     def assess_reasoning_quality(self, content: Dict[str, Any], content_type: str) -> Dict[str, Any]:
         """评估单个内容的推理质量"""
         reasoning = content.get('reasoning_trace', '')
-        framework = self.quality_frameworks.get(content_type, self.quality_frameworks['qa_function'])
+        if content_type not in self.quality_frameworks:
+            content_type = 'qa_function'
+        framework = self.quality_frameworks[content_type]
+        found = self.matchers[content_type].found(reasoning)
         
         # 1. 长度评估
         length_score = min(len(reasoning) / framework['min_length'], 1.0)
         
         # 2. 质量指标评估
-        quality_score = self._assess_quality_indicators(reasoning, framework['quality_indicators'])
+        quality_score = self._assess_quality_indicators(reasoning, framework['quality_indicators'], found)
         
         # 3. 结构化评估
-        structure_score = self._assess_structure(reasoning, framework['structure_patterns'])
+        structure_score = self._assess_structure(reasoning, framework['structure_patterns'], found)
         
         # 4. 元素完整性评估
-        completeness_score = self._assess_completeness(reasoning, framework['required_elements'])
+        completeness_score = self._assess_completeness(reasoning, framework['required_elements'], found)
         
         # 5. 逻辑连贯性评估
-        coherence_score = self._assess_coherence(reasoning)
+        coherence_score = self._assess_coherence(reasoning, found)
         
         # 综合得分
         overall_score = (
@@ -106,23 +146,23 @@ class ReasoningQualityAssessor:
             'passes_threshold': overall_score >= 0.7
         }
     
-    def _assess_quality_indicators(self, reasoning: str, indicators: List[str]) -> float:
+    def _assess_quality_indicators(self, reasoning: str, indicators: List[str], found: Set[str]) -> float:
         """评估质量指标词汇的使用"""
         if not reasoning:
             return 0.0
         
-        found_indicators = sum(1 for indicator in indicators if indicator in reasoning)
+        found_indicators = sum(1 for indicator in indicators if indicator in found)
         return min(found_indicators / len(indicators), 1.0)
     
-    def _assess_structure(self, reasoning: str, patterns: List[str]) -> float:
+    def _assess_structure(self, reasoning: str, patterns: List[str], found: Set[str]) -> float:
         """评估结构化程度"""
         if not reasoning:
             return 0.0
         
-        structure_count = sum(1 for pattern in patterns if pattern in reasoning)
+        structure_count = sum(1 for pattern in patterns if pattern in found)
         return min(structure_count / 3, 1.0)  # 至少需要3个结构化元素
     
-    def _assess_completeness(self, reasoning: str, required_elements: List[str]) -> float:
+    def _assess_completeness(self, reasoning: str, required_elements: List[str], found: Set[str]) -> float:
         """评估必要元素的完整性"""
         if not reasoning:
             return 0.0
@@ -131,26 +171,21 @@ class ReasoningQualityAssessor:
         element_count = 0
         for element in required_elements:
             # 使用更灵活的匹配策略
-            if element in reasoning or any(word in reasoning for word in element.split()):
+            if element in found or any(word in found for word in element.split()):
                 element_count += 1
         
         return element_count / len(required_elements)
     
-    def _assess_coherence(self, reasoning: str) -> float:
+    def _assess_coherence(self, reasoning: str, found: Set[str]) -> float:
         """评估逻辑连贯性"""
         if not reasoning:
             return 0.0
         
         # 检查逻辑连接词
-        logical_connectors = [
-            '因为', '所以', '由于', '因此', '然而', '但是', '并且',
-            '同时', '首先', '其次', '最后', '综上', '总结', '基于'
-        ]
-        
-        connector_count = sum(1 for connector in logical_connectors if connector in reasoning)
+        connector_count = sum(1 for connector in LOGICAL_CONNECTORS if connector in found)
         
         # 检查句子完整性（通过标点符号）
-        sentences = len([s for s in re.split(r'[。！？.]', reasoning) if s.strip()])
+        sentences = _count_sentences(reasoning)
         
         # 逻辑连贯性得分
         if sentences == 0:
@@ -160,33 +195,137 @@ class ReasoningQualityAssessor:
         
         return connector_ratio
     
+    def assess_batch(self, items: List[Dict[str, Any]], content_types: List[str]) -> List[Dict[str, Any]]:
+        """
+        批量评估推理质量，结果与逐条调用assess_reasoning_quality完全一致
+
+        文本只扫描一遍得到特征（长度、句子数、指标词命中矩阵），五项子得分和综合得分
+        按内容类型分组做向量运算；未安装numpy时退回逐条评估
+        """
+        if np is None:
+            return [self.assess_reasoning_quality(item, content_type)
+                    for item, content_type in zip(items, content_types)]
+        
+        results = []
+        for start in range(0, len(items), BATCH_CHUNK_SIZE):
+            results.extend(self._assess_chunk(items[start:start + BATCH_CHUNK_SIZE],
+                                              content_types[start:start + BATCH_CHUNK_SIZE]))
+        return results
+    
+    def _assess_chunk(self, items: List[Dict[str, Any]], content_types: List[str]) -> List[Dict[str, Any]]:
+        """向量化评估一块条目：按内容类型分组，每组构建 条目×指标词 的命中矩阵后计算得分"""
+        count = len(items)
+        types = [content_type if content_type in self.quality_frameworks else 'qa_function'
+                 for content_type in content_types]
+        groups: Dict[str, List[int]] = {}
+        for row, content_type in enumerate(types):
+            groups.setdefault(content_type, []).append(row)
+        
+        lengths = np.zeros(count)
+        sub_scores = {name: np.zeros(count) for name in SUB_SCORES}
+        for content_type, rows in groups.items():
+            framework = self.quality_frameworks[content_type]
+            tables = self._get_batch_tables(content_type)
+            matcher = self.matchers[content_type]
+            
+            # 特征提取：每条推理只扫描一遍，命中位置先收集再一次性写入矩阵
+            texts = [items[row].get('reasoning_trace', '') for row in rows]
+            columns = tables['columns']
+            hit_rows = []
+            hit_columns = []
+            for index, reasoning in enumerate(texts):
+                found_columns = [columns[keyword] for keyword in matcher.found(reasoning)]
+                hit_rows.extend([index] * len(found_columns))
+                hit_columns.extend(found_columns)
+            
+            hits = np.zeros((len(rows), len(columns)))
+            hits[hit_rows, hit_columns] = 1.0
+            group_lengths = np.array([len(reasoning) for reasoning in texts], dtype=float)
+            group_sentences = np.array([_count_sentences(reasoning) for reasoning in texts], dtype=float)
+            
+            # 与逐条评估的公式逐项对应，运算顺序一致以保证浮点结果相同
+            connector_count = hits @ tables['connectors']
+            scores = {
+                'length_score': np.minimum(group_lengths / framework['min_length'], 1.0),
+                'quality_score': np.minimum(hits @ tables['quality'] / len(framework['quality_indicators']), 1.0),
+                'structure_score': np.minimum(hits @ tables['structure'] / 3, 1.0),
+                'completeness_score': ((hits @ tables['elements']) > 0).sum(axis=1) / len(framework['required_elements']),
+                'coherence_score': np.where(group_sentences == 0, 0.0,
+                                            np.minimum(connector_count / np.maximum(group_sentences / 3, 1), 1.0))
+            }
+            lengths[rows] = group_lengths
+            for name in SUB_SCORES:
+                sub_scores[name][rows] = scores[name]
+        
+        overall = (
+            sub_scores['length_score'] * 0.15 +
+            sub_scores['quality_score'] * 0.25 +
+            sub_scores['structure_score'] * 0.20 +
+            sub_scores['completeness_score'] * 0.25 +
+            sub_scores['coherence_score'] * 0.15
+        )
+        
+        overall_rounded = _round3(overall)
+        sub_rounded = [_round3(sub_scores[name]) for name in SUB_SCORES]
+        passes = (overall >= 0.7).tolist()
+        lengths = lengths.astype(int).tolist()
+        return [{
+            'overall_score': overall_rounded[row],
+            **{name: values[row] for name, values in zip(SUB_SCORES, sub_rounded)},
+            'reasoning_length': lengths[row],
+            'required_length': self.quality_frameworks[types[row]]['min_length'],
+            'passes_threshold': passes[row]
+        } for row in range(count)]
+    
+    def _get_batch_tables(self, content_type: str) -> Dict[str, Any]:
+        """
+        批量评估用的权重表（按框架缓存）：columns为框架匹配器的关键词到命中矩阵列的映射，
+        指标词、结构模式和逻辑连接词为按出现次数计权的列向量，必要元素为 关键词×元素 的0/1矩阵
+        """
+        if content_type in self._batch_tables:
+            return self._batch_tables[content_type]
+        
+        framework = self.quality_frameworks[content_type]
+        columns = {keyword: index for index, keyword in enumerate(self.matchers[content_type].keywords)}
+        
+        def weight_vector(keywords: List[str]):
+            vector = np.zeros(len(columns))
+            for keyword in keywords:
+                vector[columns[keyword]] += 1
+            return vector
+        
+        elements = np.zeros((len(columns), len(framework['required_elements'])))
+        for index, element in enumerate(framework['required_elements']):
+            for keyword in [element] + element.split():
+                elements[columns[keyword], index] = 1
+        
+        tables = {
+            'columns': columns,
+            'quality': weight_vector(framework['quality_indicators']),
+            'structure': weight_vector(framework['structure_patterns']),
+            'connectors': weight_vector(LOGICAL_CONNECTORS),
+            'elements': elements
+        }
+        self._batch_tables[content_type] = tables
+        return tables
+    
     def generate_quality_report(self, qa_pairs: List[Dict[str, Any]], 
                               design_proposals: List[Dict[str, Any]]) -> Dict[str, Any]:
         """生成整体质量报告"""
         
         # 评估QA pairs
-        qa_scores = []
+        qa_types = [f"qa_{qa.get('metadata', {}).get('element_type', 'function')}" for qa in qa_pairs]
+        qa_scores = self.assess_batch(qa_pairs, qa_types)
         qa_type_scores = {}
         
-        for qa in qa_pairs:
-            element_type = qa.get('metadata', {}).get('element_type', 'function')
-            content_type = f'qa_{element_type}'
-            
-            score_result = self.assess_reasoning_quality(qa, content_type)
-            qa_scores.append(score_result)
-            
+        for content_type, score_result in zip(qa_types, qa_scores):
             if content_type not in qa_type_scores:
                 qa_type_scores[content_type] = []
             qa_type_scores[content_type].append(score_result['overall_score'])
         
         # 评估Design proposals
-        design_scores = []
-        for proposal in design_proposals:
-            proposal_type = proposal.get('type', 'enhancement')
-            content_type = f'design_{proposal_type}'
-            
-            score_result = self.assess_reasoning_quality(proposal, content_type)
-            design_scores.append(score_result)
+        design_types = [f"design_{proposal.get('type', 'enhancement')}" for proposal in design_proposals]
+        design_scores = self.assess_batch(design_proposals, design_types)
         
         # 统计分析
         overall_qa_score = sum(s['overall_score'] for s in qa_scores) / len(qa_scores) if qa_scores else 0
@@ -277,3 +416,24 @@ class ReasoningQualityAssessor:
         with open(output_path, 'w', encoding='utf-8') as f:
             json.dump(report, f, indent=2, ensure_ascii=False)
         print(f"推理质量报告已保存到: {output_path}")
+
+
+def _count_sentences(reasoning: str) -> int:
+    """按句末标点切分后的非空句子数"""
+    return len([s for s in SENTENCE_DELIMITERS.split(reasoning) if s.strip()])
+
+
+def _round3(values: 'np.ndarray') -> List[float]:
+    """
+    向量化保留三位小数，结果与Python的round(x, 3)逐个相同
+
+    np.round先乘1000再取整，乘法的舍入误差可能在恰好接近 .5 的位置改变取整方向，
+    这类位置改用Python的round逐个计算
+    """
+    scaled = values * 1000
+    rounded = (np.rint(scaled) / 1000).tolist()
+    ambiguous = np.flatnonzero(np.abs(scaled - np.floor(scaled) - 0.5) < 1e-6)
+    for index in ambiguous.tolist():
+        rounded[index] = round(float(values[index]), 3)
+    return rounded
+
@@ -0,0 +1,108 @@
+"""
+仓库遍历器 - 基于os.scandir的单次遍历，生成供各分析步骤共享的文件清单
+"""
+import os
+from pathlib import Path
+from typing import Iterable, List, NamedTuple, Optional, Set
+
+from ignore_rules import IgnoreRules
+
+
+class FileEntry(NamedTuple):
+    """文件清单中的单个文件"""
+    rel_path: str
+    path: str
+    ext: str
+    size: int
+    mtime: float
+
+
+class RepoInventory:
+    """一次遍历得到的仓库清单：目录、文件及最大深度"""
+
+    def __init__(self, root: Path):
+        self.root = root
+        self.directories: List[str] = []
+        self.files: List[FileEntry] = []
+        self.root_names: Set[str] = set()
+        self.depth = 0
+
+    def files_with_extensions(self, extensions: Iterable[str]) -> List[FileEntry]:
+        """按扩展名筛选文件"""
+        extensions = set(extensions)
+        return [entry for entry in self.files if entry.ext in extensions]
+
+    def has_root_file(self, name: str) -> bool:
+        """仓库根目录下是否存在指定文件"""
+        return name in self.root_names
+
+
+def scan_repository(root: str, stat_extensions: Optional[Set[str]] = None,
+                    ignore_rules: Optional[IgnoreRules] = None) -> RepoInventory:
+    """
+    单次遍历仓库，目录项按名称排序以保证结果确定
+
+    stat_extensions: 只对这些扩展名的文件读取大小和修改时间，
+    其余文件只依赖目录项类型信息，不产生额外的stat调用；为None时全部读取
+    ignore_rules: 被忽略的目录整棵子树直接剪枝，不会被遍历
+    """
+    root_path = Path(root)
+    inventory = RepoInventory(root_path)
+    # 栈中保存 (绝对路径, 相对路径, 深度)
+    stack = [(str(root_path), '', 0)]
+
+    while stack:
+        dir_path, rel_dir, level = stack.pop()
+        inventory.depth = max(inventory.depth, level)
+
+        try:
+            with os.scandir(dir_path) as it:
+                entries = sorted(it, key=lambda e: e.name)
+        except OSError as e:
+            print(f" 无法读取目录 {dir_path}: {e}")
+            continue
+
+        # 先加载当前目录的.gitignore，再判断其中的目录项
+        if ignore_rules is not None:
+            for entry in entries:
+                if entry.name == '.gitignore' and entry.is_file():
+                    ignore_rules.load_gitignore(rel_dir, entry.path)
+                    break
+
+        subdirs = []
+        for entry in entries:
+            rel_path = f"{rel_dir}{os.sep}{entry.name}" if rel_dir else entry.name
+            if level == 0:
+                inventory.root_names.add(entry.name)
+
+            try:
+                is_dir = entry.is_dir()
+            except OSError:
+                is_dir = False
+
+            if ignore_rules is not None and ignore_rules.is_ignored(rel_path, is_dir):
+                continue
+
+            if is_dir:
+                # 与os.walk一致：不进入符号链接目录
+                if not entry.is_symlink():
+                    inventory.directories.append(rel_path)
+                    subdirs.append((entry.path, rel_path, level + 1))
+                continue
+
+            ext = os.path.splitext(entry.name)[1].lower()
+            if ext == '.':
+                ext = ''
+            size, mtime = -1, 0.0
+            if stat_extensions is None or ext in stat_extensions:
+                try:
+                    stat = entry.stat()
+                    size, mtime = stat.st_size, stat.st_mtime
+                except OSError:
+                    pass
+            inventory.files.append(FileEntry(rel_path, entry.path, ext, size, mtime))
+
+        # 逆序入栈，保证按名称顺序进行深度优先遍历
+        stack.extend(reversed(subdirs))
+
+    return inventory
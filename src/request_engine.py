@@ -0,0 +1,64 @@
+"""
+并发请求执行引擎 - 以有界并发的方式执行Claude请求任务
+"""
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, List, Optional, Sequence, Tuple
+
+from message_batches import DeferredRequest
+
+
+class ConcurrentRequestEngine:
+    """基于线程池的有界并发执行引擎，结果顺序与任务提交顺序保持一致"""
+
+    def __init__(self, max_concurrency: int = 4):
+        self.max_concurrency = max(int(max_concurrency), 1)
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+        # 出错的任务数，离线批量模式下请求已排队的任务不计入
+        self.errors = 0
+
+    def run(self, tasks: Sequence[Tuple[Callable[..., Any], tuple]]) -> List[Any]:
+        """并发执行任务列表，按任务顺序返回结果，出错的任务结果为None"""
+        if not tasks:
+            return []
+
+        # 单并发时直接串行执行，避免线程开销
+        if self.max_concurrency == 1:
+            return [self._run_task(func, args) for func, args in tasks]
+
+        futures = [self.submit(func, *args) for func, args in tasks]
+        return [future.result() for future in futures]
+
+    def submit(self, func: Callable[..., Any], *args) -> Future:
+        """提交单个任务，返回Future"""
+        return self._get_executor().submit(self._run_task, func, args)
+
+    def close(self):
+        """关闭线程池"""
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=True)
+                self._executor = None
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        """惰性创建共享线程池"""
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.max_concurrency,
+                    thread_name_prefix='claude-request'
+                )
+            return self._executor
+
+    def _run_task(self, func: Callable[..., Any], args: tuple) -> Any:
+        """执行单个任务，异常不向外传播；离线批量模式下请求已排队的任务结果为None，不视为出错"""
+        try:
+            return func(*args)
+        except DeferredRequest:
+            return None
+        except Exception as e:
+            print(f"并发任务 {getattr(func, '__name__', func)} 出错: {e}")
+            with self._lock:
+                self.errors += 1
+            return None
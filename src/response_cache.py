@@ -0,0 +1,142 @@
+"""
+Claude响应缓存 - 以提示词内容哈希为键的持久化缓存
+"""
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+
+class ResponseCache:
+    """基于SQLite的内容寻址响应缓存，支持TTL过期和按容量的LRU淘汰"""
+
+    def __init__(self, cache_dir: str, ttl_seconds: float = 7 * 24 * 3600,
+                 max_size_bytes: int = 512 * 1024 * 1024):
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.db_path = self.cache_dir / 'responses.sqlite'
+        self.ttl_seconds = ttl_seconds
+        self.max_size_bytes = max_size_bytes
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+        self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
+        self._conn.execute('''
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                response TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                last_access REAL NOT NULL
+            )
+        ''')
+        self._conn.execute('CREATE INDEX IF NOT EXISTS idx_last_access ON responses(last_access)')
+        self._purge_expired()
+        self._total_size = self._conn.execute('SELECT COALESCE(SUM(size), 0) FROM responses').fetchone()[0]
+        self._conn.commit()
+
+    @staticmethod
+    def make_key(model: str, max_tokens: int, prompt: str, **extra: Any) -> str:
+        """根据模型、max_tokens和提示词计算缓存键"""
+        payload = {'model': model, 'max_tokens': max_tokens, 'prompt': prompt}
+        payload.update(extra)
+        raw = json.dumps(payload, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        """读取缓存，过期或不存在时返回None"""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT response, size, created_at FROM responses WHERE key = ?', (key,)
+            ).fetchone()
+
+            if row is None:
+                self.misses += 1
+                return None
+
+            response, size, created_at = row
+            if self.ttl_seconds and now - created_at > self.ttl_seconds:
+                self._conn.execute('DELETE FROM responses WHERE key = ?', (key,))
+                self._conn.commit()
+                self._total_size -= size
+                self.misses += 1
+                return None
+
+            self._conn.execute('UPDATE responses SET last_access = ? WHERE key = ?', (now, key))
+            self._conn.commit()
+            self.hits += 1
+            return response
+
+    def put(self, key: str, response: str):
+        """写入缓存，超出容量时按最近访问时间淘汰"""
+        size = len(response.encode('utf-8'))
+        now = time.time()
+        with self._lock:
+            old = self._conn.execute('SELECT size FROM responses WHERE key = ?', (key,)).fetchone()
+            if old:
+                self._total_size -= old[0]
+
+            self._conn.execute(
+                'INSERT OR REPLACE INTO responses (key, response, size, created_at, last_access) '
+                'VALUES (?, ?, ?, ?, ?)',
+                (key, response, size, now, now)
+            )
+            self._total_size += size
+            self._evict_if_needed()
+            self._conn.commit()
+
+    def discard(self, key: str):
+        """删除指定缓存项（例如响应无法解析时）"""
+        with self._lock:
+            row = self._conn.execute('SELECT size FROM responses WHERE key = ?', (key,)).fetchone()
+            if row:
+                self._conn.execute('DELETE FROM responses WHERE key = ?', (key,))
+                self._conn.commit()
+                self._total_size -= row[0]
+
+    def stats(self) -> Dict[str, Any]:
+        """返回缓存命中统计"""
+        with self._lock:
+            entries = self._conn.execute('SELECT COUNT(*) FROM responses').fetchone()[0]
+            lookups = self.hits + self.misses
+            return {
+                'enabled': True,
+                'cache_dir': str(self.cache_dir),
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 3) if lookups else 0.0,
+                'entries': entries,
+                'size_bytes': self._total_size,
+                'evictions': self.evictions
+            }
+
+    def close(self):
+        """关闭数据库连接"""
+        with self._lock:
+            self._conn.close()
+
+    def _purge_expired(self):
+        """清理过期缓存项"""
+        if self.ttl_seconds:
+            self._conn.execute('DELETE FROM responses WHERE created_at < ?',
+                               (time.time() - self.ttl_seconds,))
+
+    def _evict_if_needed(self):
+        """按LRU顺序淘汰，直到总大小不超过上限"""
+        if not self.max_size_bytes or self._total_size <= self.max_size_bytes:
+            return
+
+        rows = self._conn.execute('SELECT key, size FROM responses ORDER BY last_access ASC').fetchall()
+        for key, size in rows:
+            if self._total_size <= self.max_size_bytes:
+                break
+            self._conn.execute('DELETE FROM responses WHERE key = ?', (key,))
+            self._total_size -= size
+            self.evictions += 1
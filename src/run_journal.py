@@ -0,0 +1,173 @@
+"""
+运行日志 - 生成结果逐条追加写入并落盘，配合工作项账本支持中断后续跑
+"""
+import json
+import os
+import random
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Optional
+
+
+class RunJournal:
+    """
+    生成阶段的运行日志，目录下包含三个文件：
+
+    run.json       运行参数和随机种子，续跑时复用同一种子以重现相同的抽样计划
+    ledger.jsonl   工作项账本，每行记录一个工作项的状态变化（pending/done/failed）
+    results.jsonl  已完成工作项的生成结果，每完成一项立即追加并fsync
+    """
+
+    def __init__(self, journal_dir: str, resume: bool = False, params: Optional[Dict[str, Any]] = None):
+        self.journal_dir = Path(journal_dir)
+        self.journal_dir.mkdir(parents=True, exist_ok=True)
+        self.run_path = self.journal_dir / 'run.json'
+        self.ledger_path = self.journal_dir / 'ledger.jsonl'
+        self.results_path = self.journal_dir / 'results.jsonl'
+
+        self.statuses: Dict[str, str] = {}
+        self.results: Dict[str, Any] = {}
+        self.reused = 0
+        self.resumed = False
+        self._lock = threading.Lock()
+
+        run_info = self._load_run_info() if resume else None
+        if run_info is not None:
+            self.resumed = True
+            self.seed = run_info['seed']
+            if params and run_info.get('params') != params:
+                print(f" 续跑参数与上次不同（上次: {run_info.get('params')}），已完成的工作项仍会复用")
+            self._load_entries()
+        else:
+            if resume:
+                print(" 没有找到可续跑的运行日志，将开始新的运行")
+            # 新的运行：清空旧日志，生成新的随机种子
+            for path in (self.ledger_path, self.results_path):
+                if path.exists():
+                    path.unlink()
+            self.seed = random.SystemRandom().randrange(2 ** 32)
+            self._write_run_info({'seed': self.seed, 'params': params or {},
+                                  'started_at': datetime.now().isoformat()})
+
+        for path in (self.ledger_path, self.results_path):
+            _terminate_partial_line(path)
+        self._ledger = open(self.ledger_path, 'a', encoding='utf-8')
+        self._results_file = open(self.results_path, 'a', encoding='utf-8')
+
+        if self.resumed:
+            counts = self.stats()
+            print(f" 续跑: 已完成 {counts['done']} 项, 失败 {counts['failed']} 项, 待处理 {counts['pending']} 项")
+
+    def is_done(self, item_id: str) -> bool:
+        """工作项是否已经完成"""
+        return item_id in self.results
+
+    def plan(self, item_ids: Iterable[str]):
+        """登记待处理的工作项，已登记或已完成的不重复记录"""
+        with self._lock:
+            new_ids = [item_id for item_id in item_ids if item_id not in self.statuses]
+            for item_id in new_ids:
+                self.statuses[item_id] = 'pending'
+                self._append(self._ledger, {'item': item_id, 'status': 'pending'}, sync=False)
+            if new_ids:
+                self._sync(self._ledger)
+
+    def run(self, item_id: str, func: Callable[..., Any], *args) -> Any:
+        """
+        执行工作项：已完成的直接返回日志中的结果，否则执行并记录结果；
+        执行中抛出的异常（如离线批量模式下请求已排队）不记录结果，工作项保持待处理
+        """
+        with self._lock:
+            if item_id in self.results:
+                self.reused += 1
+                return self.results[item_id]
+
+        result = func(*args)
+        self.record(item_id, result)
+        return result
+
+    def record(self, item_id: str, result: Any):
+        """记录在日志外执行的工作项结果（如一次批量请求中的各个元素），结果为空时记为失败"""
+        with self._lock:
+            if result:
+                # 先写结果再写账本，两次写入之间中断时以结果文件为准
+                self.results[item_id] = result
+                self.statuses[item_id] = 'done'
+                self._append(self._results_file, {'item': item_id, 'result': result})
+                self._append(self._ledger, {'item': item_id, 'status': 'done'})
+            else:
+                self.statuses[item_id] = 'failed'
+                self._append(self._ledger, {'item': item_id, 'status': 'failed'})
+
+    def complete(self):
+        """标记整个运行已完成"""
+        run_info = self._load_run_info() or {'seed': self.seed}
+        run_info['completed_at'] = datetime.now().isoformat()
+        self._write_run_info(run_info)
+
+    def stats(self) -> Dict[str, Any]:
+        """工作项状态统计"""
+        with self._lock:
+            counts = {'pending': 0, 'done': 0, 'failed': 0}
+            for status in self.statuses.values():
+                counts[status] = counts.get(status, 0) + 1
+            return {'resumed': self.resumed, 'seed': self.seed, 'reused_results': self.reused, **counts}
+
+    def close(self):
+        """关闭日志文件"""
+        self._ledger.close()
+        self._results_file.close()
+
+    def _load_run_info(self) -> Optional[Dict[str, Any]]:
+        try:
+            with open(self.run_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _write_run_info(self, run_info: Dict[str, Any]):
+        tmp_path = self.run_path.with_suffix('.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(run_info, f, ensure_ascii=False, indent=2)
+            self._sync(f)
+        os.replace(tmp_path, self.run_path)
+
+    def _load_entries(self):
+        """读取账本和结果日志，忽略中断时写了一半的最后一行"""
+        for record in _read_jsonl(self.ledger_path):
+            self.statuses[record['item']] = record['status']
+        for record in _read_jsonl(self.results_path):
+            self.results[record['item']] = record['result']
+            self.statuses[record['item']] = 'done'
+
+    def _append(self, file, record: Dict[str, Any], sync: bool = True):
+        file.write(json.dumps(record, ensure_ascii=False) + '\n')
+        if sync:
+            self._sync(file)
+
+    @staticmethod
+    def _sync(file):
+        file.flush()
+        os.fsync(file.fileno())
+
+
+def _terminate_partial_line(path: Path):
+    """中断时最后一行可能只写了一半，补上换行，避免后续追加的记录与其连在一起"""
+    if not path.exists() or path.stat().st_size == 0:
+        return
+    with open(path, 'rb+') as f:
+        f.seek(-1, os.SEEK_END)
+        if f.read(1) != b'\n':
+            f.write(b'\n')
+
+
+def _read_jsonl(path: Path) -> Iterable[Dict[str, Any]]:
+    if not path.exists():
+        return
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                yield json.loads(line)
+            except ValueError:
+                continue
@@ -0,0 +1,111 @@
+"""
+源码片段服务 - 按分析阶段记录的字节区间读取函数和类的源码，文件以mmap映射并保留最近使用的映射
+"""
+import mmap
+import textwrap
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+
+# 同时保持映射的文件数上限，超出时关闭最久未使用的映射
+DEFAULT_MAX_OPEN_FILES = 64
+
+# 提示词中单个源码片段的默认字节上限
+DEFAULT_MAX_SNIPPET_BYTES = 4000
+
+
+class SnippetService:
+    """
+    源码片段读取服务，生成问答对的各个线程共用一个实例
+
+    同一文件只映射一次，之后的片段直接从映射中切取，不再打开和读取文件；
+    映射按LRU淘汰，打开的文件数不超过max_open_files
+    """
+
+    def __init__(self, repo_path: str, max_open_files: int = DEFAULT_MAX_OPEN_FILES):
+        self.repo_path = Path(repo_path)
+        self.max_open_files = max(int(max_open_files), 1)
+        # 相对路径 → 映射，按最近使用排序
+        self._maps = OrderedDict()
+        self._lock = threading.Lock()
+        self._counters = {'snippets': 0, 'map_hits': 0, 'maps_opened': 0, 'evictions': 0,
+                          'unavailable': 0, 'bytes_served': 0}
+
+    def snippet(self, rel_path: str, start_byte: int, end_byte: int,
+                max_bytes: Optional[int] = None, dedent: bool = True) -> Optional[str]:
+        """
+        读取 [start_byte, end_byte) 区间的源码，文件不存在或区间超出文件长度时返回None
+
+        max_bytes: 片段超出时在该长度前的最后一个换行处截断并标注
+        dedent: 从起始行的行首开始读取并去除公共缩进（类中的方法等）
+        """
+        with self._lock:
+            source = self._map(rel_path)
+            if source is None or not 0 <= start_byte <= end_byte <= len(source):
+                self._counters['unavailable'] += 1
+                return None
+            if dedent:
+                start_byte = source.rfind(b'\n', 0, start_byte) + 1
+            truncated = max_bytes is not None and end_byte - start_byte > max_bytes
+            if truncated:
+                cut = source.rfind(b'\n', start_byte, start_byte + max_bytes)
+                end_byte = cut if cut > start_byte else start_byte + max_bytes
+            data = source[start_byte:end_byte]
+            self._counters['snippets'] += 1
+            self._counters['bytes_served'] += len(data)
+
+        text = data.decode('utf-8', errors='ignore').replace('\r\n', '\n').replace('\r', '\n')
+        if dedent:
+            text = textwrap.dedent(text)
+        if truncated:
+            text += '\n...（已截断）'
+        return text
+
+    def element_source(self, rel_path: str, element: Dict[str, Any],
+                       max_bytes: Optional[int] = DEFAULT_MAX_SNIPPET_BYTES) -> Optional[str]:
+        """读取分析结果中函数或类的源码，元素没有记录字节区间时返回None"""
+        start_byte = element.get('start_byte')
+        end_byte = element.get('end_byte')
+        if start_byte is None or end_byte is None:
+            return None
+        return self.snippet(rel_path, start_byte, end_byte, max_bytes)
+
+    def close(self):
+        """关闭全部映射"""
+        with self._lock:
+            for source in self._maps.values():
+                if source is not None:
+                    source.close()
+            self._maps.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """片段读取统计"""
+        with self._lock:
+            return {'open_maps': sum(1 for source in self._maps.values() if source is not None),
+                    'max_open_files': self.max_open_files, **self._counters}
+
+    def _map(self, rel_path: str) -> Optional[mmap.mmap]:
+        """取得文件的映射，未映射时打开并映射；空文件和无法读取的文件记为None，同样参与LRU"""
+        if rel_path in self._maps:
+            self._maps.move_to_end(rel_path)
+            self._counters['map_hits'] += 1
+            return self._maps[rel_path]
+
+        source = None
+        try:
+            with open(self.repo_path / rel_path, 'rb') as f:
+                # 映射持有自己的文件句柄，关闭文件对象后仍可读取
+                source = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            self._counters['maps_opened'] += 1
+        except (OSError, ValueError):
+            pass
+
+        self._maps[rel_path] = source
+        while len(self._maps) > self.max_open_files:
+            _, evicted = self._maps.popitem(last=False)
+            if evicted is not None:
+                evicted.close()
+            self._counters['evictions'] += 1
+        return source
@@ -0,0 +1,81 @@
+"""
+流水线阶段调度 - 记录每个阶段的耗时，相互独立的阶段在各自线程中并发执行
+"""
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+
+# 单个阶段: (名称, 调用函数, 参数元组)
+Stage = Tuple[str, Callable[..., Any], tuple]
+
+
+class StageScheduler:
+    """
+    按顺序或并发执行流水线阶段并计时
+
+    并发执行的阶段各占一个线程，线程本身不发请求，只负责编排；请求的并发数和
+    限流额度由共享的ClaudeClient统一控制，因此并发阶段不会突破全局上限
+    """
+
+    def __init__(self):
+        self._started = time.monotonic()
+        self._lock = threading.Lock()
+        self._stages: Dict[str, Dict[str, float]] = {}
+        self._groups: List[Dict[str, Any]] = []
+
+    def run(self, name: str, func: Callable[..., Any], *args) -> Any:
+        """执行单个阶段并记录耗时"""
+        started = time.monotonic()
+        try:
+            return func(*args)
+        finally:
+            self._record(name, started)
+
+    def run_concurrently(self, stages: List[Stage]) -> List[Any]:
+        """并发执行多个阶段，等待全部结束后按阶段顺序返回结果；任一阶段出错时抛出其异常"""
+        results: List[Any] = [None] * len(stages)
+        errors: List[Optional[BaseException]] = [None] * len(stages)
+
+        def worker(index: int, name: str, func: Callable[..., Any], args: tuple):
+            try:
+                results[index] = self.run(name, func, *args)
+            except BaseException as e:
+                errors[index] = e
+
+        started = time.monotonic()
+        threads = [threading.Thread(target=worker, args=(i, name, func, args), name=f'stage-{name}')
+                   for i, (name, func, args) in enumerate(stages)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        with self._lock:
+            self._groups.append({
+                'stages': [name for name, _, _ in stages],
+                'wall_seconds': round(time.monotonic() - started, 3),
+                'serial_seconds': round(sum(self._stages[name]['seconds'] for name, _, _ in stages
+                                            if name in self._stages), 3)
+            })
+
+        for error in errors:
+            if error is not None:
+                raise error
+        return results
+
+    def timings(self) -> Dict[str, Any]:
+        """各阶段的开始时间（相对流水线开始）和耗时，以及并发阶段组的实际耗时与串行耗时之和"""
+        with self._lock:
+            return {
+                'elapsed_seconds': round(time.monotonic() - self._started, 3),
+                'stages': {name: dict(timing) for name, timing in self._stages.items()},
+                'concurrent_groups': [dict(group) for group in self._groups]
+            }
+
+    def _record(self, name: str, started: float):
+        with self._lock:
+            self._stages[name] = {
+                'start_offset_seconds': round(started - self._started, 3),
+                'seconds': round(time.monotonic() - started, 3)
+            }
@@ -0,0 +1,153 @@
+"""
+流式流水线 - 代码分析在后台线程中逐个文件产出结果，经有界队列交给问答生成，使分析与Claude请求重叠执行
+"""
+import queue
+import random
+import threading
+import time
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from code_analyzer import CodeAnalyzer
+from repo_walker import FileEntry
+
+
+# 队列中最多积压的文件分析结果数，队列满时分析线程阻塞等待（背压）
+DEFAULT_QUEUE_SIZE = 64
+
+_END = object()
+
+
+class _StreamCancelled(Exception):
+    """消费方提前结束时用于中止后台分析"""
+
+
+class AnalysisStream:
+    """
+    在后台线程中运行代码分析，每个文件分析完成（并写入报告）后放入有界队列
+
+    迭代得到 (相对路径, 分析结果, 文件字节数)；迭代结束后由result()取得与
+    CodeAnalyzer.analyze_repository相同的完整分析结果
+    """
+
+    def __init__(self, analyzer: CodeAnalyzer, report_path: Optional[str] = None,
+                 queue_size: int = DEFAULT_QUEUE_SIZE):
+        self.analyzer = analyzer
+        self.report_path = report_path
+        self.queue_size = max(int(queue_size), 1)
+        self.planned_files = 0
+        self.planned_bytes = 0
+        self.started_at: Optional[float] = None
+        self._queue: queue.Queue = queue.Queue(maxsize=self.queue_size)
+        self._sizes: Dict[str, int] = {}
+        self._thread: Optional[threading.Thread] = None
+        self._result: Optional[Dict[str, Any]] = None
+        self._error: Optional[BaseException] = None
+        self._cancelled = threading.Event()
+        self._analysis_seconds = 0.0
+        self._producer_wait = 0.0
+        self._max_depth = 0
+
+    def start(self):
+        """启动后台分析线程"""
+        if self._thread is None:
+            self.started_at = time.monotonic()
+            self._thread = threading.Thread(target=self._produce, name='analysis-stream', daemon=True)
+            self._thread.start()
+
+    def __iter__(self) -> Iterator[Tuple[str, Dict[str, Any], int]]:
+        self.start()
+        while True:
+            item = self._queue.get()
+            if item is _END:
+                return
+            yield item
+
+    def result(self) -> Dict[str, Any]:
+        """等待分析结束并返回完整分析结果，分析出错时抛出原异常"""
+        self.start()
+        self._thread.join()
+        if self._error is not None:
+            raise self._error
+        return self._result
+
+    def close(self):
+        """提前结束：通知分析线程停止并清空队列，使其不会阻塞在已满的队列上"""
+        if self._thread is None:
+            return
+        self._cancelled.set()
+        while self._thread.is_alive():
+            try:
+                self._queue.get(timeout=0.1)
+            except queue.Empty:
+                pass
+
+    def stats(self) -> Dict[str, Any]:
+        """分析阶段的流式统计"""
+        return {
+            'queue_size': self.queue_size,
+            'planned_files': self.planned_files,
+            'analysis_seconds': round(self._analysis_seconds, 3),
+            'max_queue_depth': self._max_depth,
+            'producer_wait_seconds': round(self._producer_wait, 3)
+        }
+
+    def _produce(self):
+        try:
+            self._result = self.analyzer.analyze_repository(
+                report_path=self.report_path, on_plan=self._on_plan, on_file=self._on_file)
+        except _StreamCancelled:
+            pass
+        except BaseException as e:
+            self._error = e
+        finally:
+            self._analysis_seconds = time.monotonic() - self.started_at
+            self._queue.put(_END)
+
+    def _on_plan(self, entries: List[FileEntry]):
+        self.planned_files = len(entries)
+        self.planned_bytes = sum(entry.size for entry in entries)
+        self._sizes = {entry.rel_path: entry.size for entry in entries}
+
+    def _on_file(self, rel_path: str, analysis: Dict[str, Any]):
+        if self._cancelled.is_set():
+            raise _StreamCancelled()
+        size = self._sizes.pop(rel_path, analysis.get('size', 0))
+        started = time.monotonic()
+        self._queue.put((rel_path, analysis, size))
+        self._producer_wait += time.monotonic() - started
+        self._max_depth = max(self._max_depth, self._queue.qsize())
+
+
+class StreamSampler:
+    """
+    元素总数未知时的流式抽样：元素随文件陆续到达，到达时即决定是否选中
+
+    以已到达文件的 元素数/字节数 估计剩余字节中的元素数，按 剩余配额/估计剩余元素数
+    的概率选中（选择抽样），配额用完即停止；估计偏高时可能选不满，由补充环节补齐
+    """
+
+    def __init__(self, quota: int, total_bytes: int, rng: random.Random):
+        self.remaining = max(int(quota), 0)
+        self.total_bytes = total_bytes
+        self.rng = rng
+        self.seen_bytes = 0
+        self.seen_elements = 0
+
+    def select(self, elements: List[Dict[str, Any]], size: int) -> List[Dict[str, Any]]:
+        """一个文件到达时调用，返回该文件中被选中的元素"""
+        self.seen_bytes += size
+        self.seen_elements += len(elements)
+        if not elements or self.remaining <= 0:
+            return []
+
+        density = self.seen_elements / max(self.seen_bytes, 1)
+        upcoming = len(elements) + max(self.total_bytes - self.seen_bytes, 0) * density
+        selected = []
+        for element in elements:
+            if self.rng.random() * max(upcoming, self.remaining) < self.remaining:
+                selected.append(element)
+                self.remaining -= 1
+                if self.remaining <= 0:
+                    break
+            upcoming -= 1
+        return selected
@@ -0,0 +1,58 @@
+"""
+结构化输出 - 把问答对和设计方案的JSON格式声明为工具的输入模式，强制模型调用该工具并直接读取工具参数，
+输出由服务端按模式约束，不再出现无法解析的响应
+"""
+import json
+from typing import Any, Dict, Iterable, NamedTuple, Optional
+
+
+class OutputTool(NamedTuple):
+    """
+    以工具形式声明的输出格式
+
+    工具参数必须是对象：输出为数组时把数组放在wrapper字段中，读取时再取出，
+    使调用方得到的JSON文本与文本模式的格式一致
+    """
+    name: str
+    description: str
+    input_schema: Dict[str, Any]
+    wrapper: Optional[str] = None
+
+    def definition(self) -> Dict[str, Any]:
+        """请求中的工具声明；strict使工具参数严格符合输入模式"""
+        return {'name': self.name, 'description': self.description,
+                'input_schema': self.input_schema, 'strict': True}
+
+    def output_text(self, tool_input: Dict[str, Any]) -> str:
+        """工具参数转为与文本模式相同格式的JSON文本"""
+        value = tool_input.get(self.wrapper, []) if self.wrapper else tool_input
+        return json.dumps(value, ensure_ascii=False)
+
+
+def object_schema(properties: Dict[str, Dict[str, Any]]) -> Dict[str, Any]:
+    """所有字段都必需、不允许其他字段的对象模式"""
+    return {'type': 'object', 'properties': properties, 'required': list(properties),
+            'additionalProperties': False}
+
+
+def string_fields(names: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+    return {name: {'type': 'string'} for name in names}
+
+
+def schema_from_example(example: Dict[str, Any]) -> Dict[str, Any]:
+    """由提示词中的JSON格式示例推出对象模式：字符串字段为string，列表字段为字符串数组"""
+    properties = {}
+    for name, value in example.items():
+        if isinstance(value, list):
+            properties[name] = {'type': 'array', 'items': {'type': 'string'}}
+        else:
+            properties[name] = {'type': 'string'}
+    return object_schema(properties)
+
+
+def tool_input(message: Any, name: str) -> Optional[Dict[str, Any]]:
+    """响应消息中指定工具的调用参数，没有该工具调用时返回None"""
+    for block in getattr(message, 'content', None) or []:
+        if getattr(block, 'type', None) == 'tool_use' and getattr(block, 'name', None) == name:
+            return block.input
+    return None
@@ -0,0 +1,270 @@
+"""
+符号索引 - 把分析得到的文件、函数和类、导入以及调用关系写入SQLite，按名称、文件或模块建索引查询
+"""
+import sqlite3
+import threading
+from pathlib import PurePosixPath
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from repo_walker import FileEntry
+
+
+# 表结构或分析结果的格式变化时递增，版本不一致的索引文件会被清空重建
+SCHEMA_VERSION = 4
+
+# 分析结果中的元素列表 → 符号类型
+SYMBOL_KINDS = {'functions': 'function', 'classes': 'class'}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL UNIQUE,
+    module TEXT NOT NULL,
+    file_type TEXT,
+    size INTEGER,
+    mtime REAL,
+    position INTEGER
+);
+CREATE INDEX IF NOT EXISTS idx_files_module ON files(module);
+CREATE INDEX IF NOT EXISTS idx_files_position ON files(position);
+
+CREATE TABLE IF NOT EXISTS symbols (
+    id INTEGER PRIMARY KEY,
+    file_id INTEGER NOT NULL REFERENCES files(id) ON DELETE CASCADE,
+    kind TEXT NOT NULL,
+    name TEXT NOT NULL,
+    qualname TEXT,
+    ordinal INTEGER NOT NULL,
+    line INTEGER,
+    end_line INTEGER,
+    start_byte INTEGER,
+    end_byte INTEGER,
+    source_hash TEXT
+);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_symbols_file ON symbols(file_id, kind, ordinal);
+CREATE INDEX IF NOT EXISTS idx_symbols_file_name ON symbols(file_id, kind, name);
+CREATE INDEX IF NOT EXISTS idx_symbols_name ON symbols(name, kind);
+
+CREATE TABLE IF NOT EXISTS imports (
+    file_id INTEGER NOT NULL REFERENCES files(id) ON DELETE CASCADE,
+    module TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_imports_file ON imports(file_id);
+CREATE INDEX IF NOT EXISTS idx_imports_module ON imports(module);
+
+CREATE TABLE IF NOT EXISTS calls (
+    file_id INTEGER NOT NULL REFERENCES files(id) ON DELETE CASCADE,
+    caller TEXT NOT NULL,
+    callee TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_calls_caller ON calls(file_id, caller);
+CREATE INDEX IF NOT EXISTS idx_calls_callee ON calls(callee);
+"""
+
+
+def module_name(rel_path: str) -> str:
+    """文件路径对应的模块名：pkg/sub/mod.py → pkg.sub.mod，包的__init__.py对应包名"""
+    path = PurePosixPath(rel_path.replace('\\', '/'))
+    parts = list(path.with_suffix('').parts)
+    if parts and parts[-1] == '__init__' and len(parts) > 1:
+        parts.pop()
+    return '.'.join(parts)
+
+
+class SymbolIndex:
+    """
+    持久化的符号索引，由CodeAnalyzer在分析过程中逐个文件写入
+
+    文件的大小和修改时间未变时保留上次的索引内容，只更新其在本次分析中的顺序；
+    索引文件可被后续运行和其他进程直接打开查询（WAL模式，读写互不阻塞）。
+    各查询都走B树索引，判断某文件中是否存在某函数等为O(log n)
+    """
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA foreign_keys=ON')
+        if self._conn.execute('PRAGMA user_version').fetchone()[0] != SCHEMA_VERSION:
+            self._conn.executescript('DROP TABLE IF EXISTS calls; DROP TABLE IF EXISTS imports; '
+                                     'DROP TABLE IF EXISTS symbols; DROP TABLE IF EXISTS files;')
+            self._conn.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+        self._conn.executescript(_SCHEMA)
+        self._conn.commit()
+        self._next_position = 0
+        self._counters = {'indexed_files': 0, 'reused_files': 0, 'removed_files': 0}
+
+    def begin(self):
+        """开始一次分析的索引更新：所有文件的顺序先清空，分析中出现的文件重新编号"""
+        with self._lock:
+            self._conn.execute('UPDATE files SET position = NULL')
+            self._next_position = 0
+            self._counters = {'indexed_files': 0, 'reused_files': 0, 'removed_files': 0}
+
+    def update_file(self, entry: FileEntry, analysis: Dict[str, Any]):
+        """写入单个文件的分析结果；文件未变化时只更新顺序"""
+        with self._lock:
+            position = self._next_position
+            self._next_position += 1
+            row = self._conn.execute('SELECT id, size, mtime FROM files WHERE path = ?',
+                                     (entry.rel_path,)).fetchone()
+            if row is not None and row[1] == entry.size and row[2] == entry.mtime:
+                self._conn.execute('UPDATE files SET position = ? WHERE id = ?', (position, row[0]))
+                self._counters['reused_files'] += 1
+                return
+
+            if row is not None:
+                self._conn.execute('DELETE FROM files WHERE id = ?', (row[0],))
+            file_id = self._conn.execute(
+                'INSERT INTO files (path, module, file_type, size, mtime, position) VALUES (?, ?, ?, ?, ?, ?)',
+                (entry.rel_path, module_name(entry.rel_path), analysis.get('file_type'),
+                 entry.size, entry.mtime, position)).lastrowid
+
+            symbols = []
+            calls = []
+            for key, kind in SYMBOL_KINDS.items():
+                for ordinal, element in enumerate(analysis.get(key, [])):
+                    symbols.append((file_id, kind, element.get('name', ''), element.get('qualname'), ordinal,
+                                    element.get('line_number'), element.get('end_line_number'),
+                                    element.get('start_byte'), element.get('end_byte'),
+                                    element.get('source_hash')))
+                    calls.extend((file_id, element.get('name', ''), callee) for callee in element.get('calls', []))
+            self._conn.executemany('INSERT INTO symbols (file_id, kind, name, qualname, ordinal, line, end_line, '
+                                   'start_byte, end_byte, source_hash) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)', symbols)
+            self._conn.executemany('INSERT INTO imports (file_id, module) VALUES (?, ?)',
+                                   [(file_id, module) for module in dict.fromkeys(analysis.get('imports', []))])
+            self._conn.executemany('INSERT INTO calls (file_id, caller, callee) VALUES (?, ?, ?)', calls)
+            self._counters['indexed_files'] += 1
+
+    def commit(self):
+        """结束本次更新：删除本次分析中没有出现的文件，提交事务"""
+        with self._lock:
+            removed = self._conn.execute('DELETE FROM files WHERE position IS NULL').rowcount
+            self._counters['removed_files'] = removed
+            self._conn.commit()
+
+    def close(self):
+        """关闭索引连接"""
+        with self._lock:
+            self._conn.close()
+
+    def has_file(self, rel_path: str) -> bool:
+        """文件是否在索引中"""
+        return self._query_one('SELECT 1 FROM files WHERE path = ?', (rel_path,)) is not None
+
+    def has_symbol(self, rel_path: str, kind: str, name: str) -> bool:
+        """文件中是否存在指定名称的函数或类"""
+        return self._query_one('SELECT 1 FROM symbols s JOIN files f ON f.id = s.file_id '
+                               'WHERE f.path = ? AND s.kind = ? AND s.name = ? LIMIT 1',
+                               (rel_path, kind, name)) is not None
+
+    def count_symbols(self, kind: Optional[str] = None) -> int:
+        """符号总数，可按类型过滤"""
+        if kind is None:
+            return self._query_one('SELECT COUNT(*) FROM symbols')[0]
+        return self._query_one('SELECT COUNT(*) FROM symbols WHERE kind = ?', (kind,))[0]
+
+    def find_symbols(self, name: str, kind: Optional[str] = None) -> List[Dict[str, Any]]:
+        """按名称查找符号（所有文件）"""
+        sql = _SYMBOL_SELECT + ' WHERE s.name = ?'
+        params: Tuple = (name,)
+        if kind is not None:
+            sql += ' AND s.kind = ?'
+            params += (kind,)
+        return self._symbol_rows(sql + ' ORDER BY f.path, s.line', params)
+
+    def symbols_in_file(self, rel_path: str, kind: Optional[str] = None) -> List[Dict[str, Any]]:
+        """文件中的符号，按分析结果中的顺序"""
+        sql = _SYMBOL_SELECT + ' WHERE f.path = ?'
+        params: Tuple = (rel_path,)
+        if kind is not None:
+            sql += ' AND s.kind = ?'
+            params += (kind,)
+        return self._symbol_rows(sql + ' ORDER BY s.kind, s.ordinal', params)
+
+    def symbols_in_module(self, module: str, kind: Optional[str] = None) -> List[Dict[str, Any]]:
+        """模块（含子模块）中的符号"""
+        sql = _SYMBOL_SELECT + ' WHERE (f.module = ? OR f.module GLOB ?)'
+        params: Tuple = (module, _glob_escape(module) + '.*')
+        if kind is not None:
+            sql += ' AND s.kind = ?'
+            params += (kind,)
+        return self._symbol_rows(sql + ' ORDER BY f.module, s.kind, s.ordinal', params)
+
+    def importers_of(self, module: str) -> List[str]:
+        """导入了指定模块（或其成员、子模块）的文件"""
+        rows = self._query('SELECT DISTINCT f.path FROM imports i JOIN files f ON f.id = i.file_id '
+                           'WHERE i.module = ? OR i.module GLOB ? ORDER BY f.path',
+                           (module, _glob_escape(module) + '.*'))
+        return [row[0] for row in rows]
+
+    def imported_modules(self) -> List[str]:
+        """仓库中导入过的全部模块"""
+        return [row[0] for row in self._query('SELECT DISTINCT module FROM imports ORDER BY module')]
+
+    def callers_of(self, name: str) -> List[Tuple[str, str]]:
+        """调用了指定名称的 (文件, 函数)"""
+        return self._query('SELECT DISTINCT f.path, c.caller FROM calls c JOIN files f ON f.id = c.file_id '
+                           'WHERE c.callee = ? ORDER BY f.path, c.caller', (name,))
+
+    def callees_of(self, rel_path: str, name: str) -> List[str]:
+        """文件中指定函数调用的名称"""
+        rows = self._query('SELECT DISTINCT c.callee FROM calls c JOIN files f ON f.id = c.file_id '
+                           'WHERE f.path = ? AND c.caller = ? ORDER BY c.callee', (rel_path, name))
+        return [row[0] for row in rows]
+
+    def symbols_by_rank(self, kind: str, ranks: Sequence[int]) -> List[Tuple[str, int]]:
+        """
+        按全局序号取符号，返回与ranks一一对应的 (文件, 文件内序号)
+
+        全局序号按文件在本次分析中的顺序、再按文件内顺序编号，与依次遍历file_analysis时的计数一致
+        """
+        wanted = sorted(set(ranks))
+        if not wanted:
+            return []
+        found = {}
+        # 分批查询，避免超出SQLite的参数个数上限
+        for start in range(0, len(wanted), 500):
+            batch = wanted[start:start + 500]
+            rows = self._query(
+                'SELECT rank, path, ordinal FROM ('
+                ' SELECT ROW_NUMBER() OVER (ORDER BY f.position, s.ordinal) - 1 AS rank, f.path, s.ordinal'
+                ' FROM symbols s JOIN files f ON f.id = s.file_id'
+                ' WHERE s.kind = ? AND f.position IS NOT NULL'
+                f') WHERE rank IN ({", ".join("?" * len(batch))})', (kind, *batch))
+            found.update((rank, (path, ordinal)) for rank, path, ordinal in rows)
+        return [found[rank] for rank in ranks]
+
+    def stats(self) -> Dict[str, Any]:
+        """索引规模和本次更新的统计"""
+        return {
+            'path': self.db_path,
+            'files': self._query_one('SELECT COUNT(*) FROM files')[0],
+            'symbols': self.count_symbols(),
+            'imports': self._query_one('SELECT COUNT(*) FROM imports')[0],
+            'call_edges': self._query_one('SELECT COUNT(*) FROM calls')[0],
+            **self._counters
+        }
+
+    def _query(self, sql: str, params: Iterable = ()) -> List[Tuple]:
+        with self._lock:
+            return self._conn.execute(sql, tuple(params)).fetchall()
+
+    def _query_one(self, sql: str, params: Iterable = ()) -> Optional[Tuple]:
+        with self._lock:
+            return self._conn.execute(sql, tuple(params)).fetchone()
+
+    def _symbol_rows(self, sql: str, params: Tuple) -> List[Dict[str, Any]]:
+        columns = ('path', 'module', 'kind', 'name', 'qualname', 'ordinal', 'line_number', 'end_line_number',
+                   'start_byte', 'end_byte', 'source_hash')
+        return [dict(zip(columns, row)) for row in self._query(sql, params)]
+
+
+_SYMBOL_SELECT = ('SELECT f.path, f.module, s.kind, s.name, s.qualname, s.ordinal, s.line, s.end_line, '
+                  's.start_byte, s.end_byte, s.source_hash FROM symbols s JOIN files f ON f.id = s.file_id')
+
+
+def _glob_escape(text: str) -> str:
+    """转义GLOB通配符，使模块名按字面匹配"""
+    return ''.join(f'[{char}]' if char in '*?[' else char for char in text)